@@ -8,24 +8,37 @@ from flask_cors import CORS
 import os
 import sys
 import json
+import queue
+import threading
 from werkzeug.utils import secure_filename
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils_storage import (
-    save_uploaded_file, get_storage_path, TRANSCRIPT_ROOT, 
+    save_uploaded_file, get_storage_path, storage_path, TRANSCRIPT_ROOT, 
     generate_filename, MEDIA_ROOT, list_media_files, 
     list_transcript_files, TTS_ROOT, RENDER_ROOT, 
-    list_latex_files, QUIZ_ROOT
+    list_latex_files, QUIZ_ROOT, save_media_stream, reuse_transcripts
 )
 from utils_processing import (
     download_youtube_audio, transcribe_audio, 
     format_timestamped_transcript, convert_to_wav, 
-    generate_tts_audio, compile_latex_to_pdf, process_unified_file
+    generate_tts_audio, process_unified_file
 )
-from utils_llm import generate_latex_code, chat_with_tools, generate_conversational_summary
-from utils_llm_quiz import generate_quiz
+from utils_llm import generate_latex_code, chat_with_tools, stream_chat_with_tools, stream_conversational_summary
+from utils_llm_quiz import generate_quiz, generate_quiz_stream, QuizStreamParser, clean_quiz_json
+from utils_llm_router import get_provider_stats
+from utils_telemetry import get_aggregates
+from utils_model_residency import preload_default_models, get_residency_status
+from utils_tts import StreamingSpeechWriter, warm_tts_pipelines, tail_audio, mark_live, mark_failed, live_error, is_live, audio_mimetype, AUDIO_FORMATS
+from utils_latex import warm_latex_toolchain
+from utils_latex_lint import strip_code_fences, compile_with_repair
+from utils_latex_preview import open_preview, get_preview
+from chat_tools import execute_tool_calls
+from utils_jobs import job_manager
+from utils_chat_history import compact_messages
+from utils_singleflight import latex_flights, latex_flight_key
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -49,6 +62,31 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'ok', 'message': 'Backend is running'})
 
+@app.route('/api/llm/providers', methods=['GET'])
+def llm_provider_stats():
+    """Per-provider routing statistics used by the "Auto" provider"""
+    return jsonify({'success': True, 'providers': get_provider_stats()})
+
+@app.route('/api/telemetry/llm', methods=['GET'])
+def llm_telemetry():
+    """Latency/throughput aggregates per provider, model and feature"""
+    try:
+        aggregates = get_aggregates(
+            feature=request.args.get('feature'),
+            provider=request.args.get('provider')
+        )
+        return jsonify({'success': True, 'aggregates': aggregates})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/models/warm', methods=['GET'])
+def warm_models():
+    """Which local Ollama models are resident in memory"""
+    try:
+        return jsonify({'success': True, **get_residency_status()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ============================================================================
 # MEDIA MANAGEMENT
 # ============================================================================
@@ -57,14 +95,14 @@ def health_check():
 def list_media():
     """List all uploaded media files"""
     try:
-        files = list_media_files()
+        # The index already holds name and size, so nothing is stat'ed here
         file_list = [
             {
-                'path': f,
-                'name': os.path.basename(f),
-                'size': os.path.getsize(f)
+                'path': f['path'],
+                'name': f['name'],
+                'size': f['size']
             }
-            for f in files
+            for f in list_media_files(details=True)
         ]
         return jsonify({'success': True, 'files': file_list})
     except Exception as e:
@@ -84,21 +122,17 @@ def upload_media():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'File type not allowed'}), 400
         
-        # Save file using existing utility
+        # Hashed while it is written; identical content is stored once and
+        # the timestamped name becomes a hard link to it
         filename = secure_filename(file.filename)
-        temp_path = os.path.join(MEDIA_ROOT, filename)
-        os.makedirs(MEDIA_ROOT, exist_ok=True)
-        file.save(temp_path)
-        
-        # Generate proper filename with timestamp
-        final_name = generate_filename(os.path.splitext(filename)[0], os.path.splitext(filename)[1])
-        final_path = get_storage_path(MEDIA_ROOT, final_name)
-        os.rename(temp_path, final_path)
+        saved = save_media_stream(file.stream, filename)
         
         return jsonify({
             'success': True,
-            'path': final_path,
-            'filename': final_name
+            'path': saved['path'],
+            'filename': saved['filename'],
+            'duplicate': saved['duplicate'],
+            'existing': saved['existing']
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -143,6 +177,27 @@ def transcribe():
         if not source_path or not os.path.exists(source_path):
             return jsonify({'success': False, 'error': 'Invalid file path'}), 400
         
+        # Identical content was transcribed before under another name: reuse that transcript
+        reused = None if data.get('force') else reuse_transcripts(source_path)
+        if reused:
+            with open(reused['transcript_path'], 'r', encoding='utf-8') as f:
+                transcript_text = f.read()
+            response = {
+                'success': True,
+                'type': reused['type'],
+                'transcript': transcript_text,
+                'transcript_path': reused['transcript_path'],
+                'reused': True
+            }
+            if reused['type'] == 'media':
+                timestamped_text = ''
+                if reused['timestamped_path']:
+                    with open(reused['timestamped_path'], 'r', encoding='utf-8') as f:
+                        timestamped_text = f.read()
+                response['timestamped'] = timestamped_text
+                response['timestamped_path'] = reused['timestamped_path']
+            return jsonify(response)
+        
         # Route to unified processor
         result = process_unified_file(source_path)
         
@@ -200,14 +255,14 @@ def transcribe():
 def list_transcripts():
     """List all transcripts"""
     try:
-        files = list_transcript_files()
+        # The index already holds name and size, so nothing is stat'ed here
         transcript_list = [
             {
-                'path': f,
-                'name': os.path.basename(f),
-                'size': os.path.getsize(f)
+                'path': f['path'],
+                'name': f['name'],
+                'size': f['size']
             }
-            for f in files
+            for f in list_transcript_files(details=True)
         ]
         return jsonify({'success': True, 'transcripts': transcript_list})
     except Exception as e:
@@ -252,25 +307,69 @@ def generate_tts():
             return jsonify({'success': False, 'error': 'Transcript is empty'}), 400
         
         tts_mode = data.get('tts_mode', 'transcript')
-        print(f"Generating TTS in mode: {tts_mode}")
+        stream = data.get('stream', False)
+        parallel = data.get('parallel', False)
+        audio_format = data.get('format', 'wav')
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'success': False, 'error': f"Unsupported audio format: {audio_format}"}), 400
+        extension = AUDIO_FORMATS[audio_format]
+        print(f"Generating TTS in mode: {tts_mode} ({audio_format})")
         
+        base_name = os.path.splitext(os.path.basename(transcript_path))[0]
         if tts_mode == 'summary':
-            # Generate conversational summary using Gemini Flash
-            print("Requesting conversational summary...")
-            text_content = generate_conversational_summary(text_content)
-            print("Summary generated successfully.")
-            base_name = os.path.splitext(os.path.basename(transcript_path))[0]
-            tts_filename = f"{base_name}_Summary_TTS.wav"
+            tts_filename = f"{base_name}_Summary_TTS{extension}"
         else:
-            base_name = os.path.splitext(os.path.basename(transcript_path))[0]
-            tts_filename = f"{base_name}_TTS.wav"
-            
-        # Generate TTS
+            tts_filename = f"{base_name}_TTS{extension}"
         tts_path = get_storage_path(TTS_ROOT, tts_filename)
         print(f"Saving TTS to: {tts_path}")
         
-        generate_tts_audio(text_content, tts_path)
-        print("TTS audio file created.")
+        def synthesize():
+            if tts_mode == 'summary':
+                # Stream the conversational summary (Gemini Flash) straight into Kokoro,
+                # so synthesis of the first paragraphs overlaps with the rest of the summary
+                print("Requesting conversational summary...")
+                speech_writer = StreamingSpeechWriter(tts_path)
+                try:
+                    for paragraph in stream_conversational_summary(text_content):
+                        speech_writer.feed(paragraph)
+                except Exception:
+                    speech_writer.cancel()
+                    raise
+                print("Summary generated successfully.")
+                speech_writer.close()
+            else:
+                generate_tts_audio(text_content, tts_path, parallel=parallel)
+            print("TTS audio file created.")
+        
+        if stream:
+            # Return right away; the client plays the file while it is written.
+            # An older file of the same name must not be served in the meantime.
+            if os.path.exists(tts_path):
+                os.remove(tts_path)
+            mark_live(tts_path)
+            
+            def run():
+                try:
+                    synthesize()
+                except Exception as e:
+                    print(f"Error in TTS generation: {str(e)}")
+                    # The client already got success; it learns of the failure from the status endpoint
+                    mark_failed(tts_path, e)
+                finally:
+                    mark_live(tts_path, False)
+            
+            threading.Thread(target=run, daemon=True).start()
+            return jsonify({
+                'success': True,
+                'audio_path': tts_path,
+                'filename': tts_filename,
+                'streaming': True,
+                'audio_url': f"/api/tts/live/{tts_filename}",
+                'download_url': f"/api/tts/download/{tts_filename}",
+                'status_url': f"/api/tts/status/{tts_filename}"
+            })
+        
+        synthesize()
         
         # Return filename and a relative URL for the frontend
         return jsonify({
@@ -283,14 +382,40 @@ def generate_tts():
         print(f"Error in TTS generation: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/tts/live/<filename>', methods=['GET'])
+def live_tts(filename):
+    """Stream TTS audio while it is still being synthesized"""
+    try:
+        path = storage_path(TTS_ROOT, filename)
+        error = live_error(path)
+        if error and not os.path.exists(path):
+            return jsonify({'success': False, 'error': error}), 500
+        # WAV headers carry maximum sizes and Ogg/MP3 are streamable, so players start before the file is complete
+        return Response(tail_audio(path), mimetype=audio_mimetype(path), headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except Exception as e:
+        return str(e), 500
+
+@app.route('/api/tts/status/<filename>', methods=['GET'])
+def tts_status(filename):
+    """Whether a streamed TTS file is still being written and why it failed, if it did"""
+    path = storage_path(TTS_ROOT, filename)
+    error = live_error(path)
+    return jsonify({
+        'success': error is None,
+        'live': is_live(path),
+        'available': os.path.exists(path),
+        'error': error
+    })
+
 @app.route('/api/tts/download/<filename>', methods=['GET'])
 def download_tts(filename):
     """Download generated TTS audio"""
     try:
-        path = get_storage_path(TTS_ROOT, filename)
+        path = storage_path(TTS_ROOT, filename)
         if not os.path.exists(path):
             return "File not found", 404
-        return send_file(path, mimetype="audio/wav")
+        # conditional=True answers Range requests with 206 partial content, so players can seek
+        return send_file(path, mimetype=audio_mimetype(path), conditional=True)
     except Exception as e:
         return str(e), 500
 
@@ -311,17 +436,57 @@ def stream_latex():
         if not transcript_path or not os.path.exists(transcript_path):
             return jsonify({'success': False, 'error': 'Invalid transcript path'}), 400
             
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            transcript_text = f.read()
-            
+        def produce():
+            with open(transcript_path, 'r', encoding='utf-8') as f:
+                transcript_text = f.read()
+            return generate_latex_code(transcript_text, model_name=model_name, summary_mode=summary_mode, provider=provider)
+
+        # Identical requests already in flight share one generation
+        key = latex_flight_key(transcript_path, model_name, summary_mode, provider)
+        chunks, joined = latex_flights.stream(key, produce)
+
+        # Completed sections are compiled in the background; see /api/pdf/preview/<id>.
+        # Coalesced requests share the preview of the generation they joined
+        preview = open_preview(key, joined)
+
         def generate():
-            for chunk in generate_latex_code(transcript_text, model_name=model_name, summary_mode=summary_mode, provider=provider):
-                yield chunk
-                
-        return Response(generate(), mimetype='text/plain')
+            # Counted here, on the first iteration, so a response that never starts is not a reader
+            preview.attach()
+            offset = 0
+            complete = False
+            try:
+                for chunk in chunks:
+                    preview.feed(chunk, offset)
+                    offset += len(chunk)
+                    yield chunk
+                complete = True
+            finally:
+                # Also runs when the client disconnects or generation fails
+                preview.release(complete)
+
+        headers = {'X-Coalesced': 'true' if joined else 'false', 'X-Preview-Id': preview.id}
+        return Response(generate(), mimetype='text/plain', headers=headers)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/pdf/preview/<preview_id>', methods=['GET'])
+def pdf_preview(preview_id):
+    """Serve the latest compiled partial PDF of a streaming LaTeX generation"""
+    preview = get_preview(preview_id)
+    if preview is None:
+        return jsonify({'success': False, 'error': 'Preview not found'}), 404
+    if not os.path.exists(preview.pdf_path):
+        return jsonify({'success': False, 'error': 'No preview compiled yet', 'preview': preview.status()}), 404
+    return send_file(preview.pdf_path, mimetype='application/pdf', max_age=0)
+
+@app.route('/api/pdf/preview/<preview_id>/status', methods=['GET'])
+def pdf_preview_status(preview_id):
+    """How many sections the preview PDF covers and whether it is complete"""
+    preview = get_preview(preview_id)
+    if preview is None:
+        return jsonify({'success': False, 'error': 'Preview not found'}), 404
+    return jsonify({'success': True, 'preview': preview.status()})
+
 @app.route('/api/pdf/generate', methods=['POST'])
 def generate_pdf():
     """Generate PDF summary from transcript or provided LaTeX code"""
@@ -339,21 +504,17 @@ def generate_pdf():
         if provided_latex:
             latex_code = provided_latex
         else:
-            # Read transcript
-            with open(transcript_path, 'r', encoding='utf-8') as f:
-                transcript_text = f.read()
-            
-            # Generate LaTeX (collect all chunks)
-            latex_code = ""
-            for chunk in generate_latex_code(transcript_text, model_name=model_name, summary_mode=summary_mode, provider=provider):
-                latex_code += chunk
-        
-        # Clean up markdown markers
-        if "```latex" in latex_code:
-            latex_code = latex_code.replace("```latex", "").replace("```", "")
-        elif "```" in latex_code:
-            latex_code = latex_code.replace("```", "")
-        latex_code = latex_code.strip()
+            def produce():
+                with open(transcript_path, 'r', encoding='utf-8') as f:
+                    transcript_text = f.read()
+                return generate_latex_code(transcript_text, model_name=model_name, summary_mode=summary_mode, provider=provider)
+
+            # Generate LaTeX (collect all chunks), joining a matching stream if one is running
+            key = latex_flight_key(transcript_path, model_name, summary_mode, provider)
+            latex_code = latex_flights.run(key, produce)
+        
+        # Clean up markdown markers (the full lint runs at compile time)
+        latex_code = strip_code_fences(latex_code)
         
         # Save .tex file
         base_name = os.path.splitext(os.path.basename(transcript_path))[0]
@@ -364,7 +525,7 @@ def generate_pdf():
         output_dir = os.path.dirname(target_pdf_path)
         os.makedirs(output_dir, exist_ok=True)
         
-        tex_path = os.path.join(output_dir, tex_filename)
+        tex_path = get_storage_path(RENDER_ROOT, tex_filename)
         
         # Write .tex file
         with open(tex_path, 'w', encoding='utf-8') as f:
@@ -372,14 +533,21 @@ def generate_pdf():
         
         # Compile PDF
         try:
-            final_pdf = compile_latex_to_pdf(tex_path, cleanup=True, output_dir=output_dir)
+            # Lint and repair the generated source before/after compiling
+            compiled = compile_with_repair(tex_path, output_dir=output_dir, model_name=model_name, provider=provider)
+            if not compiled['success']:
+                raise RuntimeError(compiled['error'])
             
             return jsonify({
                 'success': True,
-                'pdf_path': final_pdf,
+                'pdf_path': compiled['pdf_path'],
                 'tex_path': tex_path,
                 'pdf_filename': pdf_filename,
-                'tex_filename': tex_filename
+                'tex_filename': tex_filename,
+                'passes': compiled['passes'],
+                'cached': compiled['cached'],
+                'lint_fixes': sum(1 for issue in compiled['issues'] if issue['fixed']),
+                'repairs': compiled['repairs']
             })
         except Exception as e:
             return jsonify({
@@ -396,14 +564,14 @@ def generate_pdf():
 def list_latex():
     """List all LaTeX files"""
     try:
-        files = list_latex_files()
+        # The index already holds name and size, so nothing is stat'ed here
         latex_list = [
             {
-                'path': f,
-                'name': os.path.basename(f),
-                'size': os.path.getsize(f)
+                'path': f['path'],
+                'name': f['name'],
+                'size': f['size']
             }
-            for f in files
+            for f in list_latex_files(details=True)
         ]
         return jsonify({'success': True, 'files': latex_list})
     except Exception as e:
@@ -421,6 +589,7 @@ def generate_quiz_endpoint():
         latex_path = data.get('latex_path')
         model_name = data.get('model_name', 'gpt-oss:latest')
         num_questions = data.get('num_questions', 10)
+        provider = data.get('provider', 'Ollama')
         
         if not latex_path or not os.path.exists(latex_path):
             return jsonify({'success': False, 'error': 'Invalid LaTeX path'}), 400
@@ -430,7 +599,7 @@ def generate_quiz_endpoint():
             latex_content = f.read()
         
         # Generate quiz
-        json_response = generate_quiz(latex_content, model_name=model_name, num_questions=num_questions)
+        json_response = generate_quiz(latex_content, model_name=model_name, num_questions=num_questions, provider=provider)
         
         # Parse JSON
         quiz_data = json.loads(json_response)
@@ -454,6 +623,71 @@ def generate_quiz_endpoint():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/quiz/stream', methods=['POST'])
+def stream_quiz_endpoint():
+    """Stream quiz generation as NDJSON events, one per completed question"""
+    try:
+        data = request.get_json()
+        latex_path = data.get('latex_path')
+        model_name = data.get('model_name', 'gpt-oss:latest')
+        num_questions = data.get('num_questions', 10)
+        provider = data.get('provider', 'Ollama')
+        
+        if not latex_path or not os.path.exists(latex_path):
+            return jsonify({'success': False, 'error': 'Invalid LaTeX path'}), 400
+        
+        with open(latex_path, 'r', encoding='utf-8') as f:
+            latex_content = f.read()
+        
+        def event(payload):
+            return json.dumps(payload) + "\n"
+        
+        def generate():
+            parser = QuizStreamParser()
+            title_sent = False
+            try:
+                for chunk in generate_quiz_stream(latex_content, model_name=model_name, num_questions=num_questions, provider=provider):
+                    for question in parser.feed(chunk):
+                        if not title_sent and parser.quiz_title:
+                            yield event({'type': 'meta', 'quiz_title': parser.quiz_title, 'total_questions': num_questions})
+                            title_sent = True
+                        yield event({'type': 'question', 'question': question})
+                
+                # Prefer the full document; fall back to the questions we managed to parse
+                try:
+                    quiz_data = json.loads(clean_quiz_json(parser.buffer))
+                except json.JSONDecodeError:
+                    if not parser.questions:
+                        raise
+                    quiz_data = {
+                        'quiz_title': parser.quiz_title or 'Quiz',
+                        'total_questions': len(parser.questions),
+                        'questions': parser.questions
+                    }
+                
+                base_name = os.path.splitext(os.path.basename(latex_path))[0]
+                quiz_filename = f"{base_name}_Quiz.json"
+                quiz_path = get_storage_path(QUIZ_ROOT, quiz_filename)
+                
+                with open(quiz_path, 'w', encoding='utf-8') as f:
+                    json.dump(quiz_data, f, indent=2)
+                
+                yield event({
+                    'type': 'done',
+                    'quiz_data': quiz_data,
+                    'quiz_path': quiz_path,
+                    'quiz_filename': quiz_filename
+                })
+            except json.JSONDecodeError as e:
+                yield event({'type': 'error', 'error': f'Failed to parse quiz JSON: {str(e)}'})
+            except Exception as e:
+                print(f"Error in quiz streaming: {str(e)}")
+                yield event({'type': 'error', 'error': str(e)})
+        
+        return Response(generate(), mimetype='application/x-ndjson')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ============================================================================
 # FILE DOWNLOAD
 # ============================================================================
@@ -472,6 +706,24 @@ def download_file():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List background jobs started by chat tools"""
+    active_only = request.args.get('active') == 'true'
+    return jsonify({'success': True, 'jobs': job_manager.list_jobs(active_only=active_only)})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and result of a background job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
 # ============================================================================
 # CHATBOT
 # ============================================================================
@@ -481,10 +733,12 @@ def chat():
     """AI Chatbot with tool calling"""
     try:
         data = request.get_json()
-        messages = data.get('messages', [])
         model_name = data.get('model_name', 'qwen3:30b-instruct')
         provider = data.get('provider', 'Ollama')
 
+        # Keep the resent history within the prompt budget
+        messages = compact_messages(data.get('messages', []), model_name, provider)
+
         # First call to get model response and potential tool calls
         response_message = chat_with_tools(messages, model_name, provider)
         
@@ -500,110 +754,15 @@ def chat():
         tool_results = []
         messages.append(response_message)
 
-        for tool_call in response_message.tool_calls:
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            
-            print(f"🛠️ Executing tool: {function_name} with {function_args}")
-            
-            result = None
-            if function_name == "download_youtube":
-                url = function_args.get("url")
-                temp_name = generate_filename("youtube_download", suffix="")
-                temp_base = os.path.splitext(temp_name)[0]
-                save_path_template = get_storage_path(MEDIA_ROOT, temp_base)
-                source_path = download_youtube_audio(url, save_path_template)
-                result = {"status": "success", "path": source_path, "filename": os.path.basename(source_path)}
-            
-            elif function_name == "transcribe_file":
-                path = function_args.get("path")
-                
-                # Use unified processing
-                transcription_result = process_unified_file(path)
-                
-                # Save results based on type
-                base_name = os.path.splitext(os.path.basename(path))[0]
-                if transcription_result["type"] == "media":
-                    transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript.txt")
-                    content = transcription_result["text"]
-                else:
-                    transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_ocr.txt")
-                    content = transcription_result["content"]
-                    
-                with open(transcript_path, "w", encoding="utf-8") as f:
-                    f.write(content)
-                
-                result = {
-                    "status": "success", 
-                    "type": transcription_result["type"],
-                    "transcript_path": transcript_path, 
-                    "text_preview": content[:200] + "..."
-                }
-            
-            elif function_name == "generate_summary_pdf":
-                t_path = function_args.get("transcript_path")
-                m_name = function_args.get("model_name", "gpt-oss:latest")
-                
-                with open(t_path, 'r', encoding='utf-8') as f:
-                    transcript_text = f.read()
-                
-                latex_code = ""
-                for chunk in generate_latex_code(transcript_text, model_name=m_name):
-                    latex_code += chunk
-                
-                if "```latex" in latex_code:
-                    latex_code = latex_code.replace("```latex", "").replace("```", "")
-                elif "```" in latex_code:
-                    latex_code = latex_code.replace("```", "")
-                latex_code = latex_code.strip()
-                
-                base_name = os.path.splitext(os.path.basename(t_path))[0]
-                pdf_filename = f"{base_name}_Summary.pdf"
-                target_pdf_path = get_storage_path(RENDER_ROOT, pdf_filename)
-                output_dir = os.path.dirname(target_pdf_path)
-                os.makedirs(output_dir, exist_ok=True)
-                
-                tex_path = os.path.join(output_dir, f"{base_name}_Summary.tex")
-                with open(tex_path, 'w', encoding='utf-8') as f:
-                    f.write(latex_code)
-                
-                final_pdf = compile_latex_to_pdf(tex_path, cleanup=True, output_dir=output_dir)
-                result = {"status": "success", "pdf_path": final_pdf, "tex_path": tex_path}
-            
-            elif function_name == "generate_quiz_from_latex":
-                l_path = function_args.get("latex_path")
-                num_q = function_args.get("num_questions", 10)
-                
-                with open(l_path, 'r', encoding='utf-8') as f:
-                    latex_content = f.read()
-                
-                json_response = generate_quiz(latex_content, num_questions=num_q)
-                quiz_data = json.loads(json_response)
-                
-                base_name = os.path.splitext(os.path.basename(l_path))[0]
-                quiz_path = get_storage_path(QUIZ_ROOT, f"{base_name}_Quiz.json")
-                with open(quiz_path, 'w', encoding='utf-8') as f:
-                    json.dump(quiz_data, f, indent=2)
-                
-                result = {"status": "success", "quiz_path": quiz_path}
-            
-            elif function_name == "list_files":
-                f_type = function_args.get("folder_type")
-                file_list = []
-                if f_type == "media":
-                    file_list = [os.path.basename(f) for f in list_media_files()]
-                elif f_type == "transcripts":
-                    file_list = [os.path.basename(f) for f in list_transcript_files()]
-                elif f_type == "latex":
-                    file_list = [os.path.basename(f) for f in list_latex_files()]
-                elif f_type == "quiz":
-                    files = []
-                    if os.path.exists(QUIZ_ROOT):
-                        files = [os.path.join(QUIZ_ROOT, f) for f in os.listdir(QUIZ_ROOT) if f.endswith('.json')]
-                    file_list = [os.path.basename(f) for f in files]
-                
-                result = {"status": "success", "files": file_list}
+        calls = [
+            (tool_call.function.name, json.loads(tool_call.function.arguments))
+            for tool_call in response_message.tool_calls
+        ]
+
+        # Independent tools run concurrently; results come back in the original order
+        results = execute_tool_calls(calls)
 
+        for tool_call, (function_name, _), result in zip(response_message.tool_calls, calls, results):
             messages.append({
                 "tool_call_id": tool_call.id,
                 "role": "tool",
@@ -625,6 +784,86 @@ def chat():
         print(f"❌ Chat Error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    AI Chatbot with tool calling, streamed as Server-Sent Events.
+    Events: token (assistant text), tool_start / tool_progress / tool_end
+    (tool execution), done (final message and tool results) and error.
+    """
+    data = request.get_json()
+    model_name = data.get('model_name', 'qwen3:30b-instruct')
+    provider = data.get('provider', 'Ollama')
+
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def stream_turn(messages):
+        """Streams one model turn; the assembled message is returned via StopIteration"""
+        message = None
+        for event in stream_chat_with_tools(messages, model_name, provider):
+            if event["type"] == "token":
+                yield sse('token', {'content': event["content"]})
+            else:
+                message = event["message"]
+        return message
+
+    def generate():
+        try:
+            # Keep the resent history within the prompt budget
+            messages = compact_messages(data.get('messages', []), model_name, provider)
+            response_message = yield from stream_turn(messages)
+
+            if not response_message.get("tool_calls"):
+                yield sse('done', {'message': response_message["content"], 'tool_results': []})
+                return
+
+            messages.append(response_message)
+            calls = [
+                (tool_call["function"]["name"], json.loads(tool_call["function"]["arguments"] or "{}"))
+                for tool_call in response_message["tool_calls"]
+            ]
+
+            # Tools run on the worker pool; their events are relayed through a queue
+            events = queue.Queue()
+
+            def run_tools():
+                try:
+                    events.put(('results', execute_tool_calls(calls, lambda kind, payload: events.put((kind, payload)))))
+                except Exception as e:
+                    events.put(('failed', e))
+
+            threading.Thread(target=run_tools, daemon=True).start()
+
+            while True:
+                kind, payload = events.get()
+                if kind == 'results':
+                    results = payload
+                    break
+                if kind == 'failed':
+                    raise payload
+                yield sse(kind, payload)
+
+            tool_results = []
+            for tool_call, (function_name, _), result in zip(response_message["tool_calls"], calls, results):
+                messages.append({
+                    "tool_call_id": tool_call["id"],
+                    "role": "tool",
+                    "name": function_name,
+                    "content": json.dumps(result),
+                })
+                tool_results.append({"tool": function_name, "result": result})
+
+            # Final answer after tool execution
+            final_message = yield from stream_turn(messages)
+            yield sse('done', {'message': final_message["content"], 'tool_results': tool_results})
+
+        except Exception as e:
+            print(f"❌ Chat Error: {str(e)}")
+            yield sse('error', {'error': str(e)})
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
@@ -649,6 +888,13 @@ if __name__ == '__main__':
     os.makedirs(RENDER_ROOT, exist_ok=True)
     os.makedirs(QUIZ_ROOT, exist_ok=True)
     
+    # Load the default local models now so interactive requests don't pay the cold start.
+    # With the debug reloader, only the serving child process does this.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        preload_default_models()
+        warm_latex_toolchain()
+        warm_tts_pipelines()
+    
     print("🚀 Starting Flask Backend Server...")
     print("📡 API will be available at: http://localhost:5000")
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,229 @@
+"""
+Async Backend API for LLM-heavy endpoints
+Serves streaming generations on an asyncio event loop so a single process
+can multiplex many concurrent generations instead of pinning one worker
+thread per request. Mounted under /api/async by the Vite proxy.
+"""
+
+from quart import Quart, request, jsonify
+from quart_cors import cors
+import asyncio
+import os
+import sys
+import json
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils_storage import get_storage_path, QUIZ_ROOT
+from utils_llm_async import (
+    agenerate_latex_code, agenerate_podcast_script,
+    agenerate_conversational_summary, agenerate_quiz, achat_with_tools
+)
+from utils_model_residency import preload_default_models
+from utils_tts import warm_tts_pipelines
+from chat_tools import execute_tool_calls
+from utils_jobs import job_manager
+from utils_chat_history import compact_messages
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*")  # Enable CORS for React frontend
+
+@app.before_serving
+async def warm_models():
+    """Load the default local models and Kokoro before the first request arrives"""
+    preload_default_models()
+    warm_tts_pipelines()
+
+async def read_text(path: str) -> str:
+    """Reads a text file without blocking the event loop"""
+    def _read():
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return await asyncio.to_thread(_read)
+
+# ============================================================================
+# HEALTH CHECK
+# ============================================================================
+
+@app.route('/api/async/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({'status': 'ok', 'message': 'Async backend is running'})
+
+# ============================================================================
+# STREAMING GENERATION
+# ============================================================================
+
+@app.route('/api/async/pdf/stream_latex', methods=['POST'])
+async def stream_latex():
+    """Stream LaTeX code generation"""
+    try:
+        data = await request.get_json()
+        transcript_path = data.get('transcript_path')
+        model_name = data.get('model_name', 'openai/gpt-oss-120b')
+        summary_mode = data.get('summary_mode', 'concise')
+        provider = data.get('provider', 'OpenRouter')
+
+        if not transcript_path or not os.path.exists(transcript_path):
+            return jsonify({'success': False, 'error': 'Invalid transcript path'}), 400
+
+        transcript_text = await read_text(transcript_path)
+
+        async def generate():
+            async for chunk in agenerate_latex_code(transcript_text, model_name=model_name, summary_mode=summary_mode, provider=provider):
+                yield chunk.encode('utf-8')
+
+        return generate(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/async/podcast/stream', methods=['POST'])
+async def stream_podcast():
+    """Stream a podcast script for a transcript"""
+    try:
+        data = await request.get_json()
+        transcript_path = data.get('transcript_path')
+        model_name = data.get('model_name', 'qwen3:30b-instruct')
+        provider = data.get('provider', 'Ollama')
+
+        if not transcript_path or not os.path.exists(transcript_path):
+            return jsonify({'success': False, 'error': 'Invalid transcript path'}), 400
+
+        transcript_text = await read_text(transcript_path)
+
+        async def generate():
+            async for chunk in agenerate_podcast_script(transcript_text, model_name=model_name, provider=provider):
+                yield chunk.encode('utf-8')
+
+        return generate(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/async/summary', methods=['POST'])
+async def conversational_summary():
+    """Generate a conversational summary for a transcript"""
+    try:
+        data = await request.get_json()
+        transcript_path = data.get('transcript_path')
+
+        if not transcript_path or not os.path.exists(transcript_path):
+            return jsonify({'success': False, 'error': 'Invalid transcript path'}), 400
+
+        transcript_text = await read_text(transcript_path)
+        summary = await agenerate_conversational_summary(transcript_text)
+
+        return jsonify({'success': True, 'summary': summary})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/async/quiz/generate', methods=['POST'])
+async def generate_quiz_endpoint():
+    """Generate quiz from LaTeX summary"""
+    try:
+        data = await request.get_json()
+        latex_path = data.get('latex_path')
+        model_name = data.get('model_name', 'gpt-oss:latest')
+        num_questions = data.get('num_questions', 10)
+        provider = data.get('provider', 'Ollama')
+
+        if not latex_path or not os.path.exists(latex_path):
+            return jsonify({'success': False, 'error': 'Invalid LaTeX path'}), 400
+
+        latex_content = await read_text(latex_path)
+        json_response = await agenerate_quiz(latex_content, model_name=model_name, num_questions=num_questions, provider=provider)
+        quiz_data = json.loads(json_response)
+
+        base_name = os.path.splitext(os.path.basename(latex_path))[0]
+        quiz_filename = f"{base_name}_Quiz.json"
+        quiz_path = get_storage_path(QUIZ_ROOT, quiz_filename)
+
+        with open(quiz_path, 'w', encoding='utf-8') as f:
+            json.dump(quiz_data, f, indent=2)
+
+        return jsonify({
+            'success': True,
+            'quiz_data': quiz_data,
+            'quiz_path': quiz_path,
+            'quiz_filename': quiz_filename
+        })
+    except json.JSONDecodeError as e:
+        return jsonify({'success': False, 'error': f'Failed to parse quiz JSON: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
+
+@app.route('/api/async/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """Status, progress and result of a background job started by a chat tool"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+# ============================================================================
+# CHATBOT
+# ============================================================================
+
+@app.route('/api/async/chat', methods=['POST'])
+async def chat():
+    """AI Chatbot with tool calling"""
+    try:
+        data = await request.get_json()
+        model_name = data.get('model_name', 'qwen3:30b-instruct')
+        provider = data.get('provider', 'Ollama')
+
+        # Keep the resent history within the prompt budget (may call the LLM, so off the loop)
+        messages = await asyncio.to_thread(compact_messages, data.get('messages', []), model_name, provider)
+
+        response_message = await achat_with_tools(messages, model_name, provider)
+
+        if not response_message.tool_calls:
+            return jsonify({
+                'success': True,
+                'message': response_message.content,
+                'tool_calls': []
+            })
+
+        tool_results = []
+        messages.append(response_message)
+
+        calls = [
+            (tool_call.function.name, json.loads(tool_call.function.arguments))
+            for tool_call in response_message.tool_calls
+        ]
+
+        # Tools are blocking (Whisper, pdflatex, ...), keep them off the event loop
+        results = await asyncio.to_thread(execute_tool_calls, calls)
+
+        for tool_call, (function_name, _), result in zip(response_message.tool_calls, calls, results):
+            messages.append({
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": function_name,
+                "content": json.dumps(result),
+            })
+            tool_results.append({"tool": function_name, "result": result})
+
+        final_response = await achat_with_tools(messages, model_name, provider)
+
+        return jsonify({
+            'success': True,
+            'message': final_response.content,
+            'tool_results': tool_results
+        })
+    except Exception as e:
+        print(f"❌ Chat Error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == '__main__':
+    print("🚀 Starting Async Backend Server...")
+    print("📡 API will be available at: http://localhost:5001/api/async")
+    app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,306 @@
+"""
+Tool implementations for the chat endpoints.
+Shared by the Flask backend and the async backend.
+"""
+
+import os
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils_storage import (
+    get_storage_path, TRANSCRIPT_ROOT, generate_filename, MEDIA_ROOT,
+    list_media_files, list_transcript_files, RENDER_ROOT,
+    list_latex_files, QUIZ_ROOT, reuse_transcripts
+)
+from utils_processing import download_youtube_audio, process_unified_file
+from utils_latex_lint import strip_code_fences, compile_with_repair
+from utils_llm import generate_latex_code
+from utils_singleflight import latex_flights, latex_flight_key
+from utils_llm_quiz import generate_quiz
+from utils_jobs import job_manager
+
+# Tools that run as background jobs; the model gets a job ID and polls it with check_job
+BACKGROUND_TOOLS = {"transcribe_file", "generate_summary_pdf", "generate_quiz_from_latex"}
+
+# Longest a single check_job call may block waiting for completion
+MAX_JOB_WAIT_S = 30
+
+def execute_tool(function_name: str, function_args: dict, progress=None) -> dict:
+    """
+    Runs a single tool call requested by the model and returns its JSON-serializable result.
+    Long-running tools are queued as background jobs and return a job handle immediately.
+    """
+    if function_name in BACKGROUND_TOOLS:
+        return start_tool_job(function_name, function_args)
+
+    if function_name == "check_job":
+        return check_job(function_args.get("job_id"), function_args.get("wait_seconds", 0))
+
+    return run_tool(function_name, function_args, progress)
+
+def start_tool_job(function_name: str, function_args: dict) -> dict:
+    """
+    Queues a tool as a background job. It waits for any active job it conflicts
+    with (e.g. a summary of a transcript that is still being written).
+    """
+    resources = tool_resources(function_name, function_args)
+    depends_on = [
+        job["id"] for job in job_manager.list_jobs(active_only=True)
+        if tools_conflict(resources, tool_resources(job["kind"], job["args"]))
+    ]
+    job = job_manager.submit(
+        function_name,
+        lambda progress: run_tool(function_name, function_args, progress),
+        args=function_args,
+        depends_on=depends_on
+    )
+    return {
+        "status": "queued",
+        "job_id": job["id"],
+        "message": f"{function_name} is running in the background. Call check_job with this job_id to get its result."
+    }
+
+def check_job(job_id: str, wait_seconds: float = 0) -> dict:
+    """
+    Reports a background job's status, optionally waiting a little for it to finish.
+    """
+    wait_seconds = min(max(float(wait_seconds or 0), 0), MAX_JOB_WAIT_S)
+    job = job_manager.wait_for(job_id, wait_seconds) if wait_seconds else job_manager.get(job_id)
+    if job is None:
+        return {"status": "error", "error": f"Unknown job: {job_id}"}
+    return {
+        "status": job["status"],
+        "job_id": job["id"],
+        "tool": job["kind"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+def run_tool(function_name: str, function_args: dict, progress=None) -> dict:
+    """
+    Runs a tool synchronously and returns its JSON-serializable result.
+    progress(message) is called with human-readable status updates for long-running tools.
+    """
+    report = progress or (lambda message: None)
+    result = None
+    if function_name == "download_youtube":
+        url = function_args.get("url")
+        report(f"Downloading {url}")
+        # Short random suffix: parallel downloads in the same second must not share a name
+        temp_name = generate_filename("youtube_download", suffix=f"_{uuid.uuid4().hex[:6]}")
+        temp_base = os.path.splitext(temp_name)[0]
+        save_path_template = get_storage_path(MEDIA_ROOT, temp_base)
+        source_path = download_youtube_audio(url, save_path_template)
+        result = {"status": "success", "path": source_path, "filename": os.path.basename(source_path)}
+
+    elif function_name == "transcribe_file":
+        path = function_args.get("path")
+        report(f"Transcribing {os.path.basename(path)}")
+
+        # Identical content was transcribed before under another name: reuse that transcript
+        reused = reuse_transcripts(path)
+        if reused:
+            transcript_path = reused["transcript_path"]
+            content_type = reused["type"]
+            with open(transcript_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        else:
+            # Use unified processing
+            transcription_result = process_unified_file(path)
+            content_type = transcription_result["type"]
+
+            # Save results based on type
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            if content_type == "media":
+                transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript.txt")
+                content = transcription_result["text"]
+            else:
+                transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_ocr.txt")
+                content = transcription_result["content"]
+
+            with open(transcript_path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+        result = {
+            "status": "success", 
+            "type": content_type,
+            "transcript_path": transcript_path, 
+            "text_preview": content[:200] + "...",
+            "reused": bool(reused)
+        }
+
+    elif function_name == "generate_summary_pdf":
+        t_path = function_args.get("transcript_path")
+        m_name = function_args.get("model_name", "gpt-oss:latest")
+
+        def produce():
+            with open(t_path, 'r', encoding='utf-8') as f:
+                transcript_text = f.read()
+            return generate_latex_code(transcript_text, model_name=m_name)
+
+        report("Generating LaTeX summary")
+        chunks, _ = latex_flights.stream(latex_flight_key(t_path, m_name, "concise", "Ollama"), produce)
+        latex_code = ""
+        for chunk in chunks:
+            previous = len(latex_code)
+            latex_code += chunk
+            if len(latex_code) // 2000 > previous // 2000:
+                report(f"Generated {len(latex_code)} characters of LaTeX")
+
+        latex_code = strip_code_fences(latex_code)
+
+        base_name = os.path.splitext(os.path.basename(t_path))[0]
+        pdf_filename = f"{base_name}_Summary.pdf"
+        target_pdf_path = get_storage_path(RENDER_ROOT, pdf_filename)
+        output_dir = os.path.dirname(target_pdf_path)
+        os.makedirs(output_dir, exist_ok=True)
+
+        tex_path = get_storage_path(RENDER_ROOT, f"{base_name}_Summary.tex")
+        with open(tex_path, 'w', encoding='utf-8') as f:
+            f.write(latex_code)
+
+        report("Compiling PDF")
+        compiled = compile_with_repair(tex_path, output_dir=output_dir, model_name=m_name)
+        if not compiled["success"]:
+            raise RuntimeError(compiled["error"])
+        result = {"status": "success", "pdf_path": compiled["pdf_path"], "tex_path": tex_path, "passes": compiled["passes"]}
+
+    elif function_name == "generate_quiz_from_latex":
+        l_path = function_args.get("latex_path")
+        num_q = function_args.get("num_questions", 10)
+
+        with open(l_path, 'r', encoding='utf-8') as f:
+            latex_content = f.read()
+
+        report(f"Generating {num_q} quiz questions")
+        json_response = generate_quiz(latex_content, num_questions=num_q)
+        quiz_data = json.loads(json_response)
+
+        base_name = os.path.splitext(os.path.basename(l_path))[0]
+        quiz_path = get_storage_path(QUIZ_ROOT, f"{base_name}_Quiz.json")
+        with open(quiz_path, 'w', encoding='utf-8') as f:
+            json.dump(quiz_data, f, indent=2)
+
+        result = {"status": "success", "quiz_path": quiz_path}
+
+    elif function_name == "list_files":
+        f_type = function_args.get("folder_type")
+        file_list = []
+        if f_type == "media":
+            file_list = [os.path.basename(f) for f in list_media_files()]
+        elif f_type == "transcripts":
+            file_list = [os.path.basename(f) for f in list_transcript_files()]
+        elif f_type == "latex":
+            file_list = [os.path.basename(f) for f in list_latex_files()]
+        elif f_type == "quiz":
+            files = []
+            if os.path.exists(QUIZ_ROOT):
+                files = [os.path.join(QUIZ_ROOT, f) for f in os.listdir(QUIZ_ROOT) if f.endswith('.json')]
+            file_list = [os.path.basename(f) for f in files]
+
+        result = {"status": "success", "files": file_list}
+
+    return result
+
+# Tool calls from one model turn run concurrently on this pool
+MAX_TOOL_WORKERS = 4
+_tool_pool = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="chat-tool")
+
+def _file_key(path: str) -> str:
+    # Storage is organised by date, so files are identified by basename (as list_files reports them)
+    return "file:" + os.path.basename(path or "").lower()
+
+def tool_resources(function_name: str, function_args: dict) -> dict:
+    """
+    Returns the resources a tool call reads and writes, used to decide
+    which calls of the same turn may run concurrently.
+    """
+    if function_name == "download_youtube":
+        return {"reads": set(), "writes": {"url:" + str(function_args.get("url")), "folder:media"}}
+
+    if function_name == "transcribe_file":
+        path = function_args.get("path")
+        base_name = os.path.splitext(os.path.basename(path or ""))[0]
+        return {
+            "reads": {_file_key(path), "folder:media"},
+            "writes": {_file_key(f"{base_name}_transcript.txt"), _file_key(f"{base_name}_ocr.txt"), "folder:transcripts"}
+        }
+
+    if function_name == "generate_summary_pdf":
+        path = function_args.get("transcript_path")
+        base_name = os.path.splitext(os.path.basename(path or ""))[0]
+        return {
+            "reads": {_file_key(path), "folder:transcripts"},
+            "writes": {_file_key(f"{base_name}_Summary.tex"), _file_key(f"{base_name}_Summary.pdf"), "folder:latex"}
+        }
+
+    if function_name == "generate_quiz_from_latex":
+        path = function_args.get("latex_path")
+        base_name = os.path.splitext(os.path.basename(path or ""))[0]
+        return {
+            "reads": {_file_key(path), "folder:latex"},
+            "writes": {_file_key(f"{base_name}_Quiz.json"), "folder:quiz"}
+        }
+
+    if function_name == "list_files":
+        return {"reads": {"folder:" + str(function_args.get("folder_type"))}, "writes": set()}
+
+    if function_name == "check_job":
+        return {"reads": set(), "writes": set()}
+
+    # Unknown tools are serialized against everything
+    return {"reads": set(), "writes": {"*"}}
+
+def tools_conflict(a: dict, b: dict) -> bool:
+    """
+    Two calls conflict when one writes something the other reads, or both
+    write the same file. Writes to a folder only add new files, so two
+    writers of the same folder do not conflict with each other.
+    """
+    if "*" in a["writes"] or "*" in b["writes"]:
+        return True
+    if a["writes"] & b["reads"] or b["writes"] & a["reads"]:
+        return True
+    return any(not key.startswith("folder:") for key in a["writes"] & b["writes"])
+
+def execute_tool_calls(calls: list, on_event=None) -> list:
+    """
+    Runs a turn's tool calls, given as (function_name, function_args) pairs.
+    Independent calls run concurrently; a call that conflicts with an earlier
+    one waits for it, so dependent calls keep the order the model asked for.
+    Returns the results in the original order (the first failure is re-raised).
+
+    on_event(kind, payload) receives "tool_start", "tool_progress" and
+    "tool_end" events from the worker threads, with payload["index"] being
+    the call's position in calls.
+    """
+    emit = on_event or (lambda kind, payload: None)
+    resources = [tool_resources(name, args) for name, args in calls]
+    futures = []
+
+    for i, (name, args) in enumerate(calls):
+        deps = [futures[j] for j in range(i) if tools_conflict(resources[i], resources[j])]
+
+        def run(i=i, name=name, args=args, deps=deps):
+            for dep in deps:
+                dep.exception()  # Wait without raising; the failure is reported by its own call
+            print(f"🛠️ Executing tool: {name} with {args}")
+            emit("tool_start", {"index": i, "tool": name, "args": args})
+
+            def progress(message):
+                emit("tool_progress", {"index": i, "tool": name, "message": message})
+
+            try:
+                result = execute_tool(name, args, progress)
+            except Exception as e:
+                emit("tool_end", {"index": i, "tool": name, "result": {"status": "error", "error": str(e)}})
+                raise
+            emit("tool_end", {"index": i, "tool": name, "result": result})
+            return result
+
+        # Earlier calls are always queued first, so waiting on them inside the pool cannot deadlock
+        futures.append(_tool_pool.submit(run))
+
+    return [f.result() for f in futures]
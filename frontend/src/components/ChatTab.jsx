@@ -1,5 +1,17 @@
 import { useState, useRef, useEffect } from 'react';
 import { FaRobot, FaUser, FaPaperPlane, FaTools, FaFileDownload } from 'react-icons/fa';
+import { streamChat } from '../utils/api';
+
+// check_job reports the background job's own status (queued/running/done/error)
+const toolStatusLabel = (tr) => {
+    const { status, job_id, result } = tr.result;
+    if (status === 'success') return '✅ Completed';
+    if (status === 'done') return result?.status === 'error' ? '❌ Failed' : '✅ Completed';
+    if (job_id && status === 'queued' && tr.tool !== 'check_job') return `🕒 Started in background (job ${job_id})`;
+    if (job_id && (status === 'running' || status === 'queued')) return `⏳ Still running in background (job ${job_id})`;
+    if (status === 'running') return `⏳ ${tr.progress || 'Running'}`;
+    return '❌ Failed';
+};
 
 const ChatTab = ({ showLoading, hideLoading }) => {
     const [messages, setMessages] = useState([
@@ -30,36 +42,49 @@ const ChatTab = ({ showLoading, hideLoading }) => {
         setInput('');
         setIsTyping(true);
 
-        try {
-            const response = await fetch('/api/chat', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    messages: updatedMessages,
-                    model_name: 'qwen3:30b-instruct',
-                    provider: 'Ollama'
-                })
-            });
+        // Placeholder assistant message that is filled in as events arrive
+        const assistantIndex = updatedMessages.length;
+        let streamed = '';
+        setMessages(prev => [...prev, { role: 'assistant', content: '', tool_results: [] }]);
+
+        const updateAssistant = (update) => {
+            setMessages(prev => prev.map((msg, i) => (i === assistantIndex ? { ...msg, ...update(msg) } : msg)));
+        };
 
-            const data = await response.json();
+        const updateTool = (index, update) => {
+            updateAssistant(msg => ({
+                tool_results: msg.tool_results.map((tr, i) => (i === index ? { ...tr, ...update } : tr))
+            }));
+        };
 
-            if (data.success) {
-                setMessages(prev => [...prev, {
-                    role: 'assistant',
-                    content: data.message,
-                    tool_results: data.tool_results
-                }]);
-            } else {
-                setMessages(prev => [...prev, {
-                    role: 'assistant',
-                    content: `Error: ${data.error || 'Something went wrong'}`
-                }]);
-            }
+        try {
+            await streamChat(updatedMessages, 'qwen3:30b-instruct', 'Ollama', (event, data) => {
+                if (event === 'token') {
+                    setIsTyping(false);
+                    streamed += data.content;
+                    updateAssistant(() => ({ content: streamed }));
+                } else if (event === 'tool_start') {
+                    setIsTyping(false);
+                    updateAssistant(msg => {
+                        const toolResults = [...msg.tool_results];
+                        toolResults[data.index] = { tool: data.tool, result: { status: 'running' }, progress: '' };
+                        return { tool_results: toolResults };
+                    });
+                } else if (event === 'tool_progress') {
+                    updateTool(data.index, { progress: data.message });
+                } else if (event === 'tool_end') {
+                    updateTool(data.index, { result: data.result, progress: '' });
+                } else if (event === 'done') {
+                    updateAssistant(() => ({
+                        content: streamed || data.message,
+                        tool_results: data.tool_results
+                    }));
+                } else if (event === 'error') {
+                    updateAssistant(() => ({ content: `Error: ${data.error || 'Something went wrong'}` }));
+                }
+            });
         } catch (error) {
-            setMessages(prev => [...prev, {
-                role: 'assistant',
-                content: `Error: Failed to connect to server.`
-            }]);
+            updateAssistant(() => ({ content: `Error: Failed to connect to server.` }));
         } finally {
             setIsTyping(false);
         }
@@ -68,24 +93,26 @@ const ChatTab = ({ showLoading, hideLoading }) => {
     return (
         <div className="chat-container">
             <div className="chat-messages">
-                {messages.map((msg, index) => (
+                {messages.map((msg, index) => (msg.content || msg.tool_results?.length > 0) && (
                     <div key={index} className={`message-wrapper ${msg.role}`}>
                         <div className="message-icon">
                             {msg.role === 'assistant' ? <FaRobot /> : <FaUser />}
                         </div>
                         <div className="message-content">
-                            <div className="message-bubble">
-                                {msg.content}
-                            </div>
+                            {msg.content && (
+                                <div className="message-bubble">
+                                    {msg.content}
+                                </div>
+                            )}
                             {msg.tool_results && msg.tool_results.length > 0 && (
                                 <div className="tool-execution-info">
                                     <div className="tool-header">
                                         <FaTools /> Actions Performed:
                                     </div>
                                     <ul className="tool-list">
-                                        {msg.tool_results.map((tr, i) => (
+                                        {msg.tool_results.filter(Boolean).map((tr, i) => (
                                             <li key={i} className="tool-item">
-                                                <span className="tool-name">{tr.tool}</span>: {tr.result.status === 'success' ? '✅ Completed' : '❌ Failed'}
+                                                <span className="tool-name">{tr.tool}</span>: {toolStatusLabel(tr)}
                                                 {tr.result.path && (
                                                     <div className="file-info">
                                                         <span>{tr.result.filename || 'File generated'}</span>
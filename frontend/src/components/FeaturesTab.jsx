@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { FaVolumeUp, FaFilePdf, FaMagic } from 'react-icons/fa';
-import { listTranscripts, generateTTS, generatePDF, downloadFile } from '../utils/api';
+import { listTranscripts, generateTTS, getTTSStatus, generatePDF, downloadFile } from '../utils/api';
 
 function FeaturesTab({ showLoading, hideLoading }) {
     const [transcripts, setTranscripts] = useState([]);
@@ -12,9 +12,12 @@ function FeaturesTab({ showLoading, hideLoading }) {
     const [ttsResult, setTtsResult] = useState(null);
     const [pdfResult, setPdfResult] = useState(null);
     const [ttsMode, setTtsMode] = useState('transcript');
+    const [ttsFormat, setTtsFormat] = useState('opus');
+    const [ttsParallel, setTtsParallel] = useState(false);
     const [pdfProvider, setPdfProvider] = useState('OpenRouter');
     const [streamingLatex, setStreamingLatex] = useState('');
     const [isStreaming, setIsStreaming] = useState(false);
+    const [previewUrl, setPreviewUrl] = useState('');
 
     useEffect(() => {
         loadTranscripts();
@@ -28,6 +31,24 @@ function FeaturesTab({ showLoading, hideLoading }) {
         }
     }, [pdfProvider]);
 
+    // Streamed audio is synthesized after the request returned; watch for a failure until it is done
+    useEffect(() => {
+        if (!ttsResult?.streaming) return;
+        const timer = setInterval(async () => {
+            try {
+                const status = await getTTSStatus(ttsResult.filename);
+                if (status.error) {
+                    setSuccess('');
+                    setError(`TTS generation failed: ${status.error}`);
+                }
+                if (!status.live) clearInterval(timer);
+            } catch (err) {
+                console.error('Error polling TTS status:', err);
+            }
+        }, 2000);
+        return () => clearInterval(timer);
+    }, [ttsResult]);
+
     const loadTranscripts = async () => {
         try {
             const data = await listTranscripts();
@@ -50,12 +71,14 @@ function FeaturesTab({ showLoading, hideLoading }) {
             setSuccess('');
             showLoading(ttsMode === 'summary' ? 'Generating conversational summary and speech...' : 'Generating speech audio...');
 
-            const data = await generateTTS(selectedTranscript, ttsMode);
+            // Streaming returns at once; the player starts while speech is still being synthesized.
+            // Full transcripts are split across the backend's TTS worker processes.
+            const data = await generateTTS(selectedTranscript, ttsMode, true, ttsMode === 'transcript' && ttsParallel, ttsFormat);
             hideLoading();
 
             if (data.success) {
                 setTtsResult(data);
-                setSuccess('Audio generated successfully!');
+                setSuccess(data.streaming ? 'Audio is streaming as it is generated' : 'Audio generated successfully!');
             } else {
                 setError(data.error || 'TTS generation failed');
             }
@@ -71,12 +94,14 @@ function FeaturesTab({ showLoading, hideLoading }) {
             return;
         }
 
+        let previewTimer = null;
         try {
             setError('');
             setSuccess('');
             setStreamingLatex('');
             setIsStreaming(true);
             setPdfResult(null);
+            setPreviewUrl('');
 
             // Step 1: Stream LaTeX code
             const response = await fetch('/api/pdf/stream_latex', {
@@ -92,6 +117,24 @@ function FeaturesTab({ showLoading, hideLoading }) {
 
             if (!response.ok) throw new Error('Failed to start LaTeX streaming');
 
+            // The backend compiles completed sections while streaming; poll for new preview pages
+            const previewId = response.headers.get('X-Preview-Id');
+            let previewSections = 0;
+            const pollPreview = async () => {
+                if (!previewId) return;
+                try {
+                    const res = await fetch(`/api/pdf/preview/${previewId}/status`);
+                    const status = await res.json();
+                    if (status.success && status.preview.available && status.preview.sections !== previewSections) {
+                        previewSections = status.preview.sections;
+                        setPreviewUrl(`/api/pdf/preview/${previewId}?v=${previewSections}`);
+                    }
+                } catch (err) {
+                    console.error('Error polling preview:', err);
+                }
+            };
+            previewTimer = setInterval(pollPreview, 3000);
+
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
             let accumulatedLatex = '';
@@ -108,6 +151,7 @@ function FeaturesTab({ showLoading, hideLoading }) {
                 if (box) box.scrollTop = box.scrollHeight;
             }
 
+            clearInterval(previewTimer);
             setIsStreaming(false);
             showLoading('Compiling PDF summary... This may take a moment');
 
@@ -125,6 +169,8 @@ function FeaturesTab({ showLoading, hideLoading }) {
                 }
             }
         } catch (err) {
+            clearInterval(previewTimer);
+            setIsStreaming(false);
             hideLoading();
             setError(err.response?.data?.error || err.message || 'PDF generation failed');
         }
@@ -220,6 +266,32 @@ function FeaturesTab({ showLoading, hideLoading }) {
                             </select>
                         </div>
 
+                        <div className="input-group">
+                            <label className="input-label">Audio Format</label>
+                            <select
+                                className="input-field"
+                                value={ttsFormat}
+                                onChange={(e) => setTtsFormat(e.target.value)}
+                            >
+                                <option value="opus">Opus (smallest)</option>
+                                <option value="mp3">MP3</option>
+                                <option value="wav">WAV (uncompressed)</option>
+                            </select>
+                        </div>
+
+                        {ttsMode === 'transcript' && (
+                            <div className="input-group">
+                                <label className="input-label">
+                                    <input
+                                        type="checkbox"
+                                        checked={ttsParallel}
+                                        onChange={(e) => setTtsParallel(e.target.checked)}
+                                    />{' '}
+                                    Parallel synthesis (uses extra worker processes, each loading its own model)
+                                </label>
+                            </div>
+                        )}
+
                         <button
                             className="btn btn-primary btn-lg"
                             onClick={handleGenerateTTS}
@@ -233,10 +305,10 @@ function FeaturesTab({ showLoading, hideLoading }) {
                         {ttsResult && (
                             <div style={{ marginTop: 'var(--spacing-lg)' }}>
                                 <div className="alert alert-success">
-                                    Audio generated: {ttsResult.filename}
+                                    {ttsResult.streaming ? 'Streaming audio' : 'Audio generated'}: {ttsResult.filename}
                                 </div>
                                 <div style={{ marginTop: 'var(--spacing-md)' }}>
-                                    <audio controls src={ttsResult.audio_url} style={{ width: '100%', borderRadius: 'var(--radius-md)' }}>
+                                    <audio controls autoPlay={ttsResult.streaming} src={ttsResult.audio_url} style={{ width: '100%', borderRadius: 'var(--radius-md)' }}>
                                         Your browser does not support the audio element.
                                     </audio>
                                 </div>
@@ -281,6 +353,7 @@ function FeaturesTab({ showLoading, hideLoading }) {
                             >
                                 <option value="OpenRouter">OpenRouter (Cloud)</option>
                                 <option value="Ollama">Ollama (Local)</option>
+                                <option value="Auto">Auto (Local first, Cloud fallback)</option>
                             </select>
                         </div>
 
@@ -320,6 +393,22 @@ function FeaturesTab({ showLoading, hideLoading }) {
                             </div>
                         )}
 
+                        {previewUrl && (
+                            <div style={{ marginTop: 'var(--spacing-lg)' }}>
+                                <label className="input-label">PDF Preview {isStreaming && '(updating as sections complete)'}</label>
+                                <iframe
+                                    src={previewUrl}
+                                    title="PDF Preview"
+                                    style={{
+                                        width: '100%',
+                                        height: '500px',
+                                        borderRadius: 'var(--radius-md)',
+                                        border: '1px solid var(--border-color)'
+                                    }}
+                                />
+                            </div>
+                        )}
+
                         <div className="input-group">
                             <label className="input-label">Summary Mode</label>
                             <select
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { FaQuestionCircle, FaCheckCircle, FaTimesCircle, FaRedo } from 'react-icons/fa';
-import { listLatexFiles, generateQuiz } from '../utils/api';
+import { listLatexFiles, streamQuiz } from '../utils/api';
 
 function QuizTab({ showLoading, hideLoading }) {
     const [latexFiles, setLatexFiles] = useState([]);
@@ -11,6 +11,7 @@ function QuizTab({ showLoading, hideLoading }) {
     const [userAnswers, setUserAnswers] = useState({});
     const [submitted, setSubmitted] = useState(false);
     const [error, setError] = useState('');
+    const [isStreaming, setIsStreaming] = useState(false);
 
     useEffect(() => {
         loadLatexFiles();
@@ -35,21 +36,37 @@ function QuizTab({ showLoading, hideLoading }) {
 
         try {
             setError('');
+            setUserAnswers({});
+            setSubmitted(false);
+            setIsStreaming(true);
             showLoading(`Generating ${numQuestions} quiz questions...`);
 
-            const data = await generateQuiz(selectedLatex, modelName, numQuestions);
-            hideLoading();
-
-            if (data.success) {
-                setQuizData(data.quiz_data);
-                setUserAnswers({});
-                setSubmitted(false);
-            } else {
-                setError(data.error || 'Quiz generation failed');
-            }
+            let firstQuestion = true;
+            await streamQuiz(selectedLatex, modelName, numQuestions, (event) => {
+                if (event.type === 'meta') {
+                    setQuizData(prev => ({ ...(prev || { questions: [] }), quiz_title: event.quiz_title, total_questions: event.total_questions }));
+                } else if (event.type === 'question') {
+                    if (firstQuestion) {
+                        // Render the first question as soon as it closes
+                        hideLoading();
+                        firstQuestion = false;
+                    }
+                    setQuizData(prev => ({
+                        ...(prev || { total_questions: numQuestions }),
+                        questions: [...(prev?.questions || []), event.question]
+                    }));
+                } else if (event.type === 'done') {
+                    setQuizData(event.quiz_data);
+                } else if (event.type === 'error') {
+                    setError(event.error || 'Quiz generation failed');
+                    setQuizData(prev => (prev?.questions?.length ? prev : null));
+                }
+            });
         } catch (err) {
+            setError(err.message || 'Quiz generation failed');
+        } finally {
             hideLoading();
-            setError(err.response?.data?.error || err.message || 'Quiz generation failed');
+            setIsStreaming(false);
         }
     };
 
@@ -274,9 +291,10 @@ function QuizTab({ showLoading, hideLoading }) {
                                     <button
                                         className="btn btn-primary btn-lg"
                                         onClick={handleSubmit}
+                                        disabled={isStreaming}
                                         style={{ flex: 1 }}
                                     >
-                                        Submit Quiz
+                                        {isStreaming ? 'Generating remaining questions...' : 'Submit Quiz'}
                                     </button>
                                 ) : (
                                     <>
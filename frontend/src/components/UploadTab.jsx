@@ -58,6 +58,7 @@ function UploadTab({ showLoading, hideLoading }) {
                     timestamped: transcribeData.timestamped,
                     transcript_path: transcribeData.transcript_path,
                     timestamped_path: transcribeData.timestamped_path,
+                    reused: transcribeData.reused,
                 });
                 setError('');
             } else {
@@ -182,6 +183,12 @@ function UploadTab({ showLoading, hideLoading }) {
                         </div>
                     )}
 
+                    {result?.reused && (
+                        <div className="alert alert-success">
+                            This file was processed before; the existing transcript was reused.
+                        </div>
+                    )}
+
                     {uploadMethod === 'file' && (
                         <div>
                             <div
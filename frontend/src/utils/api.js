@@ -62,14 +62,22 @@ export const getTranscriptContent = async (path) => {
 };
 
 // TTS endpoints
-export const generateTTS = async (transcriptPath, ttsMode) => {
+export const generateTTS = async (transcriptPath, ttsMode, stream = false, parallel = false, format = 'wav') => {
     const response = await api.post('/tts/generate', {
         transcript_path: transcriptPath,
-        tts_mode: ttsMode
+        tts_mode: ttsMode,
+        stream: stream,
+        parallel: parallel,
+        format: format
     });
     return response.data;
 };
 
+export const getTTSStatus = async (filename) => {
+    const response = await api.get(`/tts/status/${filename}`);
+    return response.data;
+};
+
 // PDF endpoints
 export const generatePDF = async (transcriptPath, modelName, summaryMode, provider, latexCode = null) => {
     const response = await api.post('/pdf/generate', {
@@ -97,6 +105,86 @@ export const generateQuiz = async (latexPath, modelName, numQuestions) => {
     return response.data;
 };
 
+// Streams quiz generation; onEvent receives each parsed NDJSON event
+// ({type: 'meta' | 'question' | 'done' | 'error', ...}) as soon as it arrives.
+export const streamQuiz = async (latexPath, modelName, numQuestions, onEvent) => {
+    const response = await fetch(`${API_BASE_URL}/quiz/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            latex_path: latexPath,
+            model_name: modelName,
+            num_questions: numQuestions,
+        }),
+    });
+
+    if (!response.ok) throw new Error('Failed to start quiz streaming');
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) onEvent(JSON.parse(line));
+        }
+    }
+
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+};
+
+// Chat endpoint (Server-Sent Events); onEvent receives (event, data) for
+// token, tool_start, tool_progress, tool_end, done and error events.
+export const streamChat = async (messages, modelName, provider, onEvent) => {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            messages,
+            model_name: modelName,
+            provider,
+        }),
+    });
+
+    if (!response.ok) throw new Error('Failed to start chat streaming');
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const dispatch = (block) => {
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (data) onEvent(event, JSON.parse(data));
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            dispatch(block);
+        }
+    }
+
+    if (buffer.trim()) dispatch(buffer);
+};
+
 // Download endpoint
 export const downloadFile = async (path) => {
     const response = await api.post('/download', { path }, {
@@ -14,6 +14,12 @@ export default defineConfig({
             protocol: 'ws'
         },
         proxy: {
+            // Async backend (streaming LLM endpoints), must precede the generic /api rule
+            '/api/async': {
+                target: 'http://localhost:5001',
+                changeOrigin: true,
+                secure: false
+            },
             '/api': {
                 target: 'http://localhost:5000',
                 changeOrigin: true,
@@ -1,22 +1,27 @@
 import streamlit as st
 import os
-from utils_storage import save_uploaded_file, get_storage_path, TRANSCRIPT_ROOT, generate_filename, MEDIA_ROOT, list_media_files, list_transcript_files, TTS_ROOT, RENDER_ROOT, list_latex_files, QUIZ_ROOT
-from utils_processing import download_youtube_audio, transcribe_audio, format_timestamped_transcript, convert_to_wav, generate_tts_audio, compile_latex_to_pdf, process_unified_file
+from utils_storage import save_uploaded_file, get_storage_path, TRANSCRIPT_ROOT, generate_filename, MEDIA_ROOT, list_media_files, list_transcript_files, TTS_ROOT, RENDER_ROOT, list_latex_files, QUIZ_ROOT, reuse_transcripts
+from utils_processing import download_youtube_audio, transcribe_audio, format_timestamped_transcript, convert_to_wav, generate_tts_audio, process_unified_file
 from utils_llm import generate_latex_code, generate_podcast_script
 from utils_llm_quiz import generate_quiz
 from utils_ocr import get_ocr_content
+from utils_tts import StreamingSpeechWriter, warm_tts_pipelines, audio_mimetype, AUDIO_FORMATS
+from utils_latex_lint import strip_code_fences, compile_with_repair
 
 st.set_page_config(page_title="Unified Media & Document Parser", layout="wide")
 
+# Load Kokoro once per server process; later reruns return immediately
+warm_tts_pipelines()
+
 st.title("🚀 Unified Media & Document Parser")
 st.markdown("Upload any file (Video, Audio, PDF, PPTX) or provide a YouTube URL to transcribe or summarize it.")
 
 # Sidebar Configuration for LLM
 with st.sidebar:
     st.header("🤖 AI Configuration")
-    llm_provider = st.selectbox("Model Provider", ["Ollama", "OpenRouter"], index=0, help="Choose between local Ollama or cloud OpenRouter.")
+    llm_provider = st.selectbox("Model Provider", ["Ollama", "OpenRouter", "Auto"], index=0, help="Choose between local Ollama or cloud OpenRouter. Auto prefers Ollama and races OpenRouter when the first token is slow or Ollama fails.")
     
-    if llm_provider == "Ollama":
+    if llm_provider in ("Ollama", "Auto"):
         llm_model = st.text_input("Local Model", value="qwen3:30b-instruct", help="Model name in Ollama (e.g., qwen3:30b-instruct, gpt-oss)")
     else:
         llm_model = st.text_input("Cloud Model", value="google/gemini-2.5-flash-lite", help="OpenRouter model string.")
@@ -36,6 +41,8 @@ with st.sidebar:
             ["Audio Transcript", "Audio Summary"], 
             help="Transcript: Direct TTS. Summary: Podcast-style run-through via gpt-oss."
         )
+        tts_format = st.selectbox("Audio Format", list(AUDIO_FORMATS), help="Opus and MP3 are encoded with ffmpeg and are far smaller than WAV.")
+        parallel_tts = st.checkbox("Parallel synthesis", value=False, help="Transcript only: splits the text at sentence boundaries and synthesizes the parts in TTS_PROCESSES worker processes, each loading its own copy of the model.")
         
         if st.button("Generate Audio", key="generate_tts"):
             try:
@@ -45,27 +52,36 @@ with st.sidebar:
                 if not text_content.strip():
                     st.warning("Transcript is empty.")
                 else:
-                    final_tts_text = text_content
                     base_name = os.path.splitext(os.path.basename(selected_transcript_tts))[0]
                     if audio_type == "Audio Summary":
+                        tts_filename = f"{base_name}_Podcast_TTS{AUDIO_FORMATS[tts_format]}"
+                        tts_path = get_storage_path(TTS_ROOT, tts_filename)
                         st.info(f"Generating Podcast Script... ({llm_provider}: {llm_model})")
+                        # Each finished sentence is synthesized while the script keeps streaming
+                        speech_writer = StreamingSpeechWriter(tts_path)
                         script_placeholder = st.empty()
                         generated_script = ""
-                        with st.container(height=300, border=True):
-                            for chunk in generate_podcast_script(text_content, model_name=llm_model, provider=llm_provider):
-                                generated_script += chunk
-                                script_placeholder.markdown(generated_script)
-                        final_tts_text = generated_script
+                        try:
+                            with st.container(height=300, border=True):
+                                for chunk in generate_podcast_script(text_content, model_name=llm_model, provider=llm_provider):
+                                    generated_script += chunk
+                                    speech_writer.feed(chunk)
+                                    script_placeholder.markdown(generated_script)
+                        except Exception:
+                            speech_writer.cancel()
+                            raise
                         st.success("Podcast Script Generated!")
-                        tts_filename = f"{base_name}_Podcast_TTS.wav"
+                        with st.spinner("Finishing Speech..."):
+                            speech_writer.close()
                     else:
-                        tts_filename = f"{base_name}_TTS.wav"
+                        tts_filename = f"{base_name}_TTS{AUDIO_FORMATS[tts_format]}"
+                        with st.spinner("Generating Speech..."):
+                            tts_path = get_storage_path(TTS_ROOT, tts_filename)
+                            generate_tts_audio(text_content, tts_path, parallel=parallel_tts)
                     
-                    with st.spinner("Generating Speech..."):
-                        tts_path = get_storage_path(TTS_ROOT, tts_filename)
-                        generate_tts_audio(final_tts_text, tts_path)
+                    if os.path.exists(tts_path):
                         st.success(f"Audio generated!")
-                        st.audio(tts_path)
+                        st.audio(tts_path, format=audio_mimetype(tts_path))
                         with open(tts_path, "rb") as f:
                                 st.download_button("Download Audio", f, file_name=tts_filename)
             except Exception as e:
@@ -111,13 +127,7 @@ with st.sidebar:
                             full_latex_code += chunk
                             latex_output_placeholder.code(full_latex_code, language="latex")
                         
-                    latex_code = full_latex_code
-                    
-                    if "```latex" in latex_code:
-                        latex_code = latex_code.replace("```latex", "").replace("```", "")
-                    elif "```" in latex_code:
-                        latex_code = latex_code.replace("```", "")
-                    latex_code = latex_code.strip()
+                    latex_code = strip_code_fences(full_latex_code)
                     
                     base_name = os.path.splitext(os.path.basename(selected_transcript_pdf))[0]
                     pdf_filename = f"{base_name}_Summary.pdf"
@@ -127,7 +137,7 @@ with st.sidebar:
                     output_dir = os.path.dirname(target_pdf_path)
                     os.makedirs(output_dir, exist_ok=True)
                     
-                    tex_path = os.path.join(output_dir, tex_filename)
+                    tex_path = get_storage_path(RENDER_ROOT, tex_filename)
                     with open(tex_path, "w", encoding="utf-8") as f:
                         f.write(latex_code)
                     
@@ -135,7 +145,7 @@ with st.sidebar:
                     st.info("Compiling PDF with pdflatex...")
                     
                     try:
-                        final_pdf = compile_latex_to_pdf(tex_path, cleanup=True, output_dir=output_dir)
+                        final_pdf = compile_with_repair(tex_path, output_dir=output_dir, model_name=llm_model, provider=llm_provider)["pdf_path"]
                         if final_pdf:
                             st.success("✓ PDF Generated Successfully!")
                             col1, col2 = st.columns(2)
@@ -291,24 +301,40 @@ if source_path and os.path.exists(source_path):
     
     with st.status(f"Processing: {os.path.basename(source_path)}", expanded=True) as status:
         try:
-            st.write("🔍 Identifying file type and routing to pipeline...")
-            result = process_unified_file(source_path)
+            # Identical content was transcribed before under another name: reuse that transcript
+            reused = reuse_transcripts(source_path)
+            if reused:
+                st.write("♻️ Identical content was processed before, reusing its transcript...")
+                with open(reused["transcript_path"], "r", encoding="utf-8") as f:
+                    reused_text = f.read()
+                result = {"type": reused["type"], "text": reused_text, "content": reused_text}
+            else:
+                st.write("🔍 Identifying file type and routing to pipeline...")
+                result = process_unified_file(source_path)
             
+            base_name = os.path.splitext(os.path.basename(source_path))[0]
             if result["type"] == "media":
-                st.write("🎙️ Transcribing audio/video with Whisper...")
-                transcript_text = result["text"]
-                segments = result["segments"]
-                source_wav = result["source_path"]
-                
-                base_name = os.path.splitext(os.path.basename(source_path))[0]
-                transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript.txt")
-                timestamped_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript_timestamped.txt")
-                
-                with open(transcript_path, "w", encoding="utf-8") as f:
-                    f.write(transcript_text)
-                timestamped_text = format_timestamped_transcript(segments)
-                with open(timestamped_path, "w", encoding="utf-8") as f:
-                    f.write(timestamped_text)
+                if reused:
+                    transcript_text = result["text"]
+                    timestamped_text = ""
+                    if reused["timestamped_path"]:
+                        with open(reused["timestamped_path"], "r", encoding="utf-8") as f:
+                            timestamped_text = f.read()
+                    source_wav = source_path
+                else:
+                    st.write("🎙️ Transcribing audio/video with Whisper...")
+                    transcript_text = result["text"]
+                    segments = result["segments"]
+                    source_wav = result["source_path"]
+                    
+                    transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript.txt")
+                    timestamped_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript_timestamped.txt")
+                    
+                    with open(transcript_path, "w", encoding="utf-8") as f:
+                        f.write(transcript_text)
+                    timestamped_text = format_timestamped_transcript(segments)
+                    with open(timestamped_path, "w", encoding="utf-8") as f:
+                        f.write(timestamped_text)
                 
                 status.update(label="✅ Transcription Complete!", state="complete", expanded=False)
                 
@@ -325,8 +351,12 @@ if source_path and os.path.exists(source_path):
                 st.audio(source_wav)
                 
             elif result["type"] == "document":
-                st.write("📄 Extracting text and performing OCR on images...")
                 extracted_content = result["content"]
+                if not reused:
+                    st.write("📄 Extracting text and performing OCR on images...")
+                    # Saved like the backend does, so later copies of this document can reuse it
+                    with open(get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_ocr.txt"), "w", encoding="utf-8") as f:
+                        f.write(extracted_content)
                 
                 st.write("🤖 Querying local model (gpt-oss:latest) for LaTeX generation...")
                 
@@ -339,13 +369,8 @@ if source_path and os.path.exists(source_path):
                         full_latex += chunk
                         latex_placeholder.code(full_latex, language="latex")
                 
-                clean_latex = full_latex.strip()
-                if clean_latex.startswith("```latex"): clean_latex = clean_latex[8:]
-                elif clean_latex.startswith("```"): clean_latex = clean_latex[3:]
-                if clean_latex.endswith("```"): clean_latex = clean_latex[:-3]
-                clean_latex = clean_latex.strip()
+                clean_latex = strip_code_fences(full_latex)
                 
-                base_name = os.path.splitext(os.path.basename(source_path))[0]
                 tex_filename = f"{base_name}_Summary.tex"
                 tex_save_path = get_storage_path(RENDER_ROOT, tex_filename)
                 with open(tex_save_path, "w", encoding="utf-8") as f:
@@ -354,7 +379,7 @@ if source_path and os.path.exists(source_path):
                 st.write(f"💾 Saved LaTeX source: {tex_filename}")
                 st.write("🛠️ Compiling PDF with pdflatex...")
                 
-                pdf_path = compile_latex_to_pdf(tex_save_path, cleanup=True, output_dir=os.path.dirname(tex_save_path))
+                pdf_path = compile_with_repair(tex_save_path, output_dir=os.path.dirname(tex_save_path), model_name=llm_model, provider=llm_provider)["pdf_path"]
                 
                 if pdf_path and os.path.exists(pdf_path):
                     status.update(label="✅ Document Processing Complete!", state="complete", expanded=False)
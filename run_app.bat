@@ -7,6 +7,10 @@ echo ==========================================
 echo Starting Backend...
 start "Backend (whisper_env)" cmd /k "conda activate whisper_env && cd backend && python app.py"
 
+:: Start Async Backend (streaming LLM endpoints)
+echo Starting Async Backend...
+start "Async Backend (whisper_env)" cmd /k "conda activate whisper_env && cd backend && python async_app.py"
+
 :: Start React Frontend
 echo Starting Frontend...
 start "Frontend (Vite)" cmd /k "cd frontend && npm run dev"
@@ -14,6 +18,7 @@ start "Frontend (Vite)" cmd /k "cd frontend && npm run dev"
 echo ==========================================
 echo   Both services are starting!
 echo   Backend: http://localhost:5000
+echo   Async Backend: http://localhost:5001
 echo   Frontend: http://localhost:3000
 echo ==========================================
 echo You can now access the app from other devices via your Tailscale IP on port 3000.
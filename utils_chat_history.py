@@ -0,0 +1,167 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from utils_llm import stream_completion, stream_routed
+
+# Prompt budget for the chat history, in estimated tokens
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "8000"))
+
+# Number of conversation summaries kept in memory
+SUMMARY_CACHE_SIZE = 64
+
+# Result fields worth keeping when a tool result is collapsed to a reference
+REFERENCE_FIELDS = (
+    "status", "type", "path", "filename", "transcript_path",
+    "pdf_path", "tex_path", "quiz_path", "job_id", "error"
+)
+
+_cache_lock = threading.Lock()
+_summary_cache = OrderedDict()
+
+def estimate_tokens(messages: list) -> int:
+    """
+    Rough token count (about 4 characters per token plus per-message overhead).
+    """
+    total = 0
+    for message in messages:
+        total += 4 + len(message.get("content") or "") // 4
+        if message.get("tool_calls"):
+            total += len(json.dumps(message["tool_calls"])) // 4
+    return total
+
+def compact_result(result) -> dict:
+    """
+    Reduces a tool result to the fields needed to refer back to it
+    (paths, job IDs, status), dropping previews and file lists.
+    """
+    if not isinstance(result, dict):
+        return {"value": str(result)[:200]}
+    compact = {k: result[k] for k in REFERENCE_FIELDS if result.get(k) is not None}
+    if isinstance(result.get("files"), list):
+        compact["files"] = f"{len(result['files'])} files"
+    if isinstance(result.get("result"), dict):
+        compact["result"] = compact_result(result["result"])
+    return compact
+
+def _clean_message(message: dict) -> dict:
+    """
+    Keeps only the fields the model API understands. The frontend attaches
+    full tool_results to assistant messages for display; they are folded into
+    the content as compact references instead.
+    """
+    clean = {k: message[k] for k in ("role", "content", "tool_calls", "tool_call_id", "name") if k in message}
+    tool_results = message.get("tool_results")
+    if tool_results:
+        refs = "; ".join(
+            f"{tr.get('tool')}: {json.dumps(compact_result(tr.get('result')))}"
+            for tr in tool_results if tr
+        )
+        clean["content"] = f"{clean.get('content') or ''}\n[Tool results: {refs}]".strip()
+    return clean
+
+def _collapse_tool_message(message: dict) -> dict:
+    try:
+        result = json.loads(message.get("content") or "null")
+    except json.JSONDecodeError:
+        return {**message, "content": (message.get("content") or "")[:200]}
+    return {**message, "content": json.dumps(compact_result(result))}
+
+def _summary_key(messages: list) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _cache_get(key: str):
+    with _cache_lock:
+        summary = _summary_cache.get(key)
+        if summary is not None:
+            _summary_cache.move_to_end(key)
+        return summary
+
+def _cache_put(key: str, summary: str):
+    with _cache_lock:
+        _summary_cache[key] = summary
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+
+def summarize_turns(messages: list, previous_summary: str = None, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama") -> str:
+    """
+    Summarizes conversation turns, extending previous_summary if given.
+    """
+    lines = []
+    for message in messages:
+        content = message.get("content") or ""
+        if message.get("tool_calls"):
+            calls = ", ".join(tc["function"]["name"] for tc in message["tool_calls"] if "function" in tc)
+            content = f"{content} (called tools: {calls})".strip()
+        lines.append(f"{message.get('role')}: {content}")
+
+    prompt = "Summarize this conversation between a user and an assistant that manages media files, transcripts, PDF summaries and quizzes. "
+    prompt += "Keep every file path, job ID, URL and decision that later turns may refer to. Be concise.\n\n"
+    if previous_summary:
+        prompt += f"SUMMARY SO FAR:\n{previous_summary}\n\nNEW TURNS:\n"
+    prompt += "\n".join(lines)
+
+    summary_messages = [{"role": "user", "content": prompt}]
+
+    def request(p, m):
+        return stream_completion(p, m, summary_messages, feature="chat_compaction", temperature=0.1)
+
+    return "".join(stream_routed(provider, model_name, request)).strip()
+
+def compact_messages(messages: list, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama", budget: int = None) -> list:
+    """
+    Keeps the chat history within the token budget.
+
+    1. Tool results from earlier turns are collapsed into compact references.
+    2. If still over budget, older turns are replaced by a running summary.
+       Summaries are cached by the hash of the messages they cover, so the
+       next request (which resends the same history) reuses the summary and
+       only new turns ever need summarizing.
+    """
+    budget = budget or CHAT_TOKEN_BUDGET
+    messages = [_clean_message(m) for m in messages]
+
+    # Tool messages before the latest user message belong to finished turns
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=0)
+    messages = [
+        _collapse_tool_message(m) if m.get("role") == "tool" and i < last_user else m
+        for i, m in enumerate(messages)
+    ]
+
+    if estimate_tokens(messages) <= budget:
+        return messages
+
+    # Leading system messages are always kept
+    head = 0
+    while head < len(messages) and messages[head].get("role") == "system":
+        head += 1
+    system, body = messages[:head], messages[head:]
+
+    # Cut only at user messages so tool calls stay with their results
+    boundaries = [i for i, m in enumerate(body) if m.get("role") == "user" and i > 0]
+    if not boundaries:
+        return messages
+
+    def with_summary(summary, cut):
+        note = {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+        return system + [note] + body[cut:]
+
+    # Reuse the latest cached summary that still fits the budget
+    cached = [(cut, _cache_get(_summary_key(body[:cut]))) for cut in boundaries]
+    cached = [(cut, summary) for cut, summary in cached if summary is not None]
+    for cut, summary in reversed(cached):
+        compacted = with_summary(summary, cut)
+        if estimate_tokens(compacted) <= budget:
+            return compacted
+
+    # Move the cut far enough that the kept tail uses at most half the budget,
+    # so the summary does not have to be redone on every turn
+    cut = next((b for b in boundaries if estimate_tokens(body[b:]) <= budget // 2), boundaries[-1])
+    base, previous = next(((c, s) for c, s in reversed(cached) if c < cut), (0, None))
+
+    print(f"🗜️ Compacting chat history: summarizing {cut - base} messages")
+    summary = summarize_turns(body[base:cut], previous, model_name=model_name, provider=provider)
+    _cache_put(_summary_key(body[:cut]), summary)
+    return with_summary(summary, cut)
@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+# SQLite file holding the storage metadata index
+INDEX_DB = os.getenv("STORAGE_INDEX_DB", "storage_index.db")
+
+# A registered file that still does not exist after this long is dropped
+# (e.g. a yt-dlp output template, which is saved under another extension)
+PENDING_TTL_S = 60 * 60
+
+# A file counts as settled once it was last checked this long after its
+# last modification; unsettled files are re-stat'd on every listing
+SETTLE_S = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    registered_at REAL NOT NULL,
+    checked_at REAL,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_root ON files (root, mtime DESC);
+"""
+
+# Indexes on columns added after the first release; created once the columns exist
+_LATE_INDEXES = """
+CREATE INDEX IF NOT EXISTS files_by_digest ON files (digest);
+CREATE INDEX IF NOT EXISTS files_by_name ON files (name);
+"""
+
+_local = threading.local()
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+def _connect() -> sqlite3.Connection:
+    """
+    One connection per thread; WAL lets the Flask backend and Streamlit read
+    while the other writes.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(INDEX_DB, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(files)")}
+        if "digest" not in columns:
+            conn.execute("ALTER TABLE files ADD COLUMN digest TEXT")
+        conn.executescript(_LATE_INDEXES)
+        _local.conn = conn
+    return conn
+
+def _key(path: str) -> str:
+    # Stored the way the listings have always returned paths: relative to the working directory
+    return os.path.relpath(os.path.abspath(path))
+
+def _root_of(key: str) -> str:
+    return key.split(os.sep, 1)[0]
+
+def _stat(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+def register_file(path: str, digest: str = None):
+    """
+    Records a path that is about to be written (or was just written).
+    Size and mtime are filled in lazily, since the file usually does not exist yet.
+    digest is the SHA-256 of the content, when known (media blobs).
+    """
+    key = _key(path)
+    try:
+        _ensure_index()
+        with _connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO files (path, root, name, ext, registered_at, digest) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET registered_at = excluded.registered_at, checked_at = NULL, digest = excluded.digest
+                """,
+                (key, _root_of(key), os.path.basename(key), os.path.splitext(key)[1].lower(), time.time(), digest)
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not index {key}: {e}")
+
+def _refresh(conn: sqlite3.Connection, root: str):
+    """
+    Stats the files that were registered or changed recently and drops
+    pending entries that never materialized.
+    """
+    now = time.time()
+    rows = conn.execute(
+        "SELECT path, registered_at FROM files WHERE root = ? AND (checked_at IS NULL OR mtime IS NULL OR checked_at - mtime < ?)",
+        (root, SETTLE_S)
+    ).fetchall()
+    for row in rows:
+        stat = _stat(row["path"])
+        if stat is not None:
+            conn.execute("UPDATE files SET size = ?, mtime = ?, checked_at = ? WHERE path = ?", (*stat, now, row["path"]))
+        elif now - row["registered_at"] > PENDING_TTL_S:
+            conn.execute("DELETE FROM files WHERE path = ?", (row["path"],))
+        else:
+            conn.execute("UPDATE files SET size = NULL, mtime = NULL, checked_at = ? WHERE path = ?", (now, row["path"]))
+
+def query_files(root: str, extension: str = None, exclude: str = None) -> list:
+    """
+    Returns the indexed files under root, newest first, as dicts with
+    path, name, size and mtime. extension filters by file extension and
+    exclude drops names containing that substring.
+    """
+    _ensure_index()
+    sql = "SELECT path, name, size, mtime FROM files WHERE root = ? AND mtime IS NOT NULL"
+    params = [root]
+    if extension:
+        sql += " AND ext = ?"
+        params.append(extension.lower())
+    if exclude:
+        sql += " AND instr(name, ?) = 0"
+        params.append(exclude)
+    sql += " ORDER BY mtime DESC"
+
+    conn = _connect()
+    with conn:
+        _refresh(conn, root)
+    rows = [dict(row) for row in conn.execute(sql, params)]
+
+    # Settled rows are not re-stat'd, so files deleted since are only noticed here
+    missing = {row["path"] for row in rows if not os.path.exists(row["path"])}
+    if missing:
+        with conn:
+            conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in missing])
+        rows = [row for row in rows if row["path"] not in missing]
+    return rows
+
+def get_digest(path: str):
+    """
+    Returns the recorded content digest of a file, or None if it is unknown.
+    """
+    _ensure_index()
+    row = _connect().execute("SELECT digest FROM files WHERE path = ?", (_key(path),)).fetchone()
+    return row["digest"] if row else None
+
+def find_files(digest: str = None, name: str = None) -> list:
+    """
+    Returns the paths of existing indexed files with the given digest and/or name.
+    """
+    _ensure_index()
+    conditions, params = [], []
+    if digest:
+        conditions.append("digest = ?")
+        params.append(digest)
+    if name:
+        conditions.append("name = ?")
+        params.append(name)
+    if not conditions:
+        return []
+    rows = _connect().execute(f"SELECT path FROM files WHERE {' AND '.join(conditions)} ORDER BY registered_at", params)
+    return [row["path"] for row in rows if os.path.exists(row["path"])]
+
+def rebuild_index(roots: list) -> int:
+    """
+    Re-scans the given storage roots and replaces their index entries.
+    Hidden folders (such as TTS/.cache) are skipped. Returns the number of files indexed.
+    """
+    now = time.time()
+    conn = _connect()
+    count = 0
+    with conn:
+        for root in roots:
+            # Digests cannot be recovered from a directory walk, so carry them over
+            digests = dict(conn.execute("SELECT path, digest FROM files WHERE root = ? AND digest IS NOT NULL", (_root_of(_key(root)),)).fetchall())
+            conn.execute("DELETE FROM files WHERE root = ?", (_root_of(_key(root)),))
+            if not os.path.exists(root):
+                continue
+            for directory, dirs, filenames in os.walk(root):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    stat = _stat(path)
+                    if stat is None:
+                        continue
+                    key = _key(path)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO files (path, root, name, ext, size, mtime, registered_at, checked_at, digest) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (key, _root_of(key), filename, os.path.splitext(filename)[1].lower(), *stat, now, now, digests.get(key))
+                    )
+                    count += 1
+    return count
+
+def _ensure_index():
+    """
+    Builds the index from the existing tree the first time it is used.
+    PRAGMA user_version marks a database that has been built.
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        conn = _connect()
+        if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            from utils_storage import INDEXED_ROOTS
+            count = rebuild_index(INDEXED_ROOTS)
+            conn.execute("PRAGMA user_version = 1")
+            print(f"🗂️ Built storage index: {count} files")
+        _bootstrapped = True
+
+if __name__ == "__main__":
+    # python utils_index.py rebuild  -> re-scan media, transcripts, TTS, renders and quizzes,
+    # then delete media blobs nothing refers to any more
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python utils_index.py rebuild")
+        sys.exit(1)
+    from utils_storage import INDEXED_ROOTS, collect_orphan_blobs
+    start = time.perf_counter()
+    count = rebuild_index(INDEXED_ROOTS)
+    _connect().execute("PRAGMA user_version = 1")
+    print(f"🗂️ Indexed {count} files in {time.perf_counter() - start:.1f}s")
+    freed = collect_orphan_blobs()
+    if freed:
+        print(f"🗑️ Freed {freed / (1024 * 1024):.1f} MB of unreferenced media blobs")
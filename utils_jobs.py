@@ -0,0 +1,108 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Heavy jobs (Whisper, pdflatex, long generations) running at the same time
+MAX_JOB_WORKERS = 2
+
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_S = 6 * 60 * 60
+
+class JobManager:
+    """
+    Runs long-running work in the background and tracks it by job ID.
+
+    submit() returns immediately with the job record; the work function is
+    called as fn(progress) where progress(message) updates the job's status
+    text. Records are plain dicts so they can be returned from the API as is.
+    """
+
+    def __init__(self, max_workers: int = MAX_JOB_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.futures = {}
+
+    def submit(self, kind: str, fn, args: dict = None, depends_on: list = None) -> dict:
+        """
+        Queues fn(progress). Jobs listed in depends_on finish before this one starts.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "args": args or {},
+            "status": "queued",
+            "progress": None,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+
+        with self.lock:
+            self._prune()
+            deps = [self.futures[d] for d in depends_on or [] if d in self.futures]
+            self.jobs[job_id] = job
+            # Dependencies were queued earlier, so waiting on them inside the pool cannot deadlock
+            self.futures[job_id] = self.pool.submit(self._run, job_id, fn, deps)
+
+        print(f"📋 Queued job {job_id}: {kind}")
+        return self.get(job_id)
+
+    def _update(self, job_id: str, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, fn, deps: list):
+        for dep in deps:
+            dep.exception()  # Wait for the dependency without raising its error
+        self._update(job_id, status="running", started_at=time.time())
+
+        def progress(message):
+            self._update(job_id, progress=message)
+
+        try:
+            result = fn(progress)
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+            print(f"✅ Job {job_id} finished")
+        except Exception as e:
+            self._update(job_id, status="error", error=str(e), finished_at=time.time())
+            print(f"❌ Job {job_id} failed: {e}")
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL_S
+        for job_id, job in list(self.jobs.items()):
+            if job["finished_at"] and job["finished_at"] < cutoff:
+                del self.jobs[job_id]
+                self.futures.pop(job_id, None)
+
+    def get(self, job_id: str) -> dict:
+        """
+        Returns a snapshot of the job, or None if it is unknown.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait_for(self, job_id: str, timeout: float = None) -> dict:
+        """
+        Waits up to timeout seconds for the job to finish and returns its snapshot.
+        """
+        with self.lock:
+            future = self.futures.get(job_id)
+        if future is not None:
+            wait([future], timeout=timeout)
+        return self.get(job_id)
+
+    def list_jobs(self, active_only: bool = False) -> list:
+        with self.lock:
+            jobs = [dict(job) for job in self.jobs.values()]
+        if active_only:
+            jobs = [job for job in jobs if job["status"] in ("queued", "running")]
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+# Shared by the chat tools and the jobs API
+job_manager = JobManager()
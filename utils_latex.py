@@ -0,0 +1,417 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utils_storage import LATEX_CACHE_ROOT, register_storage_file
+
+# Checked when pdflatex is not on PATH (MiKTeX default locations on Windows)
+PDFLATEX_CANDIDATES = [
+    r"C:\Users\mynov\AppData\Local\Programs\MiKTeX\miktex\bin\x64\pdflatex.exe",
+    r"C:\Users\mynov\Documents\MiKTeX\miktex\bin\x64\pdflatex.exe",
+    os.path.expandvars(r"%LOCALAPPDATA%\Programs\MiKTeX\miktex\bin\x64\pdflatex.exe"),
+    r"C:\Program Files\MiKTeX\miktex\bin\x64\pdflatex.exe",
+    r"C:\Program Files (x86)\MiKTeX\miktex\bin\x64\pdflatex.exe"
+]
+
+# Preamble every generated summary is asked to start with. It is precompiled
+# into a format file so pdflatex does not reload these packages on every pass.
+# hyperref cannot be dumped into a format, so documents load it after this block.
+STANDARD_PREAMBLE = r"""\documentclass[11pt]{article}
+\usepackage[utf8]{inputenc}
+\usepackage[T1]{fontenc}
+\usepackage[margin=1in]{geometry}
+\usepackage{amsmath}
+\usepackage{amssymb}
+\usepackage{xcolor}
+\usepackage[most]{tcolorbox}
+\usepackage{enumitem}
+\usepackage{tikz}
+\usetikzlibrary{shapes.geometric,arrows.meta,positioning}"""
+
+# Marks where the precompiled part of the preamble ends (a no-op without the format)
+ENDOFDUMP = r"\csname endofdump\endcsname"
+
+_STANDARD_PREAMBLE_RE = re.compile(r"\s*" + r"\s+".join(re.escape(token) for token in STANDARD_PREAMBLE.split()))
+
+_toolchain = None
+_toolchain_lock = threading.Lock()
+_format_lock = threading.Lock()
+_format_failures = set()
+_pdf_cache_lock = threading.Lock()
+
+def find_pdflatex():
+    """
+    Returns the pdflatex executable, from PATH or the known MiKTeX locations.
+    """
+    path = shutil.which("pdflatex")
+    if path:
+        return path
+    for candidate in PDFLATEX_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def get_toolchain(refresh: bool = False) -> dict:
+    """
+    Locates pdflatex once per process and caches its path and version.
+    Returns {"pdflatex": path or None, "version": version string or None}.
+    """
+    global _toolchain
+    with _toolchain_lock:
+        if _toolchain is None or refresh:
+            path = find_pdflatex()
+            version = None
+            if path:
+                try:
+                    result = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=60)
+                    version = (result.stdout.splitlines() or [None])[0]
+                except (OSError, subprocess.SubprocessError) as e:
+                    print(f"⚠️ pdflatex at {path} is not usable: {e}")
+                    path = None
+            if path:
+                print(f"Found pdflatex at: {path} ({version})")
+            else:
+                print("Error: pdflatex not found! Make sure MiKTeX is installed and in PATH.")
+            _toolchain = {"pdflatex": path, "version": version}
+        return dict(_toolchain)
+
+def _format_name() -> str:
+    version = get_toolchain()["version"] or ""
+    digest = hashlib.sha256((STANDARD_PREAMBLE + version).encode("utf-8")).hexdigest()[:12]
+    return f"summary_preamble_{digest}"
+
+def get_preamble_format():
+    """
+    Returns the path (without extension) of the precompiled format for
+    STANDARD_PREAMBLE, building it with mylatexformat on first use.
+    The format is keyed by the preamble and pdflatex version, so a TeX
+    update or preamble change builds a fresh one. Returns None if unavailable.
+    """
+    pdflatex = get_toolchain()["pdflatex"]
+    if not pdflatex:
+        return None
+
+    name = _format_name()
+    fmt_dir = os.path.abspath(LATEX_CACHE_ROOT)
+    fmt_base = os.path.join(fmt_dir, name)
+
+    with _format_lock:
+        if os.path.exists(fmt_base + ".fmt"):
+            return fmt_base
+        if name in _format_failures:
+            return None
+
+        os.makedirs(fmt_dir, exist_ok=True)
+        source = f"{name}_src.tex"
+        with open(os.path.join(fmt_dir, source), "w", encoding="utf-8") as f:
+            f.write(STANDARD_PREAMBLE + "\n\\begin{document}\n\\end{document}\n")
+
+        print("Building precompiled preamble format...")
+        try:
+            subprocess.run(
+                [pdflatex, "-ini", "-interaction=nonstopmode", f"-jobname={name}", "&pdflatex", "mylatexformat.ltx", source],
+                cwd=fmt_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=300
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"⚠️ Could not build preamble format: {e}")
+
+        if not os.path.exists(fmt_base + ".fmt"):
+            print("⚠️ Preamble format not available (is mylatexformat installed?), compiling without it")
+            _format_failures.add(name)
+            return None
+
+        print(f"✓ Preamble format ready: {fmt_base}.fmt")
+        return fmt_base
+
+def prepare_for_format(latex_code: str):
+    """
+    If the document starts with STANDARD_PREAMBLE, returns it with the
+    endofdump marker placed right after that block so the precompiled
+    format can skip it. Returns None when the preamble does not match.
+    """
+    match = _STANDARD_PREAMBLE_RE.match(latex_code)
+    if not match:
+        return None
+    rest = latex_code[match.end():]
+    if rest.lstrip().startswith(ENDOFDUMP):
+        return latex_code
+    # Kept on the last preamble line so pdflatex's line numbers still match the source
+    return latex_code[:match.end()] + ENDOFDUMP + rest
+
+def warm_latex_toolchain(background: bool = True):
+    """
+    Discovers pdflatex and builds the preamble format ahead of the first compile.
+    """
+    if background:
+        threading.Thread(target=get_preamble_format, daemon=True).start()
+    else:
+        get_preamble_format()
+
+# Upper bound on pdflatex runs for one document
+MAX_PASSES = 4
+
+# Longest a single pdflatex pass may run
+COMPILE_TIMEOUT_S = 120
+
+# Size quota of the compiled PDF cache
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "500")) * 1024 * 1024
+
+# pdflatex is single-threaded, so one compile per core
+MAX_COMPILE_WORKERS = os.cpu_count() or 2
+_compile_pool = ThreadPoolExecutor(max_workers=MAX_COMPILE_WORKERS, thread_name_prefix="latex")
+
+# Files whose cross-reference content feeds the next pass
+CROSSREF_EXTENSIONS = ['.aux', '.toc', '.out', '.lof', '.lot']
+AUX_EXTENSIONS = ['.aux', '.log', '.out', '.toc', '.lof', '.lot']
+
+# Only these entries influence the next pass; page counters and
+# \providecommand boilerplate in the .aux do not
+_CROSSREF_RE = re.compile(r"\\(newlabel|contentsline|bibcite|BOOKMARK|@writefile)\b")
+
+# Log messages asking for another run (LaTeX kernel, hyperref, rerunfilecheck)
+_RERUN_RE = re.compile(r"(Rerun to get|Label\(s\) may have changed|Please rerun LaTeX|Rerun LaTeX)", re.IGNORECASE)
+
+def _crossref_state(directory: str, base: str) -> dict:
+    """
+    Hashes the cross-reference entries of the auxiliary files.
+    A missing file and a file without entries hash the same, so a
+    document without labels or a table of contents needs no rerun.
+    """
+    state = {}
+    for ext in CROSSREF_EXTENSIONS:
+        digest = hashlib.sha256()
+        path = os.path.join(directory, base + ext)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    if _CROSSREF_RE.search(line):
+                        digest.update(line.encode("utf-8"))
+        state[ext] = digest.hexdigest()
+    return state
+
+def _read_log(log_file: str) -> str:
+    if not os.path.exists(log_file):
+        return ""
+    with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+def _atomic_move(src: str, dst: str):
+    """
+    Moves src to dst so readers never see a half-written file, also across filesystems.
+    """
+    try:
+        os.replace(src, dst)
+    except OSError:
+        partial = f"{dst}.part-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(src, partial)
+        os.replace(partial, dst)
+
+def _compile_isolated(tex_filepath: str, cleanup: bool, output_dir: str, max_passes: int, timeout: float) -> dict:
+    base = os.path.splitext(os.path.basename(tex_filepath))[0]
+    out_dir = os.path.abspath(output_dir) if output_dir else os.path.dirname(tex_filepath)
+    target_pdf = os.path.join(out_dir, base + '.pdf')
+
+    def failure(error, passes=0):
+        print(f"Error: {error}")
+        return {"success": False, "pdf_path": None, "passes": passes, "error": error}
+
+    if not os.path.exists(tex_filepath):
+        return failure(f"{tex_filepath} not found!")
+
+    # Toolchain discovery is cached for the lifetime of the process
+    pdflatex = get_toolchain()["pdflatex"]
+    if not pdflatex:
+        return failure("pdflatex not found! Make sure MiKTeX is installed and in PATH.")
+
+    with open(tex_filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        tex_content = f.read()
+
+    # Documents starting with the standard preamble load it from the precompiled format
+    fmt_args = []
+    prepared = prepare_for_format(tex_content)
+    fmt_base = get_preamble_format() if prepared is not None else None
+    if fmt_base:
+        tex_content = prepared
+        fmt_args = [f'-fmt={fmt_base}']
+        print("Using precompiled preamble format")
+
+    # Each job gets its own directory, so concurrent compiles of the same
+    # name cannot overwrite each other's .aux/.log files
+    os.makedirs(out_dir, exist_ok=True)
+    work_root = os.path.abspath(os.path.join(LATEX_CACHE_ROOT, "work"))
+    os.makedirs(work_root, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=f"{base}_", dir=work_root)
+
+    tex_name = base + '.tex'
+    pdf_file = os.path.join(work_dir, base + '.pdf')
+    log_file = os.path.join(work_dir, base + '.log')
+    with open(os.path.join(work_dir, tex_name), 'w', encoding='utf-8') as f:
+        f.write(tex_content)
+
+    # Relative \input and images still resolve against the original folder
+    env = dict(os.environ)
+    env["TEXINPUTS"] = os.path.dirname(tex_filepath) + os.pathsep + env.get("TEXINPUTS", "")
+
+    def run_pass():
+        cmd = [pdflatex] + fmt_args + ['-interaction=nonstopmode', tex_name]
+        return subprocess.run(cmd, cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+
+    print(f"Compiling {tex_filepath} in {work_dir}...")
+    passes = 0
+    state = _crossref_state(work_dir, base)
+    try:
+        while passes < max_passes:
+            print(f"Running pass {passes + 1}...")
+            result = run_pass()
+            passes += 1
+
+            # A format built by a different TeX setup can fail to load; fall back to a normal compile
+            if passes == 1 and fmt_args and not os.path.exists(pdf_file):
+                print("Precompiled format failed, retrying without it...")
+                fmt_args = []
+                result = run_pass()
+
+            # LaTeX often returns non-zero for warnings (overfull boxes, etc.) but still creates the PDF
+            if not os.path.exists(pdf_file):
+                log_excerpt = '\n'.join(_read_log(log_file).split('\n')[-50:])
+                print(f"Return code: {result.returncode}")
+                print(f"\nLast 50 lines of log file:\n{log_excerpt}")
+                # Keep the log next to the .tex so the failure can be inspected
+                if os.path.exists(log_file):
+                    _atomic_move(log_file, os.path.join(out_dir, base + '.log'))
+                    register_storage_file(os.path.join(out_dir, base + '.log'))
+                return failure(f"Compilation failed:\n{log_excerpt}", passes)
+
+            new_state = _crossref_state(work_dir, base)
+            rerun = new_state != state or bool(_RERUN_RE.search(_read_log(log_file)))
+            state = new_state
+            if not rerun:
+                break
+
+        if result.returncode != 0:
+            print(f"Note: LaTeX returned warnings (code {result.returncode}), but PDF was created successfully.")
+
+        _atomic_move(pdf_file, target_pdf)
+        register_storage_file(target_pdf)
+        if not cleanup:
+            for ext in AUX_EXTENSIONS:
+                aux_file = os.path.join(work_dir, base + ext)
+                if os.path.exists(aux_file):
+                    _atomic_move(aux_file, os.path.join(out_dir, base + ext))
+                    register_storage_file(os.path.join(out_dir, base + ext))
+        print(f"✓ PDF created successfully in {passes} pass(es): {target_pdf}")
+    except subprocess.TimeoutExpired:
+        return failure(f"pdflatex timed out after {timeout}s", passes)
+    except OSError as e:
+        return failure(f"Could not run pdflatex: {e}", passes)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"success": True, "pdf_path": target_pdf, "passes": passes, "error": None}
+
+def _pdf_cache_key(tex_content: str) -> str:
+    # The toolchain version is part of the key so a TeX update never serves stale output
+    version = get_toolchain()["version"] or ""
+    return hashlib.sha256((version + "\0" + tex_content).encode("utf-8")).hexdigest()
+
+def _pdf_cache_path(key: str) -> str:
+    return os.path.join(os.path.abspath(LATEX_CACHE_ROOT), "pdf", key + ".pdf")
+
+def _store_in_pdf_cache(key: str, pdf_path: str):
+    """
+    Copies a compiled PDF into the cache, then evicts the least recently
+    used entries until the cache fits PDF_CACHE_MAX_BYTES.
+    """
+    cache_path = _pdf_cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        partial = f"{cache_path}.part-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(pdf_path, partial)
+        os.replace(partial, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not cache PDF: {e}")
+        return
+
+    with _pdf_cache_lock:
+        cache_dir = os.path.dirname(cache_path)
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".pdf"):
+                path = os.path.join(cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= PDF_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                print(f"🗑️ Evicted cached PDF {os.path.basename(path)}")
+            except OSError:
+                pass
+
+def _from_pdf_cache(key: str, target_pdf: str) -> bool:
+    cache_path = _pdf_cache_path(key)
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        os.makedirs(os.path.dirname(target_pdf), exist_ok=True)
+        partial = f"{target_pdf}.part-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(cache_path, partial)
+        os.replace(partial, target_pdf)
+        os.utime(cache_path)  # Mark as recently used for LRU eviction
+    except OSError as e:
+        print(f"⚠️ Could not use cached PDF: {e}")
+        return False
+    return True
+
+def compile_latex(tex_filepath, cleanup=True, output_dir=None, max_passes=MAX_PASSES, timeout=COMPILE_TIMEOUT_S, use_cache=True) -> dict:
+    """
+    Compiles a .tex file to PDF on the compile worker pool.
+
+    Each job runs in its own temporary directory and the finished PDF is
+    moved atomically into output_dir (default: the .tex file's folder), so
+    concurrent compiles never see each other's auxiliary files or a partial
+    PDF. Every pdflatex pass is limited to timeout seconds.
+
+    Like latexmk, a further pass runs only when the cross-reference entries
+    in the .aux/.toc/.out files changed during the last pass or the log asks
+    for a rerun, up to max_passes. Documents without labels, references or a
+    table of contents therefore compile in a single pass.
+
+    Identical sources (same TeX content and pdflatex version) are served
+    from a content-addressed cache without running pdflatex ("cached": True).
+    Pass use_cache=False for throwaway documents (e.g. partial previews) so
+    they neither hit nor fill the cache.
+
+    Returns {"success", "pdf_path", "passes", "error", "cached"}.
+    """
+    tex_filepath = os.path.abspath(tex_filepath)
+    key = None
+    if use_cache and os.path.exists(tex_filepath) and get_toolchain()["pdflatex"]:
+        with open(tex_filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            key = _pdf_cache_key(f.read())
+        base = os.path.splitext(os.path.basename(tex_filepath))[0]
+        target_pdf = os.path.join(os.path.abspath(output_dir) if output_dir else os.path.dirname(tex_filepath), base + '.pdf')
+        if _from_pdf_cache(key, target_pdf):
+            register_storage_file(target_pdf)
+            print(f"✓ PDF served from cache: {target_pdf}")
+            return {"success": True, "pdf_path": target_pdf, "passes": 0, "error": None, "cached": True}
+
+    result = _compile_pool.submit(_compile_isolated, tex_filepath, cleanup, output_dir, max_passes, timeout).result()
+    result["cached"] = False
+    if result["success"] and key:
+        _store_in_pdf_cache(key, result["pdf_path"])
+    return result
@@ -0,0 +1,377 @@
+import re
+from utils_llm import stream_completion, stream_routed
+from utils_latex import compile_latex
+
+# Environments whose contents are passed through untouched
+VERBATIM_ENVS = {"verbatim", "verbatim*", "lstlisting", "minted", "tikzpicture", "comment"}
+
+# Environments that are math mode
+MATH_ENVS = {
+    "equation", "equation*", "align", "align*", "gather", "gather*", "multline", "multline*",
+    "eqnarray", "eqnarray*", "displaymath", "math", "flalign", "flalign*", "alignat", "alignat*"
+}
+
+# Environments where & is a column separator
+ALIGN_ENVS = MATH_ENVS | {"tabular", "tabular*", "tabularx", "longtable", "array", "matrix", "pmatrix", "bmatrix", "cases", "split", "aligned"}
+
+# Commands whose braced arguments are names, keys or paths, not text
+RAW_ARG_COMMANDS = {
+    "label", "ref", "eqref", "pageref", "autoref", "nameref", "cref", "Cref", "cite",
+    "url", "href", "hyperref", "includegraphics", "input", "include", "usepackage",
+    "usetikzlibrary", "begin", "end", "definecolor",
+    "tcbset", "setlist", "hypersetup", "documentclass"
+}
+
+# Commands that define macros or environments; all of their arguments, including the body, are kept as written
+DEFINITION_COMMANDS = {
+    "newcommand", "renewcommand", "providecommand", "newenvironment", "renewenvironment",
+    "newtcolorbox", "DeclareMathOperator"
+}
+
+# Commands whose braced argument is code shown as typed
+VERBATIM_ARG_COMMANDS = {"lstinline", "path", "detokenize"}
+
+# Lines of context sent to the LLM around a broken spot
+REPAIR_CONTEXT_LINES = 12
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*$", re.MULTILINE)
+_ENV_RE = re.compile(r"\\(begin|end)\{([^}]+)\}")
+_LOG_LINE_RE = re.compile(r"^l\.(\d+)", re.MULTILINE)
+_LOG_ERROR_RE = re.compile(r"^! (.+)$", re.MULTILINE)
+_COMMAND_RE = re.compile(r"\\([a-zA-Z@]+\*?|.)")
+
+def strip_code_fences(text: str) -> str:
+    """
+    Removes markdown code fences and any chatter outside the document.
+    """
+    text = _FENCE_RE.sub("", text).replace("```", "")
+    start = text.find("\\documentclass")
+    if start > 0:
+        text = text[start:]
+    end = text.rfind("\\end{document}")
+    if end >= 0:
+        text = text[:end + len("\\end{document}")]
+    return text.strip()
+
+def _copy_group(line: str, i: int, out: list) -> int:
+    """
+    Copies an optional [...] and a balanced {...} group starting at i unchanged.
+    """
+    while i < len(line) and line[i] == "[":
+        close = line.find("]", i)
+        if close < 0:
+            break
+        out.append(line[i:close + 1])
+        i = close + 1
+    if i < len(line) and line[i] == "{":
+        depth = 0
+        j = i
+        while j < len(line):
+            if line[j] == "\\":
+                j += 2
+                continue
+            if line[j] == "{":
+                depth += 1
+            elif line[j] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            j += 1
+        out.append(line[i:j + 1])
+        return j + 1
+    return i
+
+def _copy_verb(line: str, i: int, out: list) -> int:
+    """
+    Copies the delimited argument of \\verb starting at i (e.g. |a_b|) unchanged.
+    """
+    if i >= len(line):
+        return i
+    close = line.find(line[i], i + 1)
+    end = len(line) if close < 0 else close + 1
+    out.append(line[i:end])
+    return end
+
+def _copy_code_arg(name: str, line: str, i: int, out: list) -> int:
+    """
+    Copies the argument of a command whose argument must not be touched
+    (\\verb, code, definition and raw-argument commands). Returns i unchanged for other commands.
+    """
+    if name in ("verb", "verb*"):
+        return _copy_verb(line, i, out)
+    if name in DEFINITION_COMMANDS:
+        # \newcommand{\foo}[1][x]{body} or \newcommand\foo{body}: copy every argument
+        match = _COMMAND_RE.match(line, i) if line.startswith("\\", i) else None
+        if match:
+            out.append(match.group(0))
+            i = match.end()
+        while True:
+            end = _copy_group(line, i, out)
+            if end == i:
+                return i
+            i = end
+    if name in RAW_ARG_COMMANDS or name in VERBATIM_ARG_COMMANDS:
+        return _copy_group(line, i, out)
+    return i
+
+def _code_only(line: str) -> str:
+    """
+    Returns the line up to its comment with escaped characters, \\verb text
+    and the contents of raw/code command arguments blanked out, so braces
+    and \\begin/\\end can be scanned. Positions match the original line.
+    A % inside \\url{...} or \\verb|...| does not start a comment.
+    """
+    out = []
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if c == "%":
+            break
+        if c != "\\":
+            out.append(c)
+            i += 1
+            continue
+        match = _COMMAND_RE.match(line, i)
+        token = match.group(0) if match else c
+        name = match.group(1) if match else ""
+        i += len(token)
+        if name in ("{", "}", "%"):
+            out.append(" " * len(token))
+            continue
+        out.append(token)
+        if name in ("begin", "end"):
+            continue  # Environment names are scanned by the caller
+        skipped = []
+        end = _copy_code_arg(name, line, i, skipped)
+        # Only the outer braces of the argument are kept
+        blank = [" "] * len("".join(skipped))
+        open_at = -1 if name in ("verb", "verb*") else "".join(skipped).find("{")
+        if open_at >= 0:
+            blank[open_at] = "{"
+            if len(blank) > open_at + 1 and skipped[-1].endswith("}"):
+                blank[-1] = "}"
+        out.append("".join(blank))
+        i = end
+    return "".join(out)
+
+def _escape_specials(lines: list, first_line: int, issues: list) -> list:
+    """
+    Escapes &, % and _ that appear in text mode. Math, alignment
+    environments, verbatim-like environments, comments, \\verb and the
+    arguments of code (\\lstinline, \\path), definition (\\newcommand)
+    and label/ref/url-style commands are left alone.
+    """
+    env_stack = []
+    inline_math = False
+    result = []
+
+    for offset, line in enumerate(lines):
+        line_no = first_line + offset
+        if not line.strip():
+            inline_math = False  # $...$ never spans a paragraph
+        if env_stack and env_stack[-1] in VERBATIM_ENVS and not line.strip().startswith("\\end{" + env_stack[-1]):
+            result.append(line)
+            continue
+
+        out = []
+        i = 0
+        while i < len(line):
+            c = line[i]
+            in_math = inline_math or any(env in MATH_ENVS for env in env_stack)
+            if c == "\\":
+                match = _COMMAND_RE.match(line, i)
+                token = match.group(0) if match else c
+                name = match.group(1) if match else ""
+                out.append(token)
+                i += len(token)
+                if name in ("(", "["):
+                    inline_math = True
+                elif name in (")", "]"):
+                    inline_math = False
+                elif name in ("begin", "end"):
+                    env = re.match(r"\{([^}]+)\}", line[i:])
+                    if env:
+                        if name == "begin":
+                            env_stack.append(env.group(1))
+                        elif env.group(1) in env_stack:
+                            del env_stack[len(env_stack) - 1 - env_stack[::-1].index(env.group(1))]
+                i = _copy_code_arg(name, line, i, out)
+                continue
+            if c == "$":
+                inline_math = not inline_math
+                if line[i:i + 2] == "$$":
+                    out.append("$$")
+                    i += 2
+                    continue
+            elif c == "%":
+                if not in_math and i > 0 and line[i - 1].isdigit():
+                    out.append("\\%")
+                    issues.append({"line": line_no, "message": "Escaped % after a number", "fixed": True})
+                    i += 1
+                    continue
+                out.append(line[i:])  # Comment: keep the rest of the line as is
+                break
+            elif c == "&" and not in_math and not any(env in ALIGN_ENVS for env in env_stack):
+                out.append("\\&")
+                issues.append({"line": line_no, "message": "Escaped & in text", "fixed": True})
+                i += 1
+                continue
+            elif c == "_" and not in_math:
+                out.append("\\_")
+                issues.append({"line": line_no, "message": "Escaped _ in text", "fixed": True})
+                i += 1
+                continue
+            out.append(c)
+            i += 1
+        result.append("".join(out))
+    return result
+
+def _balance_environments(lines: list, issues: list) -> list:
+    """
+    Closes environments left open and drops \\end{...} without a matching \\begin.
+    """
+    stack = []
+    result = []
+    for index, line in enumerate(lines):
+        code = _code_only(line)
+        pieces = []
+        last = 0
+        for match in _ENV_RE.finditer(code):
+            kind, env = match.groups()
+            if kind == "begin":
+                stack.append(env)
+                continue
+            if env not in stack:
+                issues.append({"line": index + 1, "message": f"Removed \\end{{{env}}} without \\begin", "fixed": True})
+                pieces.append(line[last:match.start()])
+                last = match.end()
+                continue
+            # Close anything opened after env that was never closed
+            closing = ""
+            while stack[-1] != env:
+                inner = stack.pop()
+                closing += f"\\end{{{inner}}}"
+                issues.append({"line": index + 1, "message": f"Closed unterminated {inner} environment", "fixed": True})
+            stack.pop()
+            if closing:
+                pieces.append(line[last:match.start()] + closing)
+                last = match.start()
+        pieces.append(line[last:])
+        result.append("".join(pieces))
+
+    if stack and stack[0] == "document":
+        missing = "".join(f"\\end{{{env}}}\n" for env in reversed(stack[1:]))
+        if missing:
+            issues.append({"line": len(lines), "message": "Closed environments left open at end of document", "fixed": True})
+        result.append(missing + "\\end{document}")
+        issues.append({"line": len(lines), "message": "Added missing \\end{document}", "fixed": True})
+    elif stack:
+        for env in stack:
+            issues.append({"line": len(lines), "message": f"Environment {env} is never closed", "fixed": False})
+    return result
+
+def lint_latex(latex_code: str):
+    """
+    Fixes common mistakes in generated LaTeX without calling the model.
+    Returns (fixed_code, issues); issues with fixed=False need a repair.
+    """
+    issues = []
+    code = strip_code_fences(latex_code)
+    lines = code.split("\n")
+
+    begin = next((i for i, line in enumerate(lines) if "\\begin{document}" in line), None)
+    if begin is None:
+        issues.append({"line": 1, "message": "Missing \\begin{document}", "fixed": False})
+        return code, issues
+
+    # Only the body is escaped; preamble option lists legitimately use these characters
+    lines = lines[:begin + 1] + _escape_specials(lines[begin + 1:], begin + 2, issues)
+    lines = _balance_environments(lines, issues)
+
+    # Unbalanced braces cannot be placed reliably; report the first offending line
+    depth = 0
+    for index, line in enumerate(lines):
+        code_part = _code_only(line)
+        depth += code_part.count("{") - code_part.count("}")
+        if depth < 0:
+            issues.append({"line": index + 1, "message": "Unmatched closing brace", "fixed": False})
+            depth = 0
+    if depth > 0:
+        issues.append({"line": len(lines), "message": f"{depth} unclosed brace(s)", "fixed": False})
+
+    return "\n".join(lines), issues
+
+def parse_log_errors(log_text: str) -> list:
+    """
+    Extracts (line number, message) pairs for the errors in a pdflatex log.
+    """
+    errors = []
+    for match in _LOG_ERROR_RE.finditer(log_text or ""):
+        line_match = _LOG_LINE_RE.search(log_text, match.end())
+        errors.append({"line": int(line_match.group(1)) if line_match else None, "message": match.group(1)})
+    return errors
+
+def repair_region(latex_code: str, line_no: int, error: str, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama", hints: list = None) -> str:
+    """
+    Asks the LLM to fix only the lines around line_no and splices the fix back in.
+    hints are lint findings inside the region, passed along as suspects.
+    """
+    lines = latex_code.split("\n")
+    start = max(0, line_no - 1 - REPAIR_CONTEXT_LINES)
+    end = min(len(lines), line_no + REPAIR_CONTEXT_LINES)
+    region = "\n".join(lines[start:end])
+    notes = "".join(f"\nThe linter also flagged line {h['line']}: {h['message']}" for h in hints or [] if start < h["line"] <= end)
+
+    messages = [
+        {"role": "system", "content": "You fix LaTeX compile errors. Reply with only the corrected lines, no code fences and no explanation."},
+        {"role": "user", "content": f"""These are lines {start + 1}-{end} of a LaTeX document. pdflatex reports on line {line_no}: {error}{notes}
+
+Fix the error with the smallest possible change. Keep all other text identical, return exactly the same span of lines.
+
+{region}"""}
+    ]
+
+    def request(p, m):
+        return stream_completion(p, m, messages, feature="latex_repair", temperature=0.0)
+
+    fixed = strip_code_fences("".join(stream_routed(provider, model_name, request)))
+    if not fixed:
+        return latex_code
+    print(f"🩹 Repaired LaTeX lines {start + 1}-{end}: {error}")
+    return "\n".join(lines[:start] + fixed.split("\n") + lines[end:])
+
+def compile_with_repair(tex_path: str, output_dir: str = None, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama", max_repairs: int = 2) -> dict:
+    """
+    Lints the .tex file and compiles it. Only when pdflatex fails is the
+    region around the first logged error sent to the LLM; the repaired
+    source is re-linted and recompiled, so every repair works from the line
+    numbers of the latest compile. Lint findings the linter could not fix
+    are passed to the repair as hints. Up to max_repairs repairs are made
+    and the file is rewritten with the result. Returns compile_latex's
+    result plus "issues" (every lint fix and the findings still open) and
+    "repairs" (number of LLM repairs).
+    """
+    with open(tex_path, 'r', encoding='utf-8') as f:
+        latex_code, issues = lint_latex(f.read())
+    fixes = [i for i in issues if i["fixed"]]
+
+    repairs = 0
+    while True:
+        with open(tex_path, 'w', encoding='utf-8') as f:
+            f.write(latex_code)
+        compiled = compile_latex(tex_path, cleanup=True, output_dir=output_dir)
+        if compiled["success"] or repairs >= max_repairs:
+            break
+        errors = [e for e in parse_log_errors(compiled["error"]) if e["line"]]
+        if not errors:
+            break
+        hints = [i for i in issues if not i["fixed"]]
+        latex_code = repair_region(latex_code, errors[0]["line"], errors[0]["message"], model_name, provider, hints)
+        repairs += 1
+        # The splice can change the line count, so earlier findings are stale
+        latex_code, issues = lint_latex(latex_code)
+        fixes.extend(i for i in issues if i["fixed"])
+
+    compiled["issues"] = fixes + [i for i in issues if not i["fixed"]]
+    compiled["repairs"] = repairs
+    return compiled
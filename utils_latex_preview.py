@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import threading
+from utils_storage import LATEX_CACHE_ROOT
+from utils_latex import compile_latex
+from utils_latex_lint import lint_latex, strip_code_fences
+
+# Previews are deleted this long after they were last updated
+PREVIEW_TTL_S = 60 * 60
+
+_SECTION_RE = re.compile(r"\\section\*?\{")
+
+_lock = threading.Lock()
+_previews = {}
+# Preview of the generation currently running for each single-flight key
+_previews_by_key = {}
+
+class ProgressivePreview:
+    """
+    Compiles a LaTeX document while it is still being generated.
+
+    feed() receives the streamed text; each time a new \\section starts, the
+    document up to that point (the completed sections) is closed off with
+    lint_latex, which ends open environments and appends \\end{document},
+    and compiled in the background. Only one compile runs at a time; if more
+    sections complete meanwhile, the next compile picks up the latest text.
+
+    Coalesced requests share one preview. Each reader feeds the chunks it
+    streams together with their offset, so text the preview already has is
+    skipped, and the document is finished when the last reader releases it.
+    """
+
+    def __init__(self, key=None):
+        self.key = key
+        self.id = uuid.uuid4().hex[:12]
+        self.directory = os.path.abspath(os.path.join(LATEX_CACHE_ROOT, "preview", self.id))
+        os.makedirs(self.directory, exist_ok=True)
+        self.tex_path = os.path.join(self.directory, "preview.tex")
+        self.pdf_path = os.path.join(self.directory, "preview.pdf")
+        self.text = ""
+        self.sections = 0
+        self.compiled_sections = 0
+        self.complete = False
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+        self.pending = None
+        self.compiling = False
+        self.readers = 0
+        self.closed = False
+        self.text_lock = threading.Lock()
+
+    def feed(self, chunk: str, offset: int = None):
+        """
+        Adds streamed text. offset is where chunk starts in the document;
+        when given, any part of chunk the preview already has is skipped.
+        """
+        with self.text_lock:
+            if offset is not None:
+                if offset + len(chunk) <= len(self.text):
+                    return
+                chunk = chunk[max(0, len(self.text) - offset):]
+            self.text += chunk
+            starts = [m.start() for m in _SECTION_RE.finditer(self.text)]
+            # The latest section is still being written; everything before it is complete
+            if len(starts) - 1 > self.sections:
+                self.sections = len(starts) - 1
+                self._schedule(self.text[:starts[-1]], self.sections)
+
+    def finish(self, complete: bool = True):
+        """
+        Compiles everything received once generation ends. complete is False
+        when the stream stopped early, so the preview is not marked complete.
+        """
+        with self.text_lock:
+            self.sections = len(_SECTION_RE.findall(self.text))
+            self._schedule(self.text, self.sections, final=complete)
+
+    def attach(self):
+        """
+        Counts a reader. Called when its stream starts, so a response that is
+        never sent does not keep the preview open.
+        """
+        with _lock:
+            self.readers += 1
+            if self.closed:
+                # Every earlier reader already left; this one carries on feeding
+                self.closed = False
+                _previews_by_key.setdefault(self.key, self)
+
+    def release(self, complete: bool):
+        """
+        Called by each reader when its stream ends; the last one finishes the preview.
+        """
+        with _lock:
+            self.readers -= 1
+            if self.readers > 0:
+                return
+            self.closed = True
+            if _previews_by_key.get(self.key) is self:
+                del _previews_by_key[self.key]
+        self.finish(complete)
+
+    def _schedule(self, partial: str, sections: int, final: bool = False):
+        with self.lock:
+            self.pending = (partial, sections, final)
+            if self.compiling:
+                return
+            self.compiling = True
+        threading.Thread(target=self._compile_loop, daemon=True).start()
+
+    def _compile_loop(self):
+        while True:
+            with self.lock:
+                job = self.pending
+                self.pending = None
+                if job is None:
+                    self.compiling = False
+                    return
+            partial, sections, final = job
+            code = strip_code_fences(partial)
+            if "\\begin{document}" not in code:
+                continue
+            code, _ = lint_latex(code)
+            with open(self.tex_path, 'w', encoding='utf-8') as f:
+                f.write(code)
+            # compile_latex moves the PDF into place atomically, so readers never see a partial file
+            # Partial documents are never requested again; keep them out of the PDF cache
+            result = compile_latex(self.tex_path, cleanup=True, output_dir=self.directory, use_cache=False)
+            if result["success"]:
+                self.compiled_sections = sections
+                self.complete = final
+                self.updated_at = time.time()
+                print(f"👀 Preview {self.id}: {sections} section(s) compiled")
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "sections": self.compiled_sections,
+            "complete": self.complete,
+            "available": os.path.exists(self.pdf_path),
+            "updated_at": self.updated_at,
+        }
+
+def _prune():
+    cutoff = time.time() - PREVIEW_TTL_S
+    for preview_id, preview in list(_previews.items()):
+        if preview.updated_at < cutoff and not preview.compiling:
+            del _previews[preview_id]
+            if _previews_by_key.get(preview.key) is preview:
+                del _previews_by_key[preview.key]
+            shutil.rmtree(preview.directory, ignore_errors=True)
+
+def open_preview(key, joined: bool) -> ProgressivePreview:
+    """
+    Returns the preview for a single-flight generation. Callers that joined
+    an existing flight share its preview; a new flight gets a new one. Each
+    reader calls attach() when its stream starts and release() when it ends.
+    """
+    with _lock:
+        _prune()
+        preview = _previews_by_key.get(key) if joined else None
+        if preview is None or preview.closed:
+            preview = ProgressivePreview(key)
+            _previews[preview.id] = preview
+            _previews_by_key[key] = preview
+        return preview
+
+def get_preview(preview_id: str):
+    with _lock:
+        return _previews.get(preview_id)
@@ -1,9 +1,18 @@
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
+from utils_llm_router import AUTO_PROVIDER, hedged_stream, call_with_failover
+from utils_telemetry import track_call
+from utils_model_residency import keep_alive_body, touch
+from utils_latex import STANDARD_PREAMBLE
 
 load_dotenv()
 
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "http://localhost:8501",
+    "X-Title": "Unified Media Parser",
+}
+
 def get_client(provider: str = "Ollama"):
     """
     Returns an OpenAI-compatible client based on the provider.
@@ -19,13 +28,49 @@ def get_client(provider: str = "Ollama"):
             api_key='ollama',
         )
 
-def generate_latex_code(transcript_text: str, model_name: str = "qwen3:30b-instruct", summary_mode: str = "concise", provider: str = "Ollama"):
+def stream_completion(provider: str, model_name: str, messages: list, feature: str = "chat", **params):
     """
-    Sends the transcript to the selected provider to generate LaTeX code.
-    Yields chunks of generated text for streaming.
+    Streams a chat completion from a single provider.
+    Yields chunks of generated text. Latency and token usage are recorded
+    under the given feature tag.
     """
     client = get_client(provider)
+    if provider == "Ollama":
+        params["extra_body"] = keep_alive_body(params.get("extra_body"))
+        touch(model_name)
+    with track_call(provider, model_name, feature) as call:
+        stream = client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            extra_headers=OPENROUTER_HEADERS if provider == "OpenRouter" else None,
+            **params
+        )
+        call.response_started()
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    call.set_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.token()
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+def stream_routed(provider: str, model_name: str, request_fn):
+    """
+    Runs request_fn(provider, model_name) directly, or through the hedging
+    router when provider is "Auto".
+    """
+    if provider == AUTO_PROVIDER:
+        return hedged_stream(request_fn, model_name)
+    return request_fn(provider, model_name)
 
+def build_latex_messages(transcript_text: str) -> list:
+    """
+    Builds the system/user messages for LaTeX summary generation.
+    """
     system_prompt = """You are an expert academic assistant and LaTeX specialist.
     Your task is to convert lecture transcripts or content into a comprehensive, high-quality LaTeX document.
     You strictly follow formatting rules, structure requirements, and content documentation rules.
@@ -47,6 +92,11 @@ structure:
 - $...$ inline math for all variables
 - \\textbf{{}} for emphasis
 
+preamble:
+- start the document with exactly this preamble, unchanged and in this order:
+{STANDARD_PREAMBLE}
+- add \\usepackage{{hyperref}} and any other packages you need after it
+
 color boxes:
 - blue!5!white with blue!75!black frame for "Key Takeaway"
 - green!5!white with green!75!black frame for "Remember"
@@ -120,31 +170,28 @@ TRANSCRIPT:
 {{transcript}}
 """
 
-    stream = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt_template.replace("{transcript}", transcript_text)}
-        ],
-        stream=True,
-        temperature=0.1,
-        extra_headers={
-            "HTTP-Referer": "http://localhost:8501",
-            "X-Title": "Unified Media Parser",
-        } if provider == "OpenRouter" else None
-    )
-
-    for chunk in stream:
-        if chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt_template.replace("{transcript}", transcript_text)}
+    ]
 
-def generate_podcast_script(transcript_text: str, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama"):
+def generate_latex_code(transcript_text: str, model_name: str = "qwen3:30b-instruct", summary_mode: str = "concise", provider: str = "Ollama"):
     """
-    Generates a podcast-style script from the transcript using the selected provider.
+    Sends the transcript to the selected provider to generate LaTeX code.
+    Pass provider="Auto" to hedge between Ollama and OpenRouter.
     Yields chunks of generated text for streaming.
     """
-    client = get_client(provider)
+    messages = build_latex_messages(transcript_text)
+
+    def request(p, m):
+        return stream_completion(p, m, messages, feature="latex", temperature=0.1)
 
+    yield from stream_routed(provider, model_name, request)
+
+def build_podcast_messages(transcript_text: str) -> list:
+    """
+    Builds the system/user messages for podcast script generation.
+    """
     system_prompt = """You are an expert podcast scriptwriter and educational communicator. 
     Your goal is to transform lecture transcripts into engaging, easy-to-follow, and highly verbose podcast scripts that cover the material comprehensively from start to finish.
     """
@@ -181,34 +228,35 @@ TRANSCRIPT TO CONVERT:
     {transcript_text}
     """
 
-    # We use extra_body to pass Ollama-specific parameters like num_ctx
-    stream = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        stream=True,
-        extra_body={
-            "num_ctx": 32768  # Set context limit to 32k
-        } if provider == "Ollama" else None,
-        extra_headers={
-            "HTTP-Referer": "http://localhost:8501",
-            "X-Title": "Unified Media Parser",
-        } if provider == "OpenRouter" else None
-    )
-
-    for chunk in stream:
-        if chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
-def generate_conversational_summary(transcript_text: str, model_name: str = "google/gemini-2.5-flash-lite"):
+def generate_podcast_script(transcript_text: str, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama"):
     """
-    Generates an in-depth conversational summary from the transcript using OpenRouter (Gemini 2.5 Flash Lite).
-    Returns pure plaintext.
+    Generates a podcast-style script from the transcript using the selected provider.
+    Pass provider="Auto" to hedge between Ollama and OpenRouter.
+    Yields chunks of generated text for streaming.
     """
-    client = get_client("OpenRouter")
+    messages = build_podcast_messages(transcript_text)
+
+    def request(p, m):
+        # We use extra_body to pass Ollama-specific parameters like num_ctx
+        return stream_completion(
+            p, m, messages,
+            feature="podcast",
+            extra_body={
+                "num_ctx": 32768  # Set context limit to 32k
+            } if p == "Ollama" else None
+        )
+
+    yield from stream_routed(provider, model_name, request)
 
+def build_summary_messages(transcript_text: str) -> list:
+    """
+    Builds the system/user messages for the conversational summary.
+    """
     system_prompt = "You are an expert communicator. Your task is to perform an in-depth summary of the provided transcript content and respond in a conversational manner, in complete plaintext. Do not use em-dashes."
 
     user_prompt = f"""
@@ -224,15 +272,15 @@ TRANSCRIPT:
 {transcript_text}
 """
 
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
-    content = response.choices[0].message.content
+def clean_summary_text(content: str) -> str:
+    """
+    Removes formatting the TTS engine should not read out.
+    """
     # Strip any potential markdown code blocks if the model ignores instructions
     if "```" in content:
         content = content.replace("```plaintext", "").replace("```", "").strip()
@@ -241,6 +289,43 @@ TRANSCRIPT:
     content = content.replace("—", "-").replace("**", "").replace("__", "")
     return content.strip()
 
+def _clean_summary_piece(piece: str) -> str:
+    piece = piece.replace("```plaintext", "").replace("```", "")
+    return piece.replace("—", "-").replace("**", "").replace("__", "")
+
+def stream_conversational_summary(transcript_text: str, model_name: str = "google/gemini-2.5-flash-lite", max_buffer: int = 600):
+    """
+    Streams the conversational summary from OpenRouter.
+    Yields cleaned plaintext one paragraph at a time (or at the last sentence
+    end once max_buffer characters are pending), so formatting markers split
+    across chunks are still removed and TTS can start on the first paragraph.
+    """
+    messages = build_summary_messages(transcript_text)
+    buffer = ""
+    for chunk in stream_completion("OpenRouter", model_name, messages, feature="summary"):
+        buffer += chunk
+        cut = buffer.rfind("\n\n")
+        if cut >= 0:
+            cut += 2
+        elif len(buffer) >= max_buffer:
+            cut = max(buffer.rfind(". "), buffer.rfind("? "), buffer.rfind("! "))
+            cut = cut + 2 if cut >= 0 else -1
+        if cut > 0:
+            piece = _clean_summary_piece(buffer[:cut])
+            buffer = buffer[cut:]
+            if piece.strip():
+                yield piece
+    piece = _clean_summary_piece(buffer)
+    if piece.strip():
+        yield piece
+
+def generate_conversational_summary(transcript_text: str, model_name: str = "google/gemini-2.5-flash-lite"):
+    """
+    Generates an in-depth conversational summary from the transcript using OpenRouter (Gemini 2.5 Flash Lite).
+    Returns pure plaintext.
+    """
+    return clean_summary_text("".join(stream_conversational_summary(transcript_text, model_name)))
+
 def get_tools():
     """Returns the list of tools available for the LLM."""
     return [
@@ -262,7 +347,7 @@ def get_tools():
             "type": "function",
             "function": {
                 "name": "transcribe_file",
-                "description": "Transcribe an audio/video file to text",
+                "description": "Transcribe an audio/video file to text. Runs in the background and returns a job_id to check with check_job",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -276,7 +361,7 @@ def get_tools():
             "type": "function",
             "function": {
                 "name": "generate_summary_pdf",
-                "description": "Generate a LaTeX summary and compile it to PDF from a transcript file",
+                "description": "Generate a LaTeX summary and compile it to PDF from a transcript file. Runs in the background and returns a job_id to check with check_job",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -291,7 +376,7 @@ def get_tools():
             "type": "function",
             "function": {
                 "name": "generate_quiz_from_latex",
-                "description": "Generate an interactive quiz from a LaTeX summary file",
+                "description": "Generate an interactive quiz from a LaTeX summary file. Runs in the background and returns a job_id to check with check_job",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -319,6 +404,21 @@ def get_tools():
                     "required": ["folder_type"]
                 }
             }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "check_job",
+                "description": "Check the status of a background job started by transcribe_file, generate_summary_pdf or generate_quiz_from_latex. Returns its progress, and its result once status is 'done'.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {"type": "string", "description": "The job_id returned when the job was started"},
+                        "wait_seconds": {"type": "integer", "description": "Seconds to wait for the job to finish before reporting (max 30)", "default": 0}
+                    },
+                    "required": ["job_id"]
+                }
+            }
         }
     ]
 
@@ -326,14 +426,84 @@ def chat_with_tools(messages, model_name="qwen3:30b-instruct", provider="Ollama"
     """
     Handles a chat conversation with potential tool calling.
     """
-    client = get_client(provider)
     tools = get_tools()
 
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
-        tools=tools,
-        tool_choice="auto"
-    )
+    def request(p, m):
+        client = get_client(p)
+        if p == "Ollama":
+            touch(m)
+        with track_call(p, m, "chat", streaming=False) as call:
+            response = client.chat.completions.create(
+                model=m,
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                extra_body=keep_alive_body() if p == "Ollama" else None
+            )
+            call.set_usage(response.usage)
+        return response.choices[0].message
+
+    if provider == AUTO_PROVIDER:
+        return call_with_failover(request, model_name)
+    return request(provider, model_name)
+
+def stream_chat_with_tools(messages, model_name="qwen3:30b-instruct", provider="Ollama"):
+    """
+    Streaming variant of chat_with_tools.
+    Yields {"type": "token", "content": ...} while the answer is produced, then
+    a final {"type": "message", "message": {...}} holding the assembled
+    assistant message (including any tool calls) ready to append to messages.
+    """
+    tools = get_tools()
 
-    return response.choices[0].message
+    def request(p, m):
+        client = get_client(p)
+        if p == "Ollama":
+            touch(m)
+        content = []
+        tool_calls = {}
+        with track_call(p, m, "chat") as call:
+            stream = client.chat.completions.create(
+                model=m,
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                stream=True,
+                stream_options={"include_usage": True},
+                extra_body=keep_alive_body() if p == "Ollama" else None
+            )
+            call.response_started()
+            try:
+                for chunk in stream:
+                    if chunk.usage:
+                        call.set_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        call.token()
+                        content.append(delta.content)
+                        yield {"type": "token", "content": delta.content}
+                    # Tool calls arrive as fragments keyed by index; stitch them together
+                    for fragment in delta.tool_calls or []:
+                        call.token()
+                        index = fragment.index if fragment.index is not None else len(tool_calls)
+                        entry = tool_calls.setdefault(index, {
+                            "id": f"call_{index}",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""}
+                        })
+                        if fragment.id:
+                            entry["id"] = fragment.id
+                        if fragment.function:
+                            entry["function"]["name"] += fragment.function.name or ""
+                            entry["function"]["arguments"] += fragment.function.arguments or ""
+            finally:
+                stream.close()
+
+        message = {"role": "assistant", "content": "".join(content) or None}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+        yield {"type": "message", "message": message}
+
+    return stream_routed(provider, model_name, request)
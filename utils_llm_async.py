@@ -0,0 +1,169 @@
+from openai import AsyncOpenAI
+import os
+from dotenv import load_dotenv
+from utils_llm import (
+    OPENROUTER_HEADERS, build_latex_messages, build_podcast_messages,
+    build_summary_messages, clean_summary_text, get_tools
+)
+from utils_llm_quiz import build_quiz_messages, clean_quiz_json
+from utils_llm_router import AUTO_PROVIDER, ahedged_stream, acall_with_failover
+from utils_telemetry import track_call
+from utils_model_residency import keep_alive_body, touch
+
+load_dotenv()
+
+# One client per provider so concurrent generations share a connection pool
+_clients = {}
+
+def get_async_client(provider: str = "Ollama"):
+    """
+    Returns a shared AsyncOpenAI client for the provider.
+    """
+    provider = "OpenRouter" if provider == "OpenRouter" else "Ollama"
+    if provider not in _clients:
+        if provider == "OpenRouter":
+            _clients[provider] = AsyncOpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=os.getenv("OPENROUTER_API_KEY")
+            )
+        else:
+            _clients[provider] = AsyncOpenAI(
+                base_url='http://localhost:11434/v1',
+                api_key='ollama',
+            )
+    return _clients[provider]
+
+async def astream_completion(provider: str, model_name: str, messages: list, feature: str = "chat", **params):
+    """
+    Async variant of utils_llm.stream_completion.
+    Yields chunks of generated text.
+    """
+    client = get_async_client(provider)
+    if provider == "Ollama":
+        params["extra_body"] = keep_alive_body(params.get("extra_body"))
+        touch(model_name)
+    with track_call(provider, model_name, feature) as call:
+        stream = await client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            extra_headers=OPENROUTER_HEADERS if provider == "OpenRouter" else None,
+            **params
+        )
+        call.response_started()
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    call.set_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.token()
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+def astream_routed(provider: str, model_name: str, request_fn):
+    """
+    Runs request_fn directly, or through the async hedging router when provider is "Auto".
+    """
+    if provider == AUTO_PROVIDER:
+        return ahedged_stream(request_fn, model_name)
+    return request_fn(provider, model_name)
+
+async def agenerate_latex_code(transcript_text: str, model_name: str = "qwen3:30b-instruct", summary_mode: str = "concise", provider: str = "Ollama"):
+    """
+    Async variant of utils_llm.generate_latex_code.
+    Yields chunks of generated text for streaming.
+    """
+    messages = build_latex_messages(transcript_text)
+
+    def request(p, m):
+        return astream_completion(p, m, messages, feature="latex", temperature=0.1)
+
+    async for chunk in astream_routed(provider, model_name, request):
+        yield chunk
+
+async def agenerate_podcast_script(transcript_text: str, model_name: str = "qwen3:30b-instruct", provider: str = "Ollama"):
+    """
+    Async variant of utils_llm.generate_podcast_script.
+    Yields chunks of generated text for streaming.
+    """
+    messages = build_podcast_messages(transcript_text)
+
+    def request(p, m):
+        return astream_completion(
+            p, m, messages,
+            feature="podcast",
+            extra_body={"num_ctx": 32768} if p == "Ollama" else None
+        )
+
+    async for chunk in astream_routed(provider, model_name, request):
+        yield chunk
+
+async def agenerate_conversational_summary(transcript_text: str, model_name: str = "google/gemini-2.5-flash-lite"):
+    """
+    Async variant of utils_llm.generate_conversational_summary.
+    Returns pure plaintext.
+    """
+    client = get_async_client("OpenRouter")
+
+    with track_call("OpenRouter", model_name, "summary", streaming=False) as call:
+        response = await client.chat.completions.create(
+            model=model_name,
+            messages=build_summary_messages(transcript_text),
+            extra_headers=OPENROUTER_HEADERS
+        )
+        call.set_usage(response.usage)
+
+    return clean_summary_text(response.choices[0].message.content)
+
+async def agenerate_quiz(latex_content: str, model_name: str = "qwen3:30b-instruct", num_questions: int = 10, provider: str = "Ollama"):
+    """
+    Async variant of utils_llm_quiz.generate_quiz.
+    Returns the complete JSON string.
+    """
+    messages = build_quiz_messages(latex_content, num_questions)
+
+    async def request(p, m):
+        client = get_async_client(p)
+        if p == "Ollama":
+            touch(m)
+        with track_call(p, m, "quiz", streaming=False) as call:
+            response = await client.chat.completions.create(
+                model=m,
+                messages=messages,
+                stream=False,
+                extra_body=keep_alive_body() if p == "Ollama" else None,
+                extra_headers=OPENROUTER_HEADERS if p == "OpenRouter" else None
+            )
+            call.set_usage(response.usage)
+        return clean_quiz_json(response.choices[0].message.content)
+
+    if provider == AUTO_PROVIDER:
+        return await acall_with_failover(request, model_name)
+    return await request(provider, model_name)
+
+async def achat_with_tools(messages, model_name="qwen3:30b-instruct", provider="Ollama"):
+    """
+    Async variant of utils_llm.chat_with_tools.
+    """
+    tools = get_tools()
+
+    async def request(p, m):
+        client = get_async_client(p)
+        if p == "Ollama":
+            touch(m)
+        with track_call(p, m, "chat", streaming=False) as call:
+            response = await client.chat.completions.create(
+                model=m,
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                extra_body=keep_alive_body() if p == "Ollama" else None
+            )
+            call.set_usage(response.usage)
+        return response.choices[0].message
+
+    if provider == AUTO_PROVIDER:
+        return await acall_with_failover(request, model_name)
+    return await request(provider, model_name)
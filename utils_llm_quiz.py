@@ -2,6 +2,9 @@ from openai import OpenAI
 import json
 import os
 from dotenv import load_dotenv
+from utils_llm_router import AUTO_PROVIDER, hedged_stream, call_with_failover
+from utils_telemetry import track_call
+from utils_model_residency import keep_alive_body, touch
 
 load_dotenv()
 
@@ -20,13 +23,10 @@ def get_client(provider: str = "Ollama"):
             api_key='ollama',
         )
 
-def generate_quiz(latex_content: str, model_name: str = "qwen3:30b-instruct", num_questions: int = 10, provider: str = "Ollama"):
+def build_quiz_messages(latex_content: str, num_questions: int = 10) -> list:
     """
-    Generates quiz questions and answers from LaTeX content in JSON format.
-    Returns the complete JSON string (non-streaming for reliable JSON parsing).
+    Builds the system/user messages for quiz generation.
     """
-    client = get_client(provider)
-
     system_prompt = """You are an expert educational assessment creator. You generate high-quality quiz questions in valid JSON format."""
 
     user_prompt = f"""
@@ -91,25 +91,200 @@ def generate_quiz(latex_content: str, model_name: str = "qwen3:30b-instruct", nu
     Remember: Output ONLY valid JSON. No markdown code blocks, no extra text, just the JSON object.
     """
 
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        stream=False,  # Non-streaming for reliable JSON
-        extra_headers={
-            "HTTP-Referer": "http://localhost:8501",
-            "X-Title": "Unified Media Parser",
-        } if provider == "OpenRouter" else None
-    )
-
-    json_response = response.choices[0].message.content.strip()
-    
-    # Clean up any markdown code blocks if present
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def clean_quiz_json(json_response: str) -> str:
+    """
+    Strips markdown code fences the model may wrap around the JSON.
+    """
+    json_response = json_response.strip()
     if json_response.startswith("```json"):
         json_response = json_response.replace("```json", "").replace("```", "").strip()
     elif json_response.startswith("```"):
         json_response = json_response.replace("```", "").strip()
-    
     return json_response
+
+def generate_quiz(latex_content: str, model_name: str = "qwen3:30b-instruct", num_questions: int = 10, provider: str = "Ollama"):
+    """
+    Generates quiz questions and answers from LaTeX content in JSON format.
+    Returns the complete JSON string (non-streaming for reliable JSON parsing).
+    Pass provider="Auto" to fail over between Ollama and OpenRouter.
+    """
+    messages = build_quiz_messages(latex_content, num_questions)
+
+    def request(p, m):
+        client = get_client(p)
+        if p == "Ollama":
+            touch(m)
+        with track_call(p, m, "quiz", streaming=False) as call:
+            response = client.chat.completions.create(
+                model=m,
+                messages=messages,
+                stream=False,  # Non-streaming for reliable JSON
+                extra_body=keep_alive_body() if p == "Ollama" else None,
+                extra_headers={
+                    "HTTP-Referer": "http://localhost:8501",
+                    "X-Title": "Unified Media Parser",
+                } if p == "OpenRouter" else None
+            )
+            call.set_usage(response.usage)
+        # Clean up any markdown code blocks if present
+        return clean_quiz_json(response.choices[0].message.content)
+
+    if provider == AUTO_PROVIDER:
+        return call_with_failover(request, model_name)
+    return request(provider, model_name)
+
+
+def generate_quiz_stream(latex_content: str, model_name: str = "qwen3:30b-instruct", num_questions: int = 10, provider: str = "Ollama"):
+    """
+    Streaming variant of generate_quiz.
+    Yields raw chunks of the JSON document as the model produces them.
+    Pass provider="Auto" to hedge between Ollama and OpenRouter.
+    """
+    messages = build_quiz_messages(latex_content, num_questions)
+
+    def request(p, m):
+        client = get_client(p)
+        if p == "Ollama":
+            touch(m)
+        with track_call(p, m, "quiz") as call:
+            stream = client.chat.completions.create(
+                model=m,
+                messages=messages,
+                stream=True,
+                extra_body=keep_alive_body() if p == "Ollama" else None,
+                stream_options={"include_usage": True},
+                extra_headers={
+                    "HTTP-Referer": "http://localhost:8501",
+                    "X-Title": "Unified Media Parser",
+                } if p == "OpenRouter" else None
+            )
+            call.response_started()
+            try:
+                for chunk in stream:
+                    if chunk.usage:
+                        call.set_usage(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        call.token()
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+
+    if provider == AUTO_PROVIDER:
+        yield from hedged_stream(request, model_name)
+    else:
+        yield from request(provider, model_name)
+
+class QuizStreamParser:
+    """
+    Incremental parser for the quiz JSON document.
+
+    Feed it raw text as it streams in; every time an object inside the
+    top-level "questions" array closes, it is decoded and returned so the
+    caller can render it before the rest of the document exists.
+    Text before the first '{' (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.quiz_title = None
+        self.questions = []
+        self._pos = 0
+        self._started = False
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = False
+        self._last_key = None
+        self._questions_depth = None
+        self._question_start = None
+
+    def feed(self, text: str) -> list:
+        """
+        Consumes a chunk of text and returns the list of questions completed by it.
+        """
+        self.buffer += text
+        completed = []
+
+        while self._pos < len(self.buffer):
+            i = self._pos
+            c = self.buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._open(c)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._close_string(i)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if c == "{" and self._questions_depth is not None and len(self._stack) == self._questions_depth:
+                    self._question_start = i
+                self._open(c)
+            elif c in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if c == "}" and self._question_start is not None and len(self._stack) == self._questions_depth:
+                    question = self._decode_question(self.buffer[self._question_start:i + 1])
+                    self._question_start = None
+                    if question is not None:
+                        self.questions.append(question)
+                        completed.append(question)
+                elif c == "]" and self._questions_depth is not None and len(self._stack) < self._questions_depth:
+                    self._questions_depth = None
+            elif c == ",":
+                self._expect_key = len(self._stack) == 1 and self._stack[-1] == "{"
+            elif c == ":":
+                self._expect_key = False
+
+        return completed
+
+    @property
+    def finished(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._started and not self._stack
+
+    def _open(self, c):
+        self._stack.append(c)
+        self._expect_key = len(self._stack) == 1 and c == "{"
+        if c == "[" and len(self._stack) == 2 and self._last_key == "questions":
+            self._questions_depth = len(self._stack)
+
+    def _close_string(self, end):
+        # Only keys/values of the top-level object are tracked
+        if len(self._stack) != 1:
+            return
+        try:
+            value = json.loads(self.buffer[self._string_start:end + 1])
+        except json.JSONDecodeError:
+            return
+        if self._expect_key:
+            self._last_key = value
+        elif self._last_key == "quiz_title":
+            self.quiz_title = value
+
+    @staticmethod
+    def _decode_question(raw: str):
+        try:
+            question = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        return question if isinstance(question, dict) else None
@@ -0,0 +1,398 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Provider value that enables routing instead of a fixed provider
+AUTO_PROVIDER = "Auto"
+PROVIDERS = ["Ollama", "OpenRouter"]
+
+# Preferred provider when routing, and the model each provider falls back to
+# when it is not the one the caller picked a model for.
+PREFERRED_PROVIDER = os.getenv("LLM_PREFERRED_PROVIDER", "Ollama")
+FALLBACK_MODELS = {
+    "Ollama": os.getenv("LLM_FALLBACK_OLLAMA_MODEL", "qwen3:30b-instruct"),
+    "OpenRouter": os.getenv("LLM_FALLBACK_OPENROUTER_MODEL", "google/gemini-2.5-flash-lite"),
+}
+
+# Hedge when time-to-first-token exceeds this many seconds. The effective
+# threshold grows with the provider's observed TTFT so a slow-but-healthy
+# provider is not hedged on every request.
+HEDGE_AFTER_S = float(os.getenv("LLM_HEDGE_AFTER", "6"))
+HEDGE_MAX_S = float(os.getenv("LLM_HEDGE_MAX", "30"))
+
+# A provider with this many consecutive errors is demoted for COOLDOWN_S.
+MAX_CONSECUTIVE_ERRORS = 3
+COOLDOWN_S = 60.0
+
+EWMA_ALPHA = 0.3
+
+class ProviderStats:
+    """
+    Rolling latency/error statistics for one provider.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.last_error_at = None
+        self.hedges_started = 0
+        self.races_won = 0
+        self.ttft_ewma = None
+        self.total_ewma = None
+        # Non-streaming calls have no first token; their latency is kept apart so it never feeds hedge_delay
+        self.call_ewma = None
+
+    def record_start(self):
+        with self.lock:
+            self.requests += 1
+
+    def record_hedge(self):
+        with self.lock:
+            self.hedges_started += 1
+
+    def record_race_won(self):
+        with self.lock:
+            self.races_won += 1
+
+    def record_first_token(self, ttft: float):
+        with self.lock:
+            self.ttft_ewma = ttft if self.ttft_ewma is None else EWMA_ALPHA * ttft + (1 - EWMA_ALPHA) * self.ttft_ewma
+
+    def record_success(self, total: float):
+        with self.lock:
+            self.successes += 1
+            self.consecutive_errors = 0
+            self.total_ewma = total if self.total_ewma is None else EWMA_ALPHA * total + (1 - EWMA_ALPHA) * self.total_ewma
+
+    def record_call(self, elapsed: float):
+        """
+        Records a successful non-streaming call.
+        """
+        with self.lock:
+            self.successes += 1
+            self.consecutive_errors = 0
+            self.call_ewma = elapsed if self.call_ewma is None else EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.call_ewma
+
+    def record_error(self, error: Exception):
+        with self.lock:
+            self.errors += 1
+            self.consecutive_errors += 1
+            self.last_error = str(error)
+            self.last_error_at = time.time()
+
+    def is_degraded(self) -> bool:
+        with self.lock:
+            return (
+                self.consecutive_errors >= MAX_CONSECUTIVE_ERRORS
+                and self.last_error_at is not None
+                and time.time() - self.last_error_at < COOLDOWN_S
+            )
+
+    def hedge_delay(self) -> float:
+        with self.lock:
+            if self.ttft_ewma is None:
+                return HEDGE_AFTER_S
+            return min(HEDGE_MAX_S, max(HEDGE_AFTER_S, 1.5 * self.ttft_ewma))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "provider": self.name,
+                "requests": self.requests,
+                "successes": self.successes,
+                "errors": self.errors,
+                "consecutive_errors": self.consecutive_errors,
+                "last_error": self.last_error,
+                "hedges_started": self.hedges_started,
+                "races_won": self.races_won,
+                "ttft_ewma_s": self.ttft_ewma,
+                "total_ewma_s": self.total_ewma,
+                "call_ewma_s": self.call_ewma,
+            }
+
+_stats = {name: ProviderStats(name) for name in PROVIDERS}
+
+def get_provider_stats() -> list:
+    """Returns a snapshot of the per-provider routing statistics."""
+    return [_stats[name].snapshot() for name in PROVIDERS]
+
+def _available(provider: str) -> bool:
+    if provider == "OpenRouter":
+        return bool(os.getenv("OPENROUTER_API_KEY"))
+    return True
+
+def provider_order(preferred: str = None) -> list:
+    """
+    Returns providers in the order they should be tried.
+    The preferred provider goes first unless it is currently degraded.
+    """
+    preferred = preferred or PREFERRED_PROVIDER
+    order = [preferred] + [p for p in PROVIDERS if p != preferred]
+    order = [p for p in order if _available(p)]
+    healthy = [p for p in order if not _stats[p].is_degraded()]
+    degraded = [p for p in order if _stats[p].is_degraded()]
+    return healthy + degraded
+
+def _model_for(provider: str, preferred: str, model_name: str) -> str:
+    if provider == preferred and model_name:
+        return model_name
+    return FALLBACK_MODELS[provider]
+
+def hedged_stream(request_fn, model_name: str = None, preferred: str = None, hedge_after: float = None):
+    """
+    Streams text from the best provider, hedging on slow first tokens.
+
+    request_fn(provider, model_name) must return an iterator of text chunks.
+    The first provider is started immediately; if it produces no token within
+    the hedge delay (or fails before its first token) the next provider is
+    raced against it and whichever streams first wins. Errors after the first
+    token are re-raised since output has already been emitted.
+    """
+    preferred = preferred or PREFERRED_PROVIDER
+    order = provider_order(preferred)
+    if not order:
+        raise RuntimeError("No LLM provider is available")
+
+    events = queue.Queue()
+    cancels = {}
+    started = {}
+    winner = None
+    pending = list(order)
+
+    def run(provider, cancel):
+        stats = _stats[provider]
+        start = time.perf_counter()
+        first = True
+        chunks = None
+        try:
+            chunks = request_fn(provider, _model_for(provider, preferred, model_name))
+            for text in chunks:
+                if cancel.is_set():
+                    break
+                if first:
+                    stats.record_first_token(time.perf_counter() - start)
+                    first = False
+                events.put((provider, "chunk", text))
+            else:
+                stats.record_success(time.perf_counter() - start)
+                events.put((provider, "done", None))
+        except Exception as e:
+            if not cancel.is_set():
+                stats.record_error(e)
+            events.put((provider, "error", e))
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+    def launch():
+        provider = pending.pop(0)
+        cancel = threading.Event()
+        cancels[provider] = cancel
+        started[provider] = time.perf_counter()
+        _stats[provider].record_start()
+        if len(started) > 1:
+            _stats[provider].record_hedge()
+        print(f"🔀 Routing request to {provider}")
+        threading.Thread(target=run, args=(provider, cancel), daemon=True).start()
+        return provider
+
+    primary = launch()
+    deadline = time.perf_counter() + (hedge_after if hedge_after is not None else _stats[primary].hedge_delay())
+    running = {primary}
+    last_error = None
+
+    try:
+        while True:
+            timeout = None
+            if winner is None and pending:
+                timeout = max(0.0, deadline - time.perf_counter())
+            try:
+                provider, kind, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                # No first token yet: race the next provider
+                running.add(launch())
+                continue
+
+            if winner is None:
+                if kind == "chunk":
+                    winner = provider
+                    if len(started) > 1:
+                        _stats[provider].record_race_won()
+                    for other, cancel in cancels.items():
+                        if other != provider:
+                            cancel.set()
+                    yield payload
+                elif kind == "done":
+                    winner = provider
+                    return
+                else:
+                    print(f"⚠️ {provider} failed before first token: {payload}")
+                    last_error = payload
+                    running.discard(provider)
+                    if pending and not running:
+                        running.add(launch())
+                        deadline = time.perf_counter() + (hedge_after if hedge_after is not None else HEDGE_AFTER_S)
+                    elif not running:
+                        raise last_error
+            elif provider == winner:
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+    finally:
+        for cancel in cancels.values():
+            cancel.set()
+
+def call_with_failover(request_fn, model_name: str = None, preferred: str = None):
+    """
+    Non-streaming counterpart of hedged_stream.
+    Tries each provider in order and returns the first successful result.
+    """
+    preferred = preferred or PREFERRED_PROVIDER
+    order = provider_order(preferred)
+    if not order:
+        raise RuntimeError("No LLM provider is available")
+
+    last_error = None
+    for provider in order:
+        stats = _stats[provider]
+        stats.record_start()
+        start = time.perf_counter()
+        try:
+            result = request_fn(provider, _model_for(provider, preferred, model_name))
+        except Exception as e:
+            print(f"⚠️ {provider} failed, failing over: {e}")
+            stats.record_error(e)
+            last_error = e
+            continue
+        stats.record_call(time.perf_counter() - start)
+        return result
+    raise last_error
+
+async def ahedged_stream(request_fn, model_name: str = None, preferred: str = None, hedge_after: float = None):
+    """
+    Async counterpart of hedged_stream for the asyncio serving path.
+    request_fn(provider, model_name) must return an async iterator of text chunks.
+    """
+    preferred = preferred or PREFERRED_PROVIDER
+    order = provider_order(preferred)
+    if not order:
+        raise RuntimeError("No LLM provider is available")
+
+    events = asyncio.Queue()
+    tasks = {}
+    winner = None
+    pending = list(order)
+
+    async def run(provider):
+        stats = _stats[provider]
+        start = time.perf_counter()
+        first = True
+        try:
+            async for text in request_fn(provider, _model_for(provider, preferred, model_name)):
+                if first:
+                    stats.record_first_token(time.perf_counter() - start)
+                    first = False
+                await events.put((provider, "chunk", text))
+            stats.record_success(time.perf_counter() - start)
+            await events.put((provider, "done", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats.record_error(e)
+            await events.put((provider, "error", e))
+
+    def launch():
+        provider = pending.pop(0)
+        _stats[provider].record_start()
+        if tasks:
+            _stats[provider].record_hedge()
+        print(f"🔀 Routing request to {provider}")
+        tasks[provider] = asyncio.create_task(run(provider))
+        return provider
+
+    primary = launch()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (hedge_after if hedge_after is not None else _stats[primary].hedge_delay())
+    running = {primary}
+
+    try:
+        while True:
+            try:
+                if winner is None and pending:
+                    provider, kind, payload = await asyncio.wait_for(events.get(), max(0.0, deadline - loop.time()))
+                else:
+                    provider, kind, payload = await events.get()
+            except asyncio.TimeoutError:
+                running.add(launch())
+                continue
+
+            if winner is None:
+                if kind == "chunk":
+                    winner = provider
+                    if len(tasks) > 1:
+                        _stats[provider].record_race_won()
+                    for other, task in tasks.items():
+                        if other != provider:
+                            task.cancel()
+                    yield payload
+                elif kind == "done":
+                    winner = provider
+                    return
+                else:
+                    print(f"⚠️ {provider} failed before first token: {payload}")
+                    running.discard(provider)
+                    if pending and not running:
+                        running.add(launch())
+                        deadline = loop.time() + (hedge_after if hedge_after is not None else HEDGE_AFTER_S)
+                    elif not running:
+                        raise payload
+            elif provider == winner:
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+async def acall_with_failover(request_fn, model_name: str = None, preferred: str = None):
+    """
+    Async counterpart of call_with_failover.
+    request_fn(provider, model_name) must return an awaitable.
+    """
+    preferred = preferred or PREFERRED_PROVIDER
+    order = provider_order(preferred)
+    if not order:
+        raise RuntimeError("No LLM provider is available")
+
+    last_error = None
+    for provider in order:
+        stats = _stats[provider]
+        stats.record_start()
+        start = time.perf_counter()
+        try:
+            result = await request_fn(provider, _model_for(provider, preferred, model_name))
+        except Exception as e:
+            print(f"⚠️ {provider} failed, failing over: {e}")
+            stats.record_error(e)
+            last_error = e
+            continue
+        stats.record_call(time.perf_counter() - start)
+        return result
+    raise last_error
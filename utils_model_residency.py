@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+import urllib.request
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Native Ollama API (the OpenAI-compatible endpoint lives under /v1)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+# How long Ollama should keep a model in memory after its last request
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Models loaded at backend startup
+PRELOAD_MODELS = [
+    m.strip() for m in os.getenv("OLLAMA_PRELOAD_MODELS", "qwen3:30b-instruct,gpt-oss:latest").split(",")
+    if m.strip()
+]
+
+# Minimum seconds between keep-alive refreshes for the same model
+TOUCH_INTERVAL_S = 60
+
+_lock = threading.Lock()
+_last_touch = {}
+_load_times = {}
+
+def _request(path: str, payload: dict = None, timeout: float = 10):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(
+        f"{OLLAMA_URL}{path}",
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST" if data is not None else "GET"
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8") or "{}")
+
+def keep_alive_body(extra_body: dict = None) -> dict:
+    """
+    Merges the keep-alive hint into an Ollama request's extra_body.
+    """
+    body = dict(extra_body or {})
+    body.setdefault("keep_alive", KEEP_ALIVE)
+    return body
+
+def preload_model(model: str, timeout: float = 600) -> bool:
+    """
+    Loads a model into memory without generating anything.
+    An empty /api/generate request makes Ollama load the weights and
+    (re)start the keep-alive timer.
+    """
+    start = time.perf_counter()
+    try:
+        response = _request("/api/generate", {"model": model, "keep_alive": KEEP_ALIVE}, timeout=timeout)
+    except Exception as e:
+        print(f"⚠️ Could not preload {model}: {e}")
+        return False
+    # Ollama reports the load itself in nanoseconds; wall time also counts queueing
+    elapsed = response.get("load_duration", 0) / 1e9 or time.perf_counter() - start
+    with _lock:
+        _last_touch[model] = time.time()
+        _load_times[model] = elapsed
+    print(f"🔥 {model} is warm ({elapsed:.1f}s)")
+    return True
+
+def preload_default_models(background: bool = True):
+    """
+    Preloads PRELOAD_MODELS, by default on a background thread so startup is not blocked.
+    """
+    def _run():
+        for model in PRELOAD_MODELS:
+            preload_model(model)
+
+    if background:
+        threading.Thread(target=_run, daemon=True).start()
+    else:
+        _run()
+
+def touch(model: str):
+    """
+    Refreshes a model's keep-alive after it was used, at most once per TOUCH_INTERVAL_S.
+    Runs in the background; the OpenAI-compatible endpoint does not reliably
+    honour keep_alive, so this guarantees the timer is extended.
+    """
+    now = time.time()
+    with _lock:
+        if now - _last_touch.get(model, 0) < TOUCH_INTERVAL_S:
+            return
+        _last_touch[model] = now
+    threading.Thread(target=_refresh_keep_alive, args=(model,), daemon=True).start()
+
+def _refresh_keep_alive(model: str):
+    # Same empty request as preload_model, but a warm model's near-zero
+    # reply is not a load, so _load_times is left alone
+    try:
+        _request("/api/generate", {"model": model, "keep_alive": KEEP_ALIVE}, timeout=60)
+    except Exception as e:
+        print(f"⚠️ Could not refresh keep-alive for {model}: {e}")
+
+def get_warm_models() -> list:
+    """
+    Returns the models currently resident in Ollama memory.
+    """
+    try:
+        models = _request("/api/ps").get("models", [])
+    except Exception as e:
+        print(f"⚠️ Could not query Ollama: {e}")
+        return []
+    with _lock:
+        load_times = dict(_load_times)
+    return [
+        {
+            "name": m.get("name"),
+            "size_vram": m.get("size_vram"),
+            "expires_at": m.get("expires_at"),
+            "last_load_s": load_times.get(m.get("name")),
+        }
+        for m in models
+    ]
+
+def get_residency_status() -> dict:
+    """
+    Summary for the API: configured models, keep-alive and which ones are warm.
+    """
+    warm = get_warm_models()
+    warm_names = {m["name"] for m in warm}
+    return {
+        "keep_alive": KEEP_ALIVE,
+        "configured": [{"name": m, "warm": m in warm_names} for m in PRELOAD_MODELS],
+        "warm": warm,
+    }
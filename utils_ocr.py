@@ -9,6 +9,7 @@ try:
 except ImportError:
     Document = None
 from openai import OpenAI
+from utils_telemetry import track_call
 
 # Initialize OpenRouter Client
 # In a production environment, use environment variables. 
@@ -48,14 +49,16 @@ def transcribe_image(image_bytes: bytes, mime_type: str = "image/png") -> str:
     ]
     
     try:
-        completion = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "http://localhost:8501",
-                "X-Title": "Streamlit Document Parser",
-            },
-            model=MODEL_NAME,
-            messages=messages
-        )
+        with track_call("OpenRouter", MODEL_NAME, "ocr", streaming=False) as call:
+            completion = client.chat.completions.create(
+                extra_headers={
+                    "HTTP-Referer": "http://localhost:8501",
+                    "X-Title": "Streamlit Document Parser",
+                },
+                model=MODEL_NAME,
+                messages=messages
+            )
+            call.set_usage(completion.usage)
         return completion.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error transcribing image: {e}")
@@ -3,13 +3,10 @@ import yt_dlp
 import whisper
 import subprocess
 from datetime import datetime
-import soundfile as sf
-import numpy as np
-
-try:
-    from kokoro import KPipeline
-except ImportError:
-    KPipeline = None
+from utils_latex import compile_latex
+from utils_tts import synthesize_text
+from utils_index import register_file
+from utils_storage import adopt_media_file, reuse_derived_file, store_derived_file
 
 def download_youtube_audio(url: str, output_path_template: str) -> str:
     """
@@ -31,7 +28,10 @@ def download_youtube_audio(url: str, output_path_template: str) -> str:
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download([url])
     # yt-dlp appends extension
-    return output_path_template + ".wav"
+    output_path = output_path_template + ".wav"
+    # Re-downloading the same video then shares the file (and its derived artifacts)
+    adopt_media_file(output_path)
+    return output_path
 
 def transcribe_audio(file_path: str):
     """
@@ -85,42 +85,22 @@ def convert_to_wav(input_path: str, output_path: str):
         ]
         # Run command
         subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        register_file(output_path)
         return True
     except subprocess.CalledProcessError as e:
         error_message = e.stderr.decode('utf-8', errors='ignore') if e.stderr else "No stderr output"
         print(f"FFmpeg Error: {error_message}")
         raise RuntimeError(f"FFmpeg failed with exit code {e.returncode}. Stderr: {error_message}") from e
 
-def generate_tts_audio(text: str, output_path: str):
+def generate_tts_audio(text: str, output_path: str, parallel: bool = False):
     """
-    Generates TTS audio using Kokoro and saves it to output_path as a WAV file.
+    Generates TTS audio using Kokoro and saves it to output_path. The format
+    follows the extension: .wav, or .opus/.mp3 encoded through ffmpeg.
+    Sentences synthesized before (same text, voice and speed) come from the
+    sentence cache; with parallel=True the rest are synthesized across worker
+    processes (see synthesize_text).
     """
-    if KPipeline is None:
-        raise ImportError("Kokoro library not installed. Please install 'kokoro' and 'soundfile'.")
-
-    # Initialize Pipeline (English)
-    # This might download weights on first run
-    pipeline = KPipeline(lang_code='a')  # 'a' for American English
-
-    # Generate audio
-    # voice='af_bella' is a common default, or we could expose this
-    # speed=1 is default
-    generator = pipeline(text, voice='af_bella', speed=1)
-
-    # Collect all audio chunks
-    all_audio = []
-    for _, _, audio in generator:
-        all_audio.append(audio)
-
-    if all_audio:
-        # Concatenate audio chunks
-        final_audio = np.concatenate(all_audio)
-        # Save to file
-        # Kokoro uses 24000 Hz by default
-        sf.write(output_path, final_audio, 24000)
-        return True
-    else:
-        return False
+    return synthesize_text(text, output_path, parallel=parallel)
 
 def compile_latex_to_pdf(tex_filepath, cleanup=True, output_dir=None):
     """
@@ -134,123 +114,8 @@ def compile_latex_to_pdf(tex_filepath, cleanup=True, output_dir=None):
     Returns:
         Path to the generated PDF if successful, None otherwise
     """
-    # Ensure we have absolute path
-    tex_filepath = os.path.abspath(tex_filepath)
-    
-    # Get base name without extension
-    base_name = os.path.splitext(tex_filepath)[0]
-    tex_dir = os.path.dirname(tex_filepath)
-    
-    # Check if .tex file exists
-    if not os.path.exists(tex_filepath):
-        print(f"Error: {tex_filepath} not found!")
-        return None
-    
-    print(f"Compiling {tex_filepath}...")
-    
-    # Determine pdflatex command
-    pdflatex_cmd = "pdflatex"
-    common_paths = [
-        r"C:\Users\mynov\AppData\Local\Programs\MiKTeX\miktex\bin\x64\pdflatex.exe",
-        r"C:\Users\mynov\Documents\MiKTeX\miktex\bin\x64\pdflatex.exe",
-        os.path.expandvars(r"%LOCALAPPDATA%\Programs\MiKTeX\miktex\bin\x64\pdflatex.exe"),
-        r"C:\Program Files\MiKTeX\miktex\bin\x64\pdflatex.exe",
-        r"C:\Program Files (x86)\MiKTeX\miktex\bin\x64\pdflatex.exe"
-    ]
-    
-    # Check for pdflatex in PATH
-    has_pdflatex = False
-    try:
-        subprocess.run([pdflatex_cmd, "--version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        has_pdflatex = True
-    except (FileNotFoundError, subprocess.CalledProcessError):
-        # Check common Windows MiKTeX paths
-        for p in common_paths:
-            if os.path.exists(p):
-                pdflatex_cmd = p
-                has_pdflatex = True
-                print(f"Found pdflatex at: {p}")
-                break
-    
-    if not has_pdflatex:
-        print("Error: pdflatex not found! Make sure MiKTeX is installed and in PATH.")
-        return None
-    
-    # Build pdflatex command
-    # Use output directory if specified, otherwise use tex file's directory
-    if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
-        cmd = [pdflatex_cmd, '-interaction=nonstopmode', f'-output-directory={output_dir}', tex_filepath]
-        pdf_file = os.path.join(output_dir, os.path.basename(base_name) + '.pdf')
-        log_file = os.path.join(output_dir, os.path.basename(base_name) + '.log')
-    else:
-        cmd = [pdflatex_cmd, '-interaction=nonstopmode', tex_filepath]
-        pdf_file = base_name + '.pdf'
-        log_file = base_name + '.log'
-    
-    try:
-        # Run pdflatex (Pass 1)
-        print("Running first pass...")
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Check if PDF was created (even if there were warnings)
-        # LaTeX often returns non-zero for warnings (overfull boxes, etc.) but still creates the PDF
-        if not os.path.exists(pdf_file):
-            print(f"Error during compilation!")
-            print(f"Return code: {result.returncode}")
-            
-            # Check log file for detailed errors
-            if os.path.exists(log_file):
-                with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    log_content = f.read()
-                    # Print last 50 lines of log
-                    print("\nLast 50 lines of log file:")
-                    log_excerpt = '\n'.join(log_content.split('\n')[-50:])
-                    print(log_excerpt)
-            return None
-        
-        # Run second pass for cross-references (even if there were warnings)
-        print("Running second pass...")
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        
-        if os.path.exists(pdf_file):
-            print(f"✓ PDF created successfully: {pdf_file}")
-            
-            # Show warnings if any (but don't fail)
-            if result.returncode != 0:
-                print(f"Note: LaTeX returned warnings (code {result.returncode}), but PDF was created successfully.")
-            
-            # Cleanup auxiliary files
-            if cleanup:
-                aux_extensions = ['.aux', '.log', '.out', '.toc', '.lof', '.lot']
-                for ext in aux_extensions:
-                    if output_dir:
-                        aux_file = os.path.join(output_dir, os.path.basename(base_name) + ext)
-                    else:
-                        aux_file = base_name + ext
-                    if os.path.exists(aux_file):
-                        try:
-                            os.remove(aux_file)
-                            print(f"Removed {aux_file}")
-                        except:
-                            pass
-            
-            return pdf_file
-        else:
-            print("Error: PDF file not created!")
-            return None
-            
-    except FileNotFoundError:
-        print("Error: pdflatex not found! Make sure MiKTeX is installed and in PATH.")
-        return None
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return None
+    return compile_latex(tex_filepath, cleanup=cleanup, output_dir=output_dir)["pdf_path"]
+
 def process_unified_file(file_path: str, model_name: str = "gpt-oss:latest"):
     """
     Routes a file to the appropriate processing pipeline based on its extension.
@@ -265,7 +130,10 @@ def process_unified_file(file_path: str, model_name: str = "gpt-oss:latest"):
         working_p = file_path
         if not file_path.endswith(".wav"):
             wav_path = os.path.splitext(file_path)[0] + ".wav"
-            convert_to_wav(file_path, wav_path)
+            # Identical uploads share one converted WAV
+            if not reuse_derived_file(file_path, wav_path, "_16k.wav"):
+                convert_to_wav(file_path, wav_path)
+                store_derived_file(file_path, wav_path, "_16k.wav")
             working_p = wav_path
         
         # 2. Transcribe
@@ -0,0 +1,153 @@
+import os
+import threading
+
+class FlightCancelled(Exception):
+    """
+    Raised when a generation was stopped because every subscriber left.
+    """
+
+class Flight:
+    """
+    One in-flight generation. Chunks are kept so late subscribers can
+    replay the prefix produced so far and then follow the live tail.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.cancelled = threading.Event()
+        self.cond = threading.Condition()
+
+    def append(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error: Exception = None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def text(self) -> str:
+        with self.cond:
+            return "".join(self.chunks)
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent generations.
+
+    stream(key, factory) starts factory() on a background thread the first
+    time a key is seen; later callers with the same key attach to the same
+    flight instead of starting a new generation. The flight is forgotten as
+    soon as it finishes, and cancelled once its last subscriber goes away.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def stream(self, key, factory):
+        """
+        Returns (iterator of chunks, joined) where joined is True when the
+        caller attached to an existing flight. The caller counts as a
+        subscriber once it starts iterating.
+        """
+        with self.lock:
+            flight, joined = self._attach(key, factory)
+        if joined:
+            print(f"🔗 Joined in-flight {self.name} generation for {key}")
+        return self._subscribe(flight, factory), joined
+
+    def _attach(self, key, factory):
+        # Caller holds self.lock
+        flight = self.flights.get(key)
+        if flight is not None:
+            return flight, True
+        flight = Flight(key)
+        self.flights[key] = flight
+        threading.Thread(target=self._produce, args=(flight, factory), daemon=True).start()
+        return flight, False
+
+    def run(self, key, factory) -> str:
+        """
+        Blocking variant: waits for the (possibly shared) generation and returns the full text.
+        """
+        chunks, _ = self.stream(key, factory)
+        return "".join(chunks)
+
+    def in_flight(self) -> int:
+        with self.lock:
+            return len(self.flights)
+
+    def _produce(self, flight, factory):
+        chunks = None
+        try:
+            chunks = factory()
+            for chunk in chunks:
+                if flight.cancelled.is_set():
+                    break
+                flight.append(chunk)
+            flight.finish(FlightCancelled(f"{self.name} generation for {flight.key} was cancelled") if flight.cancelled.is_set() else None)
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            self._forget(flight)
+
+    def _forget(self, flight):
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+
+    def _subscribe(self, flight, factory):
+        with self.lock:
+            if flight.cancelled.is_set():
+                # Abandoned before this caller started reading: its output would be cut short
+                flight, _ = self._attach(flight.key, factory)
+            with flight.cond:
+                flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    pending = flight.chunks[index:]
+                    index += len(pending)
+                    finished = flight.done and index >= len(flight.chunks)
+                    error = flight.error
+                for chunk in pending:
+                    yield chunk
+                if finished:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            # Under self.lock so no caller can attach between the last exit and the cancel
+            with self.lock:
+                with flight.cond:
+                    flight.subscribers -= 1
+                    abandoned = flight.subscribers == 0 and not flight.done
+                if abandoned:
+                    # Nobody is listening any more: stop generating and let the next request start fresh
+                    flight.cancelled.set()
+                    if self.flights.get(flight.key) is flight:
+                        del self.flights[flight.key]
+
+# Shared by every endpoint that generates a LaTeX summary from a transcript
+latex_flights = SingleFlight("LaTeX")
+
+def latex_flight_key(transcript_path: str, model_name: str, summary_mode: str, provider: str) -> tuple:
+    """
+    Identity of a LaTeX generation. The transcript's mtime is included so an
+    edited transcript never attaches to a generation of the old text.
+    """
+    path = os.path.abspath(transcript_path)
+    return (path, os.path.getmtime(path), model_name, summary_mode, provider)
@@ -1,51 +1,72 @@
 import os
+import shutil
+import hashlib
+import tempfile
 from datetime import datetime
 import glob
+from utils_index import register_file, query_files, get_digest, find_files
 
 MEDIA_ROOT = "media"
 TRANSCRIPT_ROOT = "transcript"
 TTS_ROOT = "TTS"
 RENDER_ROOT = "render"
 QUIZ_ROOT = "quiz"
+TELEMETRY_ROOT = "telemetry"
+LATEX_CACHE_ROOT = "latex_cache"
+
+# Folders tracked by the metadata index (utils_index.py)
+INDEXED_ROOTS = [MEDIA_ROOT, TRANSCRIPT_ROOT, TTS_ROOT, RENDER_ROOT, QUIZ_ROOT]
+
+# Content-addressed store for media; the timestamped files in MEDIA_ROOT are hard links into it
+BLOB_ROOT = os.path.join(MEDIA_ROOT, ".blobs")
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+def storage_path(root_folder: str, filename: str) -> str:
+    """
+    Path of filename in root_folder's current month folder (root_folder/MM-YYYY/filename).
+    Creates and registers nothing, so it is safe for read-only lookups.
+    """
+    subfolder = datetime.now().strftime("%m-%Y")
+    return os.path.join(root_folder, subfolder, filename)
+
+def register_storage_file(path: str, digest: str = None):
+    """
+    Registers a file in the metadata index if it lives under one of the INDEXED_ROOTS.
+    For files written beside registered ones under names get_storage_path did not hand out.
+    """
+    root = os.path.relpath(os.path.abspath(path)).split(os.sep, 1)[0]
+    if root in INDEXED_ROOTS:
+        register_file(path, digest=digest)
 
 def get_storage_path(root_folder: str, filename: str) -> str:
     """
     Generates a path based on current month/year and creates the directory if needed.
     Structure: root_folder/MM-YYYY/filename
+    Use it for paths that are about to be written: the path is registered in
+    the metadata index, so it shows up in listings once written.
     """
-    now = datetime.now()
-    subfolder = now.strftime("%m-%Y")
+    path = storage_path(root_folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    register_storage_file(path)
+    return path
     
-    directory = os.path.join(root_folder, subfolder)
-    os.makedirs(directory, exist_ok=True)
-    
-    return os.path.join(directory, filename)
-    
-def list_transcript_files() -> list:
+def _listing(entries: list, details: bool) -> list:
+    return entries if details else [entry["path"] for entry in entries]
+
+def list_transcript_files(details: bool = False) -> list:
     """
-    Lists all transcript files (excluding timestamped versions) in the transcript directory.
-    Returns a list of relative paths.
+    Lists all transcript files (excluding timestamped versions) in the transcript directory, newest first.
+    Returns a list of relative paths, or dicts with path, name, size and mtime if details is set.
     """
-    files = []
-    if os.path.exists(TRANSCRIPT_ROOT):
-        for root, dirs, filenames in os.walk(TRANSCRIPT_ROOT):
-            for filename in filenames:
-                if filename.endswith(".txt") and "_timestamped" not in filename:
-                    files.append(os.path.join(root, filename))
-    return sorted(files, key=os.path.getmtime, reverse=True)
+    return _listing(query_files(TRANSCRIPT_ROOT, extension=".txt", exclude="_timestamped"), details)
 
-def list_latex_files() -> list:
+def list_latex_files(details: bool = False) -> list:
     """
-    Lists all .tex files in the render directory.
-    Returns a list of relative paths.
+    Lists all .tex files in the render directory, newest first.
+    Returns a list of relative paths, or dicts with path, name, size and mtime if details is set.
     """
-    files = []
-    if os.path.exists(RENDER_ROOT):
-        for root, dirs, filenames in os.walk(RENDER_ROOT):
-            for filename in filenames:
-                if filename.endswith(".tex"):
-                    files.append(os.path.join(root, filename))
-    return sorted(files, key=os.path.getmtime, reverse=True)
+    return _listing(query_files(RENDER_ROOT, extension=".tex"), details)
 
 def generate_filename(original_filename: str, suffix: str = "") -> str:
     """
@@ -62,28 +83,203 @@ def generate_filename(original_filename: str, suffix: str = "") -> str:
     
     return f"{clean_name}_{dt_string}{suffix}{ext}"
 
+def _blob_path(digest: str, ext: str) -> str:
+    return os.path.join(BLOB_ROOT, digest[:2], digest + ext.lower())
+
+def _link_or_copy(source: str, target: str):
+    """
+    Hard-links target to source, copying instead where links are not supported.
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+def hash_file(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def store_blob(stream, ext: str):
+    """
+    Copies a binary stream into the blob store, hashing it on the way.
+    Returns (digest, blob_path, duplicate); for a duplicate the new copy is
+    discarded and the existing blob is returned.
+    """
+    os.makedirs(BLOB_ROOT, exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=BLOB_ROOT, suffix=".part")
+    sha = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = stream.read(HASH_CHUNK_BYTES)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                f.write(chunk)
+        digest = sha.hexdigest()
+        blob = _blob_path(digest, ext)
+        if os.path.exists(blob):
+            os.remove(partial)
+            return digest, blob, True
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.replace(partial, blob)
+        return digest, blob, False
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+def save_media_stream(stream, original_filename: str, suffix: str = "") -> dict:
+    """
+    Stores an uploaded stream once in the blob store and creates the usual
+    timestamped media file as a hard link to it, so uploading the same
+    content again costs no extra disk. Returns the path, filename, digest,
+    whether it was a duplicate and any transcripts that already exist for it.
+    """
+    digest, blob, duplicate = store_blob(stream, os.path.splitext(original_filename)[1])
+    new_filename = generate_filename(original_filename, suffix=suffix)
+    save_path = get_storage_path(MEDIA_ROOT, new_filename)
+    _link_or_copy(blob, save_path)
+    register_file(save_path, digest=digest)
+
+    existing = find_existing_transcripts(save_path) if duplicate else None
+    if duplicate:
+        print(f"♻️ Duplicate upload of {original_filename}: linked to existing content {digest[:12]}")
+    return {"path": save_path, "filename": new_filename, "digest": digest, "duplicate": duplicate, "existing": existing}
+
 def save_uploaded_file(uploaded_file, suffix: str = "") -> str:
     """
     Saves an uploaded Streamlit file to the media directory.
     Returns the absolute path to the saved file.
     """
-    new_filename = generate_filename(uploaded_file.name, suffix=suffix)
-    save_path = get_storage_path(MEDIA_ROOT, new_filename)
-    
-    with open(save_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-        
-    return save_path
-
-def list_media_files() -> list:
-    """
-    Lists all files in the media directory recursively.
-    Returns a list of relative paths from the current working directory.
-    """
-    files = []
-    # Browse through all subdirectories of MEDIA_ROOT
-    if os.path.exists(MEDIA_ROOT):
-        for root, dirs, filenames in os.walk(MEDIA_ROOT):
-            for filename in filenames:
-                files.append(os.path.join(root, filename))
-    return sorted(files, key=os.path.getmtime, reverse=True)
+    uploaded_file.seek(0)
+    return save_media_stream(uploaded_file, uploaded_file.name, suffix=suffix)["path"]
+
+def adopt_media_file(path: str) -> str:
+    """
+    Moves a media file written by another tool (e.g. yt-dlp) into the blob
+    store, leaving a hard link in its place. Returns its digest.
+    """
+    digest = hash_file(path)
+    blob = _blob_path(digest, os.path.splitext(path)[1])
+    if os.path.exists(blob):
+        _link_or_copy(blob, path)
+    else:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        _link_or_copy(path, blob)
+    register_file(path, digest=digest)
+    return digest
+
+def media_digest(path: str) -> str:
+    """
+    Content digest of a media file, from the index or, for files saved before
+    the blob store existed, by hashing it once and recording the result.
+    """
+    digest = get_digest(path)
+    if digest is None:
+        digest = hash_file(path)
+        register_storage_file(path, digest=digest)
+    return digest
+
+def reuse_derived_file(source_path: str, target_path: str, kind: str) -> bool:
+    """
+    Links target_path to an artifact previously derived from the same
+    content as source_path (kind is a tag plus extension, e.g. "_16k.wav").
+    Returns False if there is none yet.
+    """
+    blob = _blob_path(media_digest(source_path), kind)
+    if not os.path.exists(blob):
+        return False
+    _link_or_copy(blob, target_path)
+    register_file(target_path)
+    print(f"♻️ Reused {kind} derived from identical content: {target_path}")
+    return True
+
+def store_derived_file(source_path: str, derived_path: str, kind: str):
+    """
+    Records derived_path as the kind artifact of source_path's content, so
+    identical uploads can reuse it.
+    """
+    blob = _blob_path(media_digest(source_path), kind)
+    if not os.path.exists(blob):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        _link_or_copy(derived_path, blob)
+
+def find_existing_transcripts(media_path: str):
+    """
+    Looks for transcripts made from another copy of the same content.
+    Returns {"type", "transcript", "timestamped"} or None.
+    """
+    digest = media_digest(media_path)
+    for other in find_files(digest=digest):
+        if os.path.abspath(other) == os.path.abspath(media_path):
+            continue
+        base_name = os.path.splitext(os.path.basename(other))[0]
+        transcripts = find_files(name=f"{base_name}_transcript.txt")
+        if transcripts:
+            timestamped = find_files(name=f"{base_name}_transcript_timestamped.txt")
+            return {"type": "media", "transcript": transcripts[-1], "timestamped": timestamped[-1] if timestamped else None}
+        documents = find_files(name=f"{base_name}_ocr.txt")
+        if documents:
+            return {"type": "document", "transcript": documents[-1], "timestamped": None}
+    return None
+
+def reuse_transcripts(media_path: str):
+    """
+    Copies transcripts made from identical content to the names used for
+    media_path, so Whisper/OCR does not have to run again. Returns
+    {"type", "transcript_path", "timestamped_path"} or None.
+    """
+    existing = find_existing_transcripts(media_path)
+    if existing is None:
+        return None
+    base_name = os.path.splitext(os.path.basename(media_path))[0]
+    if existing["type"] == "media":
+        transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript.txt")
+    else:
+        transcript_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_ocr.txt")
+    shutil.copyfile(existing["transcript"], transcript_path)
+    timestamped_path = None
+    if existing["timestamped"]:
+        timestamped_path = get_storage_path(TRANSCRIPT_ROOT, f"{base_name}_transcript_timestamped.txt")
+        shutil.copyfile(existing["timestamped"], timestamped_path)
+    print(f"♻️ Reused transcript of identical content: {existing['transcript']}")
+    return {"type": existing["type"], "transcript_path": transcript_path, "timestamped_path": timestamped_path}
+
+def collect_orphan_blobs() -> int:
+    """
+    Deletes blobs (and the artifacts derived from them) whose content no
+    indexed media file refers to any more. Returns the bytes freed.
+    """
+    freed = 0
+    if not os.path.exists(BLOB_ROOT):
+        return freed
+    referenced = {}
+    for directory, dirs, filenames in os.walk(BLOB_ROOT):
+        for filename in filenames:
+            if filename.endswith(".part"):
+                continue
+            digest = filename[:64]
+            if digest not in referenced:
+                referenced[digest] = bool(find_files(digest=digest))
+            if not referenced[digest]:
+                path = os.path.join(directory, filename)
+                freed += os.path.getsize(path)
+                os.remove(path)
+    return freed
+
+def list_media_files(details: bool = False) -> list:
+    """
+    Lists all files in the media directory recursively, newest first.
+    Returns a list of relative paths from the current working directory,
+    or dicts with path, name, size and mtime if details is set.
+    """
+    return _listing(query_files(MEDIA_ROOT), details)
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from utils_storage import TELEMETRY_ROOT
+
+LOG_FILENAME = "llm_calls.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Rotate the JSONL log at 5MB
+LOG_BACKUPS = 3
+MAX_RECENT = 5000  # Most recent records used for aggregates
+
+_lock = threading.Lock()
+
+def get_log_path() -> str:
+    os.makedirs(TELEMETRY_ROOT, exist_ok=True)
+    return os.path.join(TELEMETRY_ROOT, LOG_FILENAME)
+
+def _rotate(path: str):
+    """
+    Shifts llm_calls.jsonl -> .1 -> .2 ... keeping LOG_BACKUPS files.
+    """
+    for i in range(LOG_BACKUPS - 1, 0, -1):
+        src = f"{path}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+def _read_recent() -> list:
+    """
+    Reads the most recent records from the log (and its first backup, so a
+    fresh rotation does not wipe the aggregates). Reading the log rather than
+    process memory lets the Flask and async backends share one view.
+    """
+    path = os.path.join(TELEMETRY_ROOT, LOG_FILENAME)
+    entries = deque(maxlen=MAX_RECENT)
+    for candidate in (f"{path}.1", path):
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return list(entries)
+
+def record(entry: dict):
+    """
+    Appends one call record to the rolling JSONL log.
+    """
+    with _lock:
+        try:
+            path = get_log_path()
+            if os.path.exists(path) and os.path.getsize(path) >= LOG_MAX_BYTES:
+                _rotate(path)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Telemetry log error: {e}")
+
+class CallTracker:
+    """
+    Measures a single LLM call. Use through track_call().
+
+    queue_s: request sent -> response headers (time spent waiting for the
+             server, including model load and queueing behind other jobs)
+    ttft_s:  request sent -> first content token
+    tokens_per_s: completion tokens / time spent generating after the first token
+    """
+
+    def __init__(self, provider: str, model: str, feature: str, streaming: bool):
+        self.provider = provider
+        self.model = model
+        self.feature = feature
+        self.streaming = streaming
+        self.start = time.perf_counter()
+        self.response_at = None
+        self.first_token_at = None
+        self.chunks = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+
+    def response_started(self):
+        if self.response_at is None:
+            self.response_at = time.perf_counter()
+
+    def token(self):
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+            self.response_started()
+        self.chunks += 1
+
+    def set_usage(self, usage):
+        if usage is None:
+            return
+        self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+        self.completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def to_entry(self, status: str, error: str = None) -> dict:
+        end = time.perf_counter()
+        completion_tokens = self.completion_tokens
+        estimated = False
+        if completion_tokens is None and self.streaming and self.chunks:
+            # Providers that omit usage stream roughly one token per chunk
+            completion_tokens = self.chunks
+            estimated = True
+
+        ttft = self.first_token_at - self.start if self.first_token_at else None
+        tokens_per_s = None
+        if completion_tokens and self.first_token_at and end > self.first_token_at:
+            tokens_per_s = completion_tokens / (end - self.first_token_at)
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "provider": self.provider,
+            "model": self.model,
+            "feature": self.feature,
+            "streaming": self.streaming,
+            "status": status,
+            "error": error,
+            "queue_s": self.response_at - self.start if self.response_at else None,
+            "ttft_s": ttft,
+            "total_s": end - self.start,
+            "tokens_per_s": tokens_per_s,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": estimated,
+        }
+
+class track_call:
+    """
+    Context manager recording one LLM call:
+
+        with track_call("Ollama", model, "latex") as call:
+            stream = client.chat.completions.create(...)
+            call.response_started()
+            for chunk in stream:
+                call.token()
+
+    Exceptions are recorded as errors and re-raised; a generator closed
+    early (client disconnect, lost hedge race) is recorded as cancelled.
+    """
+
+    def __init__(self, provider: str, model: str, feature: str, streaming: bool = True):
+        self.call = CallTracker(provider, model, feature, streaming)
+
+    def __enter__(self) -> CallTracker:
+        return self.call
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            entry = self.call.to_entry("ok")
+        elif issubclass(exc_type, (GeneratorExit, asyncio.CancelledError)):
+            entry = self.call.to_entry("cancelled")
+        else:
+            entry = self.call.to_entry("error", f"{exc_type.__name__}: {exc}")
+        record(entry)
+        return False
+
+def _percentile(values: list, pct: float):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def _summary(values: list) -> dict:
+    return {
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "mean": sum(values) / len(values) if values else None,
+    }
+
+def get_aggregates(feature: str = None, provider: str = None) -> list:
+    """
+    Aggregates recent calls per (provider, model, feature).
+    """
+    with _lock:
+        entries = _read_recent()
+
+    groups = {}
+    for entry in entries:
+        if feature and entry.get("feature") != feature:
+            continue
+        if provider and entry.get("provider") != provider:
+            continue
+        key = (entry.get("provider"), entry.get("model"), entry.get("feature"))
+        groups.setdefault(key, []).append(entry)
+
+    aggregates = []
+    for (prov, model, feat), items in groups.items():
+        ok = [e for e in items if e.get("status") == "ok"]
+
+        def values(field):
+            return [e[field] for e in ok if e.get(field) is not None]
+
+        aggregates.append({
+            "provider": prov,
+            "model": model,
+            "feature": feat,
+            "calls": len(items),
+            "errors": sum(1 for e in items if e.get("status") == "error"),
+            "cancelled": sum(1 for e in items if e.get("status") == "cancelled"),
+            "last_error": next((e.get("error") for e in reversed(items) if e.get("status") == "error"), None),
+            "queue_s": _summary(values("queue_s")),
+            "ttft_s": _summary(values("ttft_s")),
+            "total_s": _summary(values("total_s")),
+            "tokens_per_s": _summary(values("tokens_per_s")),
+            "prompt_tokens": sum(values("prompt_tokens")),
+            "completion_tokens": sum(values("completion_tokens")),
+        })
+    aggregates.sort(key=lambda a: (a["feature"] or "", a["provider"] or "", a["model"] or ""))
+    return aggregates
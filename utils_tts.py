@@ -0,0 +1,661 @@
+import os
+import re
+import time
+import hashlib
+import queue
+import struct
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from utils_storage import TTS_ROOT
+
+try:
+    from kokoro import KPipeline
+except ImportError:
+    KPipeline = None
+
+SAMPLE_RATE = 24000  # Kokoro output rate
+DEFAULT_VOICE = 'af_bella'
+
+# Pipelines kept per language; this many syntheses can run at the same time
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "2"))
+
+# Voices loaded into every pipeline when it is created
+PRELOAD_VOICES = [v.strip() for v in os.getenv("TTS_PRELOAD_VOICES", DEFAULT_VOICE).split(",") if v.strip()]
+
+# Languages warmed at startup ('a' for American English)
+PRELOAD_LANGS = [l.strip() for l in os.getenv("TTS_PRELOAD_LANGS", "a").split(",") if l.strip()]
+
+# A sentence ends at terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or at a blank line.
+_BOUNDARY = re.compile(r'([.!?]+["\')\]]*)(\s+)|\n\s*\n')
+_ABBREVIATIONS = {"e.g.", "i.e.", "mr.", "mrs.", "ms.", "dr.", "prof.", "vs.", "etc.", "st.", "no."}
+
+class SentenceSplitter:
+    """
+    Cuts a stream of text into sentences as soon as they are complete.
+    Very short sentences are merged so Kokoro gets enough context for natural prosody.
+    """
+
+    def __init__(self, min_chars: int = 80):
+        self.min_chars = min_chars
+        self.buffer = ""
+        self.pending = ""
+
+    def feed(self, text: str) -> list:
+        """
+        Adds text and returns the sentences completed by it.
+        """
+        self.buffer += text
+        sentences = []
+        pos = 0
+        for match in _BOUNDARY.finditer(self.buffer):
+            if match.group(1):
+                words = self.buffer[pos:match.end(1)].split()
+                if words and words[-1].lower() in _ABBREVIATIONS:
+                    continue
+            sentence = self.buffer[pos:match.end()].strip()
+            pos = match.end()
+            if not sentence:
+                continue
+            self.pending = f"{self.pending} {sentence}".strip()
+            if len(self.pending) >= self.min_chars:
+                sentences.append(self.pending)
+                self.pending = ""
+        self.buffer = self.buffer[pos:]
+        return sentences
+
+    def flush(self) -> list:
+        """
+        Returns whatever text is left once the stream has ended.
+        """
+        rest = f"{self.pending} {self.buffer.strip()}".strip()
+        self.pending = ""
+        self.buffer = ""
+        return [rest] if rest else []
+
+def split_sentences(text: str, min_chars: int = 80) -> list:
+    """
+    Splits a complete text into sentences using the same rules as the streaming splitter.
+    """
+    splitter = SentenceSplitter(min_chars=min_chars)
+    return splitter.feed(text) + splitter.flush()
+
+def load_pipeline(lang_code: str = 'a', model=True, device: str = None):
+    """
+    Creates a Kokoro pipeline ('a' for American English).
+    Pass an existing KModel as model to share its weights between pipelines.
+    device defaults to Kokoro's choice (CUDA when available).
+    This might download weights on first run.
+    """
+    if KPipeline is None:
+        raise ImportError("Kokoro library not installed. Please install 'kokoro' and 'soundfile'.")
+    return KPipeline(lang_code=lang_code, model=model, device=device)
+
+class PipelinePool:
+    """
+    Resident Kokoro pipelines for one language.
+
+    The first pipeline loads the model; the others share its weights and only
+    add their own G2P and voice cache, so concurrent requests do not share
+    mutable pipeline state. Pipelines are created on demand up to size and
+    then reused; when all are busy, borrowers wait for one to be returned.
+    """
+
+    def __init__(self, lang_code: str, size: int = TTS_POOL_SIZE):
+        self.lang_code = lang_code
+        self.size = max(1, size)
+        self.idle = queue.Queue()
+        self.created = 0
+        self.model = None
+        self.lock = threading.Lock()
+        self.create_lock = threading.Lock()
+
+    def _create(self):
+        # Serialized so only the first pipeline loads the model
+        with self.create_lock:
+            pipeline = load_pipeline(self.lang_code, model=self.model if self.model is not None else True)
+            self.model = pipeline.model
+            for voice in PRELOAD_VOICES:
+                pipeline.load_voice(voice)
+        return pipeline
+
+    def _grow(self) -> bool:
+        with self.lock:
+            if self.created >= self.size:
+                return False
+            self.created += 1
+        try:
+            self.idle.put(self._create())
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+        return True
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        self._grow()
+        return self.idle.get()
+
+    def release(self, pipeline):
+        self.idle.put(pipeline)
+
+    def warm(self):
+        """Creates the remaining pipelines up front."""
+        while self._grow():
+            pass
+        print(f"🔥 Kokoro '{self.lang_code}' is warm ({self.created} pipeline(s), voices: {', '.join(PRELOAD_VOICES)})")
+
+_pools_lock = threading.Lock()
+_pools = {}
+_warm_started = False
+
+def get_pipeline_pool(lang_code: str = 'a') -> PipelinePool:
+    with _pools_lock:
+        pool = _pools.get(lang_code)
+        if pool is None:
+            pool = _pools[lang_code] = PipelinePool(lang_code)
+        return pool
+
+@contextmanager
+def borrow_pipeline(lang_code: str = 'a'):
+    """
+    Lends a resident pipeline for the duration of the with block.
+    """
+    pool = get_pipeline_pool(lang_code)
+    pipeline = pool.acquire()
+    try:
+        yield pipeline
+    finally:
+        pool.release(pipeline)
+
+def warm_tts_pipelines(background: bool = True):
+    """
+    Loads the Kokoro model and PRELOAD_VOICES for PRELOAD_LANGS so the first
+    TTS request does not pay the load. Safe to call repeatedly.
+    """
+    global _warm_started
+    with _pools_lock:
+        if _warm_started or KPipeline is None:
+            return
+        _warm_started = True
+
+    def _run():
+        for lang_code in PRELOAD_LANGS:
+            try:
+                get_pipeline_pool(lang_code).warm()
+            except Exception as e:
+                print(f"⚠️ Could not warm Kokoro '{lang_code}': {e}")
+
+    if background:
+        threading.Thread(target=_run, daemon=True).start()
+    else:
+        _run()
+
+# Placeholder sizes for a WAV whose length is not known yet; players treat
+# the data chunk as running to the end of the stream
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+# How often the live endpoint checks for newly written audio
+LIVE_POLL_S = 0.2
+
+_live_lock = threading.Lock()
+_live_paths = set()
+_live_errors = {}
+
+def _to_pcm16(samples) -> bytes:
+    return (np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+def _wav_header(data_bytes: int) -> bytes:
+    riff_size = _UNKNOWN_SIZE if data_bytes == _UNKNOWN_SIZE else 36 + data_bytes
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16,
+        b"data", data_bytes
+    )
+
+class StreamingWavFile:
+    """
+    16-bit mono WAV that can be played while it is being written.
+
+    The header is written first with maximum sizes and each write() is
+    flushed straight to disk, so a reader tailing the file gets a playable
+    stream. close() patches the real sizes into the header.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(_wav_header(_UNKNOWN_SIZE))
+        self.file.flush()
+        self.data_bytes = 0
+
+    def write(self, samples):
+        pcm = _to_pcm16(samples)
+        self.file.write(pcm)
+        self.file.flush()
+        self.data_bytes += len(pcm)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(_wav_header(self.data_bytes))
+        self.file.close()
+
+# ffmpeg encoder settings per output extension; bitrates are tuned for speech
+ENCODERS = {
+    ".opus": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"],
+    ".ogg": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"],
+    ".mp3": ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"],
+}
+
+AUDIO_MIMETYPES = {
+    ".wav": "audio/wav",
+    ".opus": "audio/ogg",
+    ".ogg": "audio/ogg",
+    ".mp3": "audio/mpeg",
+}
+
+# Output formats accepted by the API, mapped to file extensions
+AUDIO_FORMATS = {"wav": ".wav", "opus": ".opus", "mp3": ".mp3"}
+
+class FfmpegAudioFile:
+    """
+    Compressed audio file with the same write()/close() interface as
+    StreamingWavFile. Samples are piped to ffmpeg as 16-bit PCM and encoded
+    on the fly; Ogg pages and MP3 frames reach the disk as they are produced,
+    so the file can be tailed while it is written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log = tempfile.TemporaryFile()
+        command = [
+            'ffmpeg', '-loglevel', 'error',
+            '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', 'pipe:0',
+            *ENCODERS[os.path.splitext(path)[1].lower()],
+            '-y', path
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+
+    def write(self, samples):
+        pcm = _to_pcm16(samples)
+        self.process.stdin.write(pcm)
+        self.process.stdin.flush()
+
+    def close(self):
+        self.process.stdin.close()
+        returncode = self.process.wait()
+        self.log.seek(0)
+        error_message = self.log.read().decode('utf-8', errors='ignore')
+        self.log.close()
+        if returncode != 0:
+            print(f"FFmpeg Error: {error_message}")
+            raise RuntimeError(f"FFmpeg failed with exit code {returncode}. Stderr: {error_message}")
+
+def open_audio_writer(path: str):
+    """
+    Returns a streaming writer for path, chosen by its extension (.wav, .opus/.ogg or .mp3).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ENCODERS:
+        return FfmpegAudioFile(path)
+    return StreamingWavFile(path)
+
+def audio_mimetype(path: str) -> str:
+    return AUDIO_MIMETYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+def mark_live(path: str, live: bool = True):
+    """
+    Flags a file as still being written, so tail_audio keeps waiting for more.
+    Starting a new write clears any failure recorded for the path.
+    """
+    with _live_lock:
+        if live:
+            _live_paths.add(os.path.abspath(path))
+            _live_errors.pop(os.path.abspath(path), None)
+        else:
+            _live_paths.discard(os.path.abspath(path))
+
+def is_live(path: str) -> bool:
+    with _live_lock:
+        return os.path.abspath(path) in _live_paths
+
+def mark_failed(path: str, error: Exception):
+    """
+    Records why a background write of path failed, for clients that are tailing it.
+    """
+    with _live_lock:
+        _live_errors[os.path.abspath(path)] = str(error)
+
+def live_error(path: str):
+    """
+    Returns the recorded failure of the last background write of path, or None.
+    """
+    with _live_lock:
+        return _live_errors.get(os.path.abspath(path))
+
+def tail_audio(path: str, block_size: int = 64 * 1024):
+    """
+    Yields the bytes of an audio file as they are written, until the writer
+    is done. Works for finished files too.
+    """
+    while not os.path.exists(path):
+        if not is_live(path):
+            return
+        time.sleep(LIVE_POLL_S)
+    with open(path, 'rb') as f:
+        while True:
+            # Check before reading so the last write is never missed
+            live = is_live(path)
+            block = f.read(block_size)
+            if block:
+                yield block
+            elif not live:
+                return
+            else:
+                time.sleep(LIVE_POLL_S)
+
+class StreamingSpeechWriter:
+    """
+    Synthesizes text into an audio file while the text is still being produced.
+
+    Feed it chunks as they stream from the LLM; each completed sentence is
+    handed to a background thread that runs Kokoro (or takes the audio from
+    the sentence cache) and appends it to output_path. close() flushes the remainder and waits for synthesis to
+    finish, so total time is roughly max(script time, synthesis time).
+    While it runs, output_path is marked live and can be served with
+    tail_audio as it grows.
+    """
+
+    def __init__(self, output_path: str, voice: str = DEFAULT_VOICE, speed: float = 1, lang_code: str = 'a', min_chars: int = 80):
+        self.output_path = output_path
+        self.voice = voice
+        self.speed = speed
+        self.lang_code = lang_code
+        self.splitter = SentenceSplitter(min_chars=min_chars)
+        self.sentences = queue.Queue()
+        self.samples_written = 0
+        self.error = None
+        self.cancelled = threading.Event()
+        mark_live(output_path)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def feed(self, text: str):
+        for sentence in self.splitter.feed(text):
+            self.sentences.put(sentence)
+
+    def close(self) -> bool:
+        """
+        Flushes pending text and blocks until all audio is written.
+        Returns True if any audio was produced.
+        """
+        for sentence in self.splitter.flush():
+            self.sentences.put(sentence)
+        self.sentences.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.samples_written > 0
+
+    def cancel(self):
+        """
+        Stops synthesis without waiting for queued sentences (e.g. when the LLM stream fails).
+        """
+        self.cancelled.set()
+        self.sentences.put(None)
+
+    def _run(self):
+        out = None
+        gap = np.zeros(int(SAMPLE_RATE * SENTENCE_GAP_S), dtype=np.float32)
+        try:
+            while True:
+                sentence = self.sentences.get()
+                if sentence is None or self.cancelled.is_set():
+                    break
+                key = sentence_cache_key(sentence, self.voice, self.speed, self.lang_code)
+                audio = cache_get(key)
+                if audio is None:
+                    # Borrows a pipeline per sentence so a slow LLM stream does not hold one idle
+                    audio = _synthesize_local(sentence, self.voice, self.speed, self.lang_code)
+                    cache_put(key, audio)
+                if not len(audio):
+                    continue
+                if out is None:
+                    out = open_audio_writer(self.output_path)
+                else:
+                    out.write(gap)
+                out.write(audio)
+                self.samples_written += len(audio)
+        except Exception as e:
+            print(f"TTS pipeline error: {e}")
+            self.error = e
+        finally:
+            if out is not None:
+                out.close()
+            mark_live(self.output_path, False)
+            prune_sentence_cache()
+
+# Worker processes for parallel synthesis; each loads its own copy of the model on the CPU
+TTS_PROCESSES = int(os.getenv("TTS_PROCESSES", "2"))
+
+# Silence inserted between sentences that were synthesized separately
+SENTENCE_GAP_S = 0.1
+
+# Synthesized sentences, keyed by text, voice, speed and language
+TTS_CACHE_DIR = os.path.join(TTS_ROOT, ".cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "1000")) * 1024 * 1024
+
+# Part of every cache key; bump it when a change to synthesis makes cached audio stale
+TTS_CACHE_VERSION = "1"
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+_worker_pipelines = {}
+_cache_lock = threading.Lock()
+
+def normalize_sentence(sentence: str) -> str:
+    return " ".join(sentence.split())
+
+def sentence_cache_key(sentence: str, voice: str = DEFAULT_VOICE, speed: float = 1, lang_code: str = 'a') -> str:
+    raw = "\0".join([TTS_CACHE_VERSION, lang_code, voice, f"{float(speed):g}", normalize_sentence(sentence)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _sentence_cache_path(key: str) -> str:
+    # Two-level layout keeps directories small for long archives
+    return os.path.join(os.path.abspath(TTS_CACHE_DIR), key[:2], key + ".pcm")
+
+def cache_get(key: str):
+    """
+    Returns the cached float32 samples for a sentence key, or None.
+    """
+    path = _sentence_cache_path(key)
+    try:
+        with open(path, 'rb') as f:
+            pcm = f.read()
+        os.utime(path)  # Mark as recently used for LRU eviction
+    except OSError:
+        return None
+    return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32767
+
+def cache_put(key: str, audio):
+    """
+    Stores a sentence's samples as 16-bit PCM, the precision every output format uses anyway.
+    """
+    path = _sentence_cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.part-{os.getpid()}-{threading.get_ident()}"
+        with open(partial, 'wb') as f:
+            f.write(_to_pcm16(audio))
+        os.replace(partial, path)
+    except OSError as e:
+        print(f"⚠️ Could not cache TTS sentence: {e}")
+
+def prune_sentence_cache():
+    """
+    Evicts the least recently used sentences until the cache fits TTS_CACHE_MAX_BYTES.
+    """
+    cache_dir = os.path.abspath(TTS_CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        return
+    with _cache_lock:
+        entries = []
+        for root, _, filenames in os.walk(cache_dir):
+            for name in filenames:
+                if name.endswith(".pcm"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= TTS_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except OSError:
+                pass
+        if evicted:
+            print(f"🗑️ Evicted {evicted} cached TTS sentence(s)")
+
+def _synthesize_local(sentence: str, voice: str, speed: float, lang_code: str):
+    with borrow_pipeline(lang_code) as pipeline:
+        segments = [np.asarray(audio, dtype=np.float32) for _, _, audio in pipeline(sentence, voice=voice, speed=speed)]
+    return np.concatenate(segments) if segments else np.zeros(0, dtype=np.float32)
+
+def _worker_pipeline(lang_code: str):
+    """Returns this worker's pipeline for lang_code, loading it on first use."""
+    pipeline = _worker_pipelines.get(lang_code)
+    if pipeline is None:
+        # Every language in the worker shares the first pipeline's model weights
+        loaded = next(iter(_worker_pipelines.values()), None)
+        # Always on the CPU: a CUDA context per worker process would exhaust the GPU
+        pipeline = load_pipeline(lang_code, model=loaded.model if loaded is not None else True, device="cpu")
+        for voice in PRELOAD_VOICES:
+            pipeline.load_voice(voice)
+        _worker_pipelines[lang_code] = pipeline
+    return pipeline
+
+def _init_worker():
+    """Loads the worker's PRELOAD_LANGS pipelines once, when the process starts."""
+    try:
+        import torch
+        # Parallelism comes from the processes; one thread each avoids oversubscribing the cores
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    for lang_code in PRELOAD_LANGS:
+        _worker_pipeline(lang_code)
+
+def _synthesize_chunk(text: str, voice: str, speed: float, lang_code: str):
+    segments = [np.asarray(audio, dtype=np.float32) for _, _, audio in _worker_pipeline(lang_code)(text, voice=voice, speed=speed)]
+    return np.concatenate(segments) if segments else np.zeros(0, dtype=np.float32)
+
+def get_process_pool():
+    """
+    The shared synthesis process pool. Workers are spawned rather than
+    forked, since forking a threaded server with torch loaded can deadlock.
+    Each worker keeps one pipeline per language it has been asked for.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max(1, TTS_PROCESSES),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            print(f"🧵 Started {TTS_PROCESSES} TTS worker process(es)")
+        return _process_pool
+
+def _discard_process_pool(pool, error: Exception):
+    """
+    Forgets a broken pool (a worker died or _init_worker failed) so the
+    next parallel request starts a new one.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    print(f"⚠️ TTS worker pool broke, synthesizing locally: {error}")
+
+def synthesize_text(text: str, output_path: str, voice: str = DEFAULT_VOICE, speed: float = 1, lang_code: str = 'a', parallel: bool = False) -> bool:
+    """
+    Synthesizes text sentence by sentence into output_path.
+
+    Sentences already in the sentence cache are reused, so only new or
+    edited sentences are synthesized: on a resident pipeline, or with
+    parallel=True across the worker processes. Sentences are written in
+    their original order, separated by SENTENCE_GAP_S of silence, as soon
+    as they and all sentences before them are ready, so the file can be
+    tailed while the rest is still being synthesized.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return False
+    keys = [sentence_cache_key(sentence, voice, speed, lang_code) for sentence in sentences]
+    misses = [i for i, key in enumerate(keys) if not os.path.exists(_sentence_cache_path(key))]
+    print(f"🗣️ {len(sentences)} sentence(s), {len(sentences) - len(misses)} cached, {len(misses)} to synthesize")
+    if misses and KPipeline is None:
+        raise ImportError("Kokoro library not installed. Please install 'kokoro' and 'soundfile'.")
+
+    futures = {}
+    if parallel and misses:
+        pool = get_process_pool()
+        try:
+            futures = {i: pool.submit(_synthesize_chunk, sentences[i], voice, speed, lang_code) for i in misses}
+        except BrokenProcessPool as e:
+            _discard_process_pool(pool, e)
+
+    gap = np.zeros(int(SAMPLE_RATE * SENTENCE_GAP_S), dtype=np.float32)
+    out = None
+    mark_live(output_path)
+    try:
+        for i, sentence in enumerate(sentences):
+            audio = cache_get(keys[i])
+            if audio is None:
+                audio = None
+                if i in futures:
+                    try:
+                        audio = futures[i].result()
+                    except BrokenProcessPool as e:
+                        # The remaining sentences are synthesized in this process
+                        _discard_process_pool(pool, e)
+                        futures = {}
+                if audio is None:
+                    audio = _synthesize_local(sentence, voice, speed, lang_code)
+                cache_put(keys[i], audio)
+            if not len(audio):
+                continue
+            if out is None:
+                out = open_audio_writer(output_path)
+            else:
+                out.write(gap)
+            out.write(audio)
+    except Exception:
+        for future in futures.values():
+            future.cancel()
+        raise
+    finally:
+        if out is not None:
+            out.close()
+        mark_live(output_path, False)
+        prune_sentence_cache()
+    return out is not None